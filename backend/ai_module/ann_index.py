@@ -0,0 +1,159 @@
+import os
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file (IVF-flat) coarse quantizer in pure numpy
+    Vectors are bucketed by their nearest centroid; a query only scores
+    the vectors in its `nprobe` closest buckets instead of the full corpus
+    """
+
+    def __init__(
+        self,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        train_iterations: int = 10,
+        max_train_size: int = 50000,
+        seed: int = 0
+    ):
+        """
+        Initialize index parameters
+
+        Args:
+            nlist: Number of buckets (None picks ~4*sqrt(N) at train time)
+            nprobe: Buckets scanned per query; higher means better recall, slower queries
+            train_iterations: Spherical k-means iterations
+            max_train_size: Vectors sampled for training
+            seed: Random seed for sampling and initialization
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.max_train_size = max_train_size
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray):
+        """
+        Learn bucket centroids with spherical k-means
+
+        Args:
+            vectors: L2-normalized float32 matrix (N x d)
+        """
+        rng = np.random.default_rng(self.seed)
+        n = vectors.shape[0]
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        if n > self.max_train_size:
+            sample = vectors[rng.choice(n, self.max_train_size, replace=False)]
+        else:
+            sample = vectors
+
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            labels = self._nearest(sample, centroids)
+            # Sum members per bucket; empty buckets keep their previous centroid
+            order = np.argsort(labels, kind='stable')
+            buckets, starts = np.unique(labels[order], return_index=True)
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            filled = norms[:, 0] > 0
+            centroids[buckets[filled]] = sums[filled] / norms[filled]
+
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = n
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Bucket ids for a batch of vectors
+
+        Args:
+            vectors: L2-normalized matrix (N x d) or single vector
+
+        Returns:
+            np.ndarray: int32 bucket id per vector
+        """
+        single = vectors.ndim == 1
+        labels = self._nearest(np.atleast_2d(vectors), self.centroids)
+        return labels[0] if single else labels
+
+    def probe(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Bucket ids closest to a normalized query"""
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+        scores = self.centroids @ query
+        if nprobe >= scores.shape[0]:
+            return np.arange(scores.shape[0], dtype=np.int32)
+        return np.argpartition(scores, -nprobe)[-nprobe:].astype(np.int32)
+
+    def save(self, path: str, ids, assignments: np.ndarray):
+        """
+        Persist centroids and per-conversation bucket assignments
+
+        Args:
+            path: Target .npz file
+            ids: Conversation ids aligned with assignments
+            assignments: Bucket id per conversation
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            ids=np.asarray(ids, dtype=str),
+            assignments=assignments.astype(np.int32),
+            trained_size=np.int64(self.trained_size),
+        )
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> Dict[str, int]:
+        """
+        Load a persisted index
+
+        Returns:
+            Dict[str, int]: Saved conversation id -> bucket id
+        """
+        with np.load(path) as data:
+            self.centroids = data['centroids'].astype(np.float32)
+            self.trained_size = int(data['trained_size'])
+            return dict(zip(data['ids'].tolist(), data['assignments'].tolist()))
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+        labels = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], batch_size):
+            block = vectors[start:start + batch_size] @ centroids.T
+            labels[start:start + batch_size] = np.argmax(block, axis=1)
+        return labels
+
+
+def build_ann_index(backend: str, **options) -> Optional[IVFFlatIndex]:
+    """
+    Create an ANN index by backend name
+
+    Args:
+        backend: 'exact' (no ANN) or 'ivf'
+
+    Returns:
+        Optional[IVFFlatIndex]: Untrained index, or None for exact search
+    """
+    if backend == 'exact':
+        return None
+    if backend == 'ivf':
+        return IVFFlatIndex(**options)
+    raise ValueError(f"Unknown vector index backend: {backend}")
+
+
+def recall_at_k(exact: Iterable, approximate: Iterable) -> float:
+    """Fraction of the exact top-k ids present in the approximate result"""
+    exact_ids = set(exact)
+    if not exact_ids:
+        return 1.0
+    return len(exact_ids.intersection(approximate)) / len(exact_ids)
@@ -0,0 +1,351 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import numpy as np
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with optional per-entry TTL
+    Tracks hit/miss counters for monitoring
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        """
+        Initialize cache
+
+        Args:
+            max_size: Maximum number of entries (least recently used evicted first)
+            ttl: Seconds an entry stays valid (None for no expiry)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+_redis_client = None
+_redis_lock = threading.Lock()
+
+
+def get_redis_client():
+    """
+    Shared Redis client for cache tiers (settings.REDIS_URL)
+
+    Returns:
+        redis.Redis or None if the redis package is not installed
+    """
+    global _redis_client
+    if _redis_client is None:
+        with _redis_lock:
+            if _redis_client is None:
+                try:
+                    import redis
+                except ImportError:
+                    return None
+                from django.conf import settings
+                _redis_client = redis.Redis.from_url(
+                    settings.REDIS_URL,
+                    socket_timeout=0.5,
+                    socket_connect_timeout=0.5
+                )
+    return _redis_client
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a search query"""
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Cache of query embeddings keyed by (model name, normalized query text)
+    In-process LRU in front of an optional shared Redis tier, so repeated
+    searches skip the transformer entirely
+    """
+
+    def __init__(
+        self,
+        max_size: int = 2048,
+        ttl: Optional[float] = 3600,
+        use_redis: bool = False,
+        key_prefix: str = 'query-embedding'
+    ):
+        """
+        Initialize cache
+
+        Args:
+            max_size: In-process entries
+            ttl: Seconds an embedding stays cached (both tiers)
+            use_redis: Also read/write the shared Redis tier
+            key_prefix: Redis key namespace
+        """
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.key_prefix = key_prefix
+        self.redis_hits = 0
+        self.redis_errors = 0
+
+    def get(self, model_name: str, query: str) -> Optional[np.ndarray]:
+        """
+        Cached embedding for a query
+
+        Returns:
+            Optional[np.ndarray]: Embedding, or None on miss
+        """
+        key = self._key(model_name, query)
+        embedding = self.local.get(key)
+        if embedding is not None or not self.use_redis:
+            return embedding
+
+        client = get_redis_client()
+        if client is None:
+            return None
+        try:
+            data = client.get(key)
+        except Exception:
+            self.redis_errors += 1
+            return None
+        if data is None:
+            return None
+
+        embedding = np.frombuffer(data, dtype=np.float32)
+        self.redis_hits += 1
+        self.local.set(key, embedding)
+        return embedding
+
+    def set(self, model_name: str, query: str, embedding: np.ndarray):
+        """Store a query embedding in both tiers"""
+        key = self._key(model_name, query)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self.local.set(key, embedding)
+
+        if not self.use_redis:
+            return
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            if self.ttl:
+                client.set(key, embedding.tobytes(), ex=int(self.ttl))
+            else:
+                client.set(key, embedding.tobytes())
+        except Exception:
+            self.redis_errors += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.local.stats(),
+            'redis_hits': self.redis_hits,
+            'redis_errors': self.redis_errors,
+        }
+
+    def _key(self, model_name: str, query: str) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode('utf-8')).hexdigest()
+        return f"{self.key_prefix}:{model_name}:{digest}"
+
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Get the process-wide query embedding cache, configured from Django settings"""
+    global _query_cache
+    if _query_cache is None:
+        from django.conf import settings
+        _query_cache = QueryEmbeddingCache(
+            max_size=getattr(settings, 'QUERY_EMBEDDING_CACHE_SIZE', 2048),
+            ttl=getattr(settings, 'QUERY_EMBEDDING_CACHE_TTL', 3600),
+            use_redis=getattr(settings, 'QUERY_EMBEDDING_CACHE_REDIS', False),
+        )
+    return _query_cache
+
+
+class SearchIndexVersion:
+    """
+    Counter bumped whenever searchable data changes
+    Part of every search result cache key, so a bump invalidates all cached
+    results at once. With use_redis the counter is shared by every worker.
+    """
+
+    def __init__(self, use_redis: bool = False, key: str = 'search-index-version'):
+        self.use_redis = use_redis
+        self.key = key
+        self._local = 0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Current version (local counter, plus the shared one when enabled)"""
+        if not self.use_redis:
+            return self._local
+        client = get_redis_client()
+        shared = None
+        if client is not None:
+            try:
+                shared = client.get(self.key)
+            except Exception:
+                # Without the shared counter results cannot be trusted across workers
+                return None
+        return (self._local, int(shared or 0))
+
+    def bump(self):
+        with self._lock:
+            self._local += 1
+        if self.use_redis:
+            client = get_redis_client()
+            if client is not None:
+                try:
+                    client.incr(self.key)
+                except Exception:
+                    pass
+
+
+_search_index_version: Optional[SearchIndexVersion] = None
+_search_result_cache: Optional[LRUCache] = None
+
+
+def get_search_index_version() -> SearchIndexVersion:
+    """Get the process-wide search index version counter"""
+    global _search_index_version
+    if _search_index_version is None:
+        from django.conf import settings
+        _search_index_version = SearchIndexVersion(
+            use_redis=getattr(settings, 'SEARCH_RESULT_CACHE_REDIS_VERSION', False)
+        )
+    return _search_index_version
+
+
+def get_search_result_cache() -> LRUCache:
+    """Get the process-wide search_conversations result cache"""
+    global _search_result_cache
+    if _search_result_cache is None:
+        from django.conf import settings
+        _search_result_cache = LRUCache(
+            max_size=getattr(settings, 'SEARCH_RESULT_CACHE_SIZE', 1024),
+            ttl=getattr(settings, 'SEARCH_RESULT_CACHE_TTL', 300),
+        )
+    return _search_result_cache
+
+
+class TextCache:
+    """
+    String cache with an in-process LRU in front of an optional Redis tier
+    Used for LLM outputs that are expensive to regenerate (chunk summaries)
+    """
+
+    def __init__(
+        self,
+        max_size: int = 4096,
+        ttl: Optional[float] = None,
+        use_redis: bool = False,
+        key_prefix: str = 'text'
+    ):
+        """
+        Initialize cache
+
+        Args:
+            max_size: In-process entries
+            ttl: Seconds an entry stays cached (both tiers)
+            use_redis: Also read/write the shared Redis tier
+            key_prefix: Redis key namespace
+        """
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.key_prefix = key_prefix
+
+    def get(self, key: str) -> Optional[str]:
+        key = f"{self.key_prefix}:{key}"
+        value = self.local.get(key)
+        if value is not None or not self.use_redis:
+            return value
+
+        client = get_redis_client()
+        if client is None:
+            return None
+        try:
+            data = client.get(key)
+        except Exception:
+            return None
+        if data is None:
+            return None
+        value = data.decode('utf-8')
+        self.local.set(key, value)
+        return value
+
+    def set(self, key: str, value: str):
+        key = f"{self.key_prefix}:{key}"
+        self.local.set(key, value)
+
+        if not self.use_redis:
+            return
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            if self.ttl:
+                client.set(key, value.encode('utf-8'), ex=int(self.ttl))
+            else:
+                client.set(key, value.encode('utf-8'))
+        except Exception:
+            pass
+
+
+_chunk_summary_cache: Optional[TextCache] = None
+
+
+def get_chunk_summary_cache() -> TextCache:
+    """Get the process-wide cache of conversation chunk summaries"""
+    global _chunk_summary_cache
+    if _chunk_summary_cache is None:
+        from django.conf import settings
+        _chunk_summary_cache = TextCache(
+            max_size=getattr(settings, 'SUMMARY_CHUNK_CACHE_SIZE', 4096),
+            ttl=getattr(settings, 'SUMMARY_CHUNK_CACHE_TTL', 7 * 24 * 3600),
+            use_redis=getattr(settings, 'SUMMARY_CHUNK_CACHE_REDIS', False),
+            key_prefix='chunk-summary',
+        )
+    return _chunk_summary_cache
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional
+import httpx
+from anthropic import AsyncAnthropic
+from openai import AsyncOpenAI
+import google.generativeai as genai
+
+# Default model per provider
+PROVIDER_MODELS = {
+    'openai': 'gpt-4',
+    'claude': 'claude-3-sonnet-20240229',
+    'gemini': 'gemini-pro',
+    'lmstudio': 'local-model',
+}
+
+
+class ProviderClientPool:
+    """
+    Process-wide pool of long-lived LLM provider clients
+    Each provider client owns one keep-alive httpx.AsyncClient, so
+    concurrent conversations on a worker share connections instead of
+    opening new ones (and new TLS handshakes) per message. Clients carry
+    their own credentials and base URL; no SDK module globals are touched
+    per request.
+
+    httpx async clients are bound to the event loop that created them, so
+    clients are kept per (event loop, provider). A Daphne worker runs one
+    loop and therefore one client per provider; short-lived loops (Celery
+    tasks) should call aclose() before closing their loop.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 2
+    ):
+        """
+        Initialize pool
+
+        Args:
+            max_connections: Concurrent connections per provider
+            max_keepalive_connections: Idle connections kept open per provider
+            keepalive_expiry: Seconds an idle connection stays open
+            timeout: Read/write timeout in seconds (streams: between chunks)
+            connect_timeout: Connection timeout in seconds
+            max_retries: SDK retries for connection errors and 429/5xx
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self._gemini_configured = False
+
+    def get(self, provider: str):
+        """
+        Client for a provider on the running event loop (created on first use)
+        Must be called from a coroutine.
+
+        Args:
+            provider: 'openai', 'claude', 'gemini' or 'lmstudio'
+
+        Returns:
+            AsyncOpenAI, AsyncAnthropic or genai.GenerativeModel
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.setdefault(loop, {})
+            client = clients.get(provider)
+            if client is None:
+                client = self._create(provider)
+                clients[provider] = client
+            return client
+
+    async def aclose(self):
+        """Close the clients of the running event loop"""
+        with self._lock:
+            clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            if hasattr(client, 'close'):
+                await client.close()
+
+    def _http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+
+    def _create(self, provider: str):
+        if provider == 'openai':
+            return AsyncOpenAI(
+                api_key=os.getenv('OPENAI_API_KEY'),
+                http_client=self._http_client(),
+                max_retries=self.max_retries
+            )
+
+        if provider == 'lmstudio':
+            # LM Studio uses OpenAI-compatible API and doesn't require a real key
+            return AsyncOpenAI(
+                api_key='lm-studio',
+                base_url=os.getenv('LM_STUDIO_URL', 'http://localhost:1234/v1'),
+                http_client=self._http_client(),
+                max_retries=self.max_retries
+            )
+
+        if provider == 'claude':
+            return AsyncAnthropic(
+                api_key=os.getenv('ANTHROPIC_API_KEY'),
+                http_client=self._http_client(),
+                max_retries=self.max_retries
+            )
+
+        if provider == 'gemini':
+            # The Gemini SDK keeps its (gRPC) client in module state; configure
+            # it once per process rather than on every request
+            if not self._gemini_configured:
+                genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+                self._gemini_configured = True
+            return genai.GenerativeModel(PROVIDER_MODELS['gemini'])
+
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+_pool: Optional[ProviderClientPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> ProviderClientPool:
+    """Get the process-wide provider client pool, configured from Django settings"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from django.conf import settings
+                _pool = ProviderClientPool(
+                    max_connections=getattr(settings, 'LLM_HTTP_MAX_CONNECTIONS', 100),
+                    max_keepalive_connections=getattr(settings, 'LLM_HTTP_MAX_KEEPALIVE', 20),
+                    keepalive_expiry=getattr(settings, 'LLM_HTTP_KEEPALIVE_EXPIRY', 30.0),
+                    timeout=getattr(settings, 'LLM_HTTP_TIMEOUT', 60.0),
+                    connect_timeout=getattr(settings, 'LLM_HTTP_CONNECT_TIMEOUT', 5.0),
+                    max_retries=getattr(settings, 'LLM_MAX_RETRIES', 2),
+                )
+    return _pool
@@ -0,0 +1,184 @@
+from typing import Dict, List, Optional
+from django.conf import settings
+from conversations.models import Conversation, Message
+from .utils import count_tokens
+
+# Token counts persisted on Message rows are measured with this tokenizer.
+# Other providers tokenize differently, which the safety margin absorbs.
+TOKEN_COUNT_MODEL = 'gpt-4'
+
+# Default context window per provider when settings.LLM_CONTEXT_TOKENS is unset
+DEFAULT_CONTEXT_TOKENS = {
+    'openai': 8192,
+    'claude': 200000,
+    'gemini': 30720,
+    'lmstudio': 4096,
+}
+
+# Chat format framing (role, separators) added per message by the APIs
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_tokens(content: str) -> int:
+    """Token count stored in Message.token_count"""
+    return count_tokens(content, TOKEN_COUNT_MODEL)
+
+
+class ContextBuilder:
+    """
+    Builds the message list sent to the LLM for a conversation turn
+    Reads only the most recent messages (newest first, bounded by
+    max_messages) and keeps as many as fit the provider's context window
+    after reserving room for the reply. Token counts come from
+    Message.token_count; rows without one are counted once and saved.
+
+    With rolling memory enabled, messages already folded into
+    Conversation.running_summary are skipped and the summary is sent as a
+    system message instead, so the prompt stays summary + recent turns.
+    """
+
+    def __init__(
+        self,
+        provider: str = 'openai',
+        max_output_tokens: int = 2000,
+        context_tokens: Optional[int] = None,
+        max_messages: Optional[int] = None,
+        safety_margin: float = 0.1,
+        use_memory: Optional[bool] = None
+    ):
+        """
+        Initialize builder
+
+        Args:
+            provider: LLM provider ('openai', 'claude', 'gemini', 'lmstudio')
+            max_output_tokens: Tokens reserved for the model's reply
+            context_tokens: Context window (defaults to settings.LLM_CONTEXT_TOKENS)
+            max_messages: Most messages ever read (settings.CHAT_CONTEXT_MAX_MESSAGES)
+            safety_margin: Fraction of the window left unused for tokenizer drift
+            use_memory: Use the running summary (settings.CHAT_MEMORY_ENABLED)
+        """
+        if context_tokens is None:
+            windows = getattr(settings, 'LLM_CONTEXT_TOKENS', DEFAULT_CONTEXT_TOKENS)
+            context_tokens = windows.get(provider, DEFAULT_CONTEXT_TOKENS['openai'])
+        if max_messages is None:
+            max_messages = getattr(settings, 'CHAT_CONTEXT_MAX_MESSAGES', 200)
+        if use_memory is None:
+            use_memory = getattr(settings, 'CHAT_MEMORY_ENABLED', False)
+
+        self.provider = provider
+        self.max_messages = max_messages
+        self.use_memory = use_memory
+        self.fold_threshold = getattr(settings, 'CHAT_MEMORY_FOLD_THRESHOLD', 40)
+        self.budget = max(int(context_tokens * (1 - safety_margin)) - max_output_tokens, 0)
+        # Messages newer than the running summary seen by the last build()
+        self.unsummarized = 0
+
+    def build(self, conversation_id, history: Optional[List[Message]] = None) -> List[Dict[str, str]]:
+        """
+        Context messages for the next reply
+
+        Args:
+            conversation_id: Conversation primary key
+            history: Newest messages, oldest first, when the caller already
+                     has them (e.g. conversations.message_buffer); read from
+                     the database when None
+
+        Returns:
+            List[Dict]: Oldest-first dicts with 'role' and 'content'. The newest
+                        message is always included, even if it alone exceeds
+                        the budget.
+        """
+        summary, summarized_until = None, None
+        if self.use_memory:
+            summary, summarized_until = self._summary_query(conversation_id).first() or (None, None)
+        summary, summarized_until = self._usable_summary(summary, summarized_until)
+
+        if history is not None:
+            recent = self._unsummarized(history, summarized_until)
+        else:
+            recent = list(self._recent_query(conversation_id, summarized_until))
+        self._fill_token_counts(recent)
+        return self._assemble(summary, recent)
+
+    async def abuild(self, conversation_id, history: Optional[List[Message]] = None) -> List[Dict[str, str]]:
+        """Async build() for consumers, using the async ORM"""
+        summary, summarized_until = None, None
+        if self.use_memory:
+            summary, summarized_until = await self._summary_query(conversation_id).afirst() or (None, None)
+        summary, summarized_until = self._usable_summary(summary, summarized_until)
+
+        if history is not None:
+            recent = self._unsummarized(history, summarized_until)
+        else:
+            recent = [message async for message in self._recent_query(conversation_id, summarized_until)]
+        missing = self._count_missing_tokens(recent)
+        if missing:
+            await Message.objects.abulk_update(missing, ['token_count'])
+        return self._assemble(summary, recent)
+
+    def should_fold(self) -> bool:
+        """Whether enough history has piled up since the running summary to fold it"""
+        return self.use_memory and self.unsummarized >= self.fold_threshold
+
+    def _summary_query(self, conversation_id):
+        return Conversation.objects.filter(id=conversation_id).values_list(
+            'running_summary', 'running_summary_until'
+        )
+
+    def _usable_summary(self, summary, summarized_until):
+        if not summary or summarized_until is None:
+            return None, None
+        return summary, summarized_until
+
+    def _recent_query(self, conversation_id, summarized_until):
+        """Newest messages after the running summary, newest first"""
+        queryset = Message.objects.filter(conversation_id=conversation_id)
+        if summarized_until is not None:
+            queryset = queryset.filter(timestamp__gt=summarized_until)
+        return queryset.order_by('-timestamp').only('id', 'sender', 'content', 'token_count')[:self.max_messages]
+
+    def _unsummarized(self, history, summarized_until):
+        """Same selection as _recent_query from a cached, oldest-first history"""
+        return [
+            message for message in reversed(history)
+            if summarized_until is None or message.timestamp > summarized_until
+        ][:self.max_messages]
+
+    def _assemble(self, summary, recent) -> List[Dict[str, str]]:
+        """Newest-first recent messages that fit the budget, after the summary"""
+        self.unsummarized = len(recent)
+
+        context = []
+        total = 0
+        if summary:
+            content = f"Summary of the earlier conversation:\n{summary}"
+            context.append({'role': 'system', 'content': content})
+            total += message_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+        selected = []
+        for message in recent:
+            cost = message.token_count + MESSAGE_OVERHEAD_TOKENS
+            if selected and total + cost > self.budget:
+                break
+            selected.append(message)
+            total += cost
+
+        selected.reverse()
+        return context + [
+            {'role': 'user' if msg.sender == 'user' else 'assistant',
+             'content': msg.content}
+            for msg in selected
+        ]
+
+    def _count_missing_tokens(self, messages) -> List[Message]:
+        """Count tokens for rows written before token_count existed; returns those rows"""
+        missing = [message for message in messages if message.token_count is None]
+        for message in missing:
+            message.token_count = message_tokens(message.content)
+        return missing
+
+    def _fill_token_counts(self, messages):
+        """Count and persist tokens for rows written before token_count existed"""
+        missing = self._count_missing_tokens(messages)
+        if missing:
+            Message.objects.bulk_update(missing, ['token_count'])
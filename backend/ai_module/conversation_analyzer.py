@@ -1,4 +1,5 @@
 from typing import List, Dict
+from .client_pool import get_client_pool
 from .llm_client import ConversationSummarizer
 import asyncio
 
@@ -10,22 +11,42 @@ class ConversationAnalyzer:
     def __init__(self, provider='openai'):
         self.summarizer = ConversationSummarizer(provider)
     
-    def generate_summary(self, messages: List) -> str:
+    def generate_summary(self, messages: List, previous_summary: str = None) -> str:
         """
         Generate conversation summary synchronously
         
         Args:
             messages: List of Message objects
+            previous_summary: Running summary covering the messages before `messages`
             
         Returns:
             str: Summary text
         """
-        # Run async function in sync context
+        return self._run(self.summarizer.generate_summary(messages, previous_summary))
+    
+    def update_running_summary(self, previous_summary: str, messages: List) -> str:
+        """
+        Fold messages into the running summary synchronously
+        
+        Args:
+            previous_summary: Current running summary (None for the first fold)
+            messages: List of Message objects following it
+            
+        Returns:
+            str: Updated running summary
+        """
+        return self._run(self.summarizer.update_summary(previous_summary, messages))
+    
+    def _run(self, coroutine):
+        """Run async function in sync context"""
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        summary = loop.run_until_complete(self.summarizer.generate_summary(messages))
-        loop.close()
-        return summary
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            # Pooled clients are bound to this loop
+            loop.run_until_complete(get_client_pool().aclose())
+            loop.close()
     
     def extract_key_points(self, messages: List) -> List[str]:
         """Extract key points from conversation"""
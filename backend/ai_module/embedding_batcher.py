@@ -0,0 +1,147 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Optional
+import numpy as np
+from .embeddings import EmbeddingGenerator
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching front end for an EmbeddingGenerator
+    Single-text requests from concurrent callers are collected for up to
+    `max_latency_ms` (or until `max_batch_size` texts are waiting) and
+    encoded with one model call; each caller gets its own row back
+    """
+
+    def __init__(self, model_name: str, max_batch_size: int = 32, max_latency_ms: float = 5.0):
+        """
+        Initialize batcher
+
+        Args:
+            model_name: Embedding model to encode with (shared via the model registry)
+            max_batch_size: Maximum texts per model call
+            max_latency_ms: Longest a request waits for others to join its batch
+        """
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+
+    def submit(self, text: str) -> Future:
+        """
+        Queue a text for embedding
+
+        Args:
+            text: Input text
+
+        Returns:
+            Future: Resolves to the embedding vector
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        """Embed a text, blocking until its batch has been encoded"""
+        return self.submit(text).result(timeout)
+
+    async def aembed(self, text: str) -> np.ndarray:
+        """Embed a text without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Batching metrics
+
+        Returns:
+            Dict: batches run, texts encoded, mean batch size, mean fill
+                  ratio against max_batch_size and the largest batch seen
+        """
+        with self._stats_lock:
+            mean = self._items / self._batches if self._batches else 0.0
+            return {
+                'batches': self._batches,
+                'items': self._items,
+                'mean_batch_size': mean,
+                'mean_fill': mean / self.max_batch_size,
+                'largest_batch': self._largest_batch,
+                'pending': self._queue.qsize(),
+            }
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name=f'embedding-batcher-{self.model_name}',
+                    daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._encode(batch)
+
+    def _encode(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            # Fetched from the registry per batch rather than kept on the
+            # batcher, so the registry's LRU/idle eviction can free the model
+            generator = EmbeddingGenerator(model_name=self.model_name)
+            embeddings = generator.generate_batch_embeddings(texts)
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+
+        for (_, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._largest_batch = max(self._largest_batch, len(batch))
+
+
+_batchers: Dict[str, EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_embedding_batcher(model_name: str) -> EmbeddingBatcher:
+    """Get the process-wide batcher for a model, configured from Django settings"""
+    batcher = _batchers.get(model_name)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(model_name)
+            if batcher is None:
+                from django.conf import settings
+                batcher = EmbeddingBatcher(
+                    model_name,
+                    max_batch_size=getattr(settings, 'EMBEDDING_BATCH_MAX_SIZE', 32),
+                    max_latency_ms=getattr(settings, 'EMBEDDING_BATCH_MAX_LATENCY_MS', 5.0),
+                )
+                _batchers[model_name] = batcher
+    return batcher
@@ -1,6 +1,6 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from typing import List, Union
+from .model_registry import get_model_registry
 
 class EmbeddingGenerator:
     """
@@ -16,8 +16,12 @@ class EmbeddingGenerator:
             model_name: HuggingFace model name
                        'all-MiniLM-L6-v2' - Fast, 384 dimensions
                        'all-mpnet-base-v2' - Better quality, 768 dimensions
+        
+        The model itself is shared through the process-wide registry,
+        so creating a generator does not reload weights from disk.
         """
-        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self.model = get_model_registry().get(model_name)
         self.embedding_dim = self.model.get_sentence_embedding_dimension()
     
     def generate_embedding(self, text: str) -> np.ndarray:
@@ -66,8 +70,8 @@ class EmbeddingGenerator:
         )
         return float(similarity)
     
+    @staticmethod
     def find_most_similar(
-        self, 
         query_embedding: np.ndarray, 
         corpus_embeddings: np.ndarray,
         top_k: int = 5
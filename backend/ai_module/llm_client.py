@@ -1,13 +1,18 @@
-import os
-from typing import AsyncGenerator, List, Dict
-import openai
-from anthropic import AsyncAnthropic
-import google.generativeai as genai
+import asyncio
+import hashlib
+from typing import AsyncGenerator, List, Dict, Optional, Tuple
+from .cache import get_chunk_summary_cache
+from .client_pool import PROVIDER_MODELS, get_client_pool
+from .response_cache import get_response_cache
+from .utils import count_tokens, get_encoding
 
 class LLMClient:
     """
     Unified client for multiple LLM providers
     Supports: OpenAI, Anthropic Claude, Google Gemini, LM Studio
+    
+    Cheap to construct: provider SDK clients and their HTTP connections
+    live in the process-wide ProviderClientPool.
     """
     
     def __init__(self, provider='openai'):
@@ -18,33 +23,21 @@ class LLMClient:
             provider: 'openai', 'claude', 'gemini', or 'lmstudio'
         """
         self.provider = provider.lower()
-        self._setup_client()
+        if self.provider not in PROVIDER_MODELS:
+            raise ValueError(f"Unknown LLM provider: {provider}")
+        self.model = PROVIDER_MODELS[self.provider]
     
-    def _setup_client(self):
-        """Setup the appropriate LLM client based on provider"""
-        if self.provider == 'openai':
-            openai.api_key = os.getenv('OPENAI_API_KEY')
-            self.model = 'gpt-4'
-        
-        elif self.provider == 'claude':
-            self.client = AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-            self.model = 'claude-3-sonnet-20240229'
-        
-        elif self.provider == 'gemini':
-            genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-            self.model = genai.GenerativeModel('gemini-pro')
-        
-        elif self.provider == 'lmstudio':
-            # LM Studio uses OpenAI-compatible API
-            openai.api_base = os.getenv('LM_STUDIO_URL', 'http://localhost:1234/v1')
-            openai.api_key = 'lm-studio'  # LM Studio doesn't require real key
-            self.model = 'local-model'
+    @property
+    def client(self):
+        """Pooled provider client for the running event loop"""
+        return get_client_pool().get(self.provider)
     
     async def stream_chat_response(
         self, 
         messages: List[Dict[str, str]], 
         temperature: float = 0.7,
-        max_tokens: int = 2000
+        max_tokens: int = 2000,
+        use_cache: Optional[bool] = None
     ) -> AsyncGenerator[str, None]:
         """
         Stream chat response from LLM
@@ -53,10 +46,37 @@ class LLMClient:
             messages: List of message dicts with 'role' and 'content'
             temperature: Sampling temperature
             max_tokens: Maximum tokens to generate
+            use_cache: Serve/store the response through the response cache
+                       (None: only deterministic calls, temperature 0)
             
         Yields:
-            str: Response chunks
+            str: Response chunks (replayed in chunks on a cache hit)
         """
+        if use_cache is None:
+            # A sampled reply replayed verbatim would no longer be a sample
+            use_cache = temperature == 0
+        cache = get_response_cache() if use_cache else None
+        if cache is None:
+            async for chunk in self._stream_provider(messages, temperature, max_tokens):
+                yield chunk
+            return
+        
+        lookup = await cache.lookup(self.provider, self.model, messages, temperature, max_tokens)
+        if lookup.response is not None:
+            async for chunk in cache.replay(lookup.response):
+                yield chunk
+            return
+        
+        chunks = []
+        async for chunk in self._stream_provider(messages, temperature, max_tokens):
+            chunks.append(chunk)
+            yield chunk
+        # Only complete responses are cached (not cancelled or failed streams)
+        if chunks:
+            await cache.store(lookup, "".join(chunks))
+    
+    async def _stream_provider(self, messages, temperature, max_tokens):
+        """Stream from the provider API"""
         if self.provider in ['openai', 'lmstudio']:
             async for chunk in self._stream_openai(messages, temperature, max_tokens):
                 yield chunk
@@ -71,7 +91,7 @@ class LLMClient:
     
     async def _stream_openai(self, messages, temperature, max_tokens):
         """Stream from OpenAI API"""
-        response = await openai.ChatCompletion.acreate(
+        response = await self.client.chat.completions.create(
             model=self.model,
             messages=messages,
             temperature=temperature,
@@ -80,8 +100,8 @@ class LLMClient:
         )
         
         async for chunk in response:
-            if chunk.choices.delta.get('content'):
-                yield chunk.choices.delta.content
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     
     async def _stream_claude(self, messages, temperature, max_tokens):
         """Stream from Anthropic Claude API"""
@@ -110,7 +130,7 @@ class LLMClient:
         # Convert messages to Gemini format
         prompt = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
         
-        response = await self.model.generate_content_async(
+        response = await self.client.generate_content_async(
             prompt,
             stream=True,
             generation_config={
@@ -127,7 +147,8 @@ class LLMClient:
         self, 
         messages: List[Dict[str, str]], 
         temperature: float = 0.7,
-        max_tokens: int = 2000
+        max_tokens: int = 2000,
+        use_cache: Optional[bool] = None
     ) -> str:
         """
         Get complete response from LLM (non-streaming)
@@ -136,34 +157,78 @@ class LLMClient:
             messages: List of message dicts
             temperature: Sampling temperature
             max_tokens: Maximum tokens
+            use_cache: See stream_chat_response
             
         Returns:
             str: Complete response
         """
         full_response = ""
-        async for chunk in self.stream_chat_response(messages, temperature, max_tokens):
+        async for chunk in self.stream_chat_response(messages, temperature, max_tokens, use_cache):
             full_response += chunk
         return full_response
 
 
 class ConversationSummarizer:
-    """Generate conversation summaries using LLM"""
+    """
+    Generate conversation summaries using LLM
+    Conversations longer than `chunk_tokens` are summarized map-reduce style:
+    the transcript is split into token-bounded chunks, chunks are summarized
+    concurrently (at most `max_concurrency` requests in flight) and the
+    chunk summaries are reduced, hierarchically if they are still too long.
+    Chunk boundaries only depend on the messages before them and chunk
+    summaries are cached by content, so after new messages arrive only the
+    last chunk is summarized again.
+    """
     
-    def __init__(self, provider='openai'):
+    # Bump when CHUNK_PROMPT changes so cached chunk summaries are not reused
+    CHUNK_PROMPT_VERSION = 1
+    CHUNK_PROMPT = """Summarize this part of a conversation between a user and an AI assistant.
+Keep topics, key points, facts, decisions and action items. Be concise.
+
+{text}
+
+Summary of this part:"""
+    
+    def __init__(
+        self,
+        provider='openai',
+        chunk_tokens: Optional[int] = None,
+        max_concurrency: Optional[int] = None
+    ):
+        """
+        Initialize summarizer
+        
+        Args:
+            provider: LLM provider
+            chunk_tokens: Largest transcript sent in one prompt (settings.SUMMARY_CHUNK_TOKENS)
+            max_concurrency: Chunk summaries in flight at once (settings.SUMMARY_MAX_CONCURRENCY)
+        """
+        from django.conf import settings
+        
         self.llm_client = LLMClient(provider)
+        self.provider = provider
+        self.chunk_tokens = chunk_tokens or getattr(settings, 'SUMMARY_CHUNK_TOKENS', 3000)
+        self.max_concurrency = max_concurrency or getattr(settings, 'SUMMARY_MAX_CONCURRENCY', 4)
     
-    async def generate_summary(self, messages: List[Dict]) -> str:
+    async def generate_summary(self, messages: List[Dict], previous_summary: str = None) -> str:
         """
         Generate a summary of the conversation
         
         Args:
             messages: List of Message objects
+            previous_summary: Running summary of the messages before `messages`,
+                              used instead of resending them
             
         Returns:
             str: Summary text
         """
-        # Format conversation for summarization
-        conversation_text = self._format_conversation(messages)
+        # Format conversation for summarization (condensed if too long)
+        conversation_text = await self._condense(messages)
+        if previous_summary:
+            conversation_text = (
+                f"[Summary of the earlier part of the conversation]\n{previous_summary}\n\n"
+                f"[Remaining messages]\n{conversation_text}"
+            )
         
         prompt = f"""Please provide a comprehensive summary of the following conversation. 
 Include:
@@ -177,16 +242,129 @@ Conversation:
 
 Summary:"""
         
+        # Re-summarizing an unchanged transcript (retries, reprocessing)
+        # replays the stored summary
         summary = await self.llm_client.get_completion([
             {'role': 'user', 'content': prompt}
-        ], temperature=0.3, max_tokens=500)
+        ], temperature=0.3, max_tokens=500, use_cache=True)
         
         return summary
     
+    async def update_summary(self, previous_summary: str, messages: List) -> str:
+        """
+        Fold older turns into the running conversation summary
+        
+        Args:
+            previous_summary: Current running summary (None for the first fold)
+            messages: Message objects following the previous summary
+            
+        Returns:
+            str: Updated running summary
+        """
+        conversation_text = await self._condense(messages)
+        
+        prompt = f"""You maintain the memory of an ongoing conversation between a user and an AI assistant.
+Update the running summary with the new messages. Keep facts, names, numbers, user preferences,
+decisions and open questions the assistant needs to continue the conversation. Be concise.
+
+Running summary:
+{previous_summary or '(none yet)'}
+
+New messages:
+{conversation_text}
+
+Updated running summary:"""
+        
+        return await self.llm_client.get_completion([
+            {'role': 'user', 'content': prompt}
+        ], temperature=0.2, max_tokens=500, use_cache=True)
+    
     def _format_conversation(self, messages) -> str:
         """Format messages into readable text"""
-        formatted = []
+        return "\n".join(line for line, _ in self._format_lines(messages))
+    
+    def _format_lines(self, messages) -> List[Tuple[str, int]]:
+        """Transcript lines with their token counts (Message.token_count when stored)"""
+        lines = []
         for msg in messages:
             sender = "User" if msg.sender == 'user' else "AI"
-            formatted.append(f"{sender}: {msg.content}")
-        return "\n".join(formatted)
+            line = f"{sender}: {msg.content}"
+            tokens = getattr(msg, 'token_count', None)
+            lines.append((line, tokens + 2 if tokens is not None else count_tokens(line)))
+        return lines
+    
+    async def _condense(self, messages) -> str:
+        """
+        Transcript that fits one prompt
+        
+        Returns the formatted messages when they fit `chunk_tokens`, otherwise
+        the map-reduced chunk summaries in conversation order.
+        """
+        lines = self._format_lines(messages)
+        if sum(tokens for _, tokens in lines) <= self.chunk_tokens:
+            return "\n".join(line for line, _ in lines)
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        summaries = await self._summarize_chunks(self._split(lines), semaphore)
+        
+        # Reduce until the summaries fit one prompt (or cannot be grouped further)
+        while len(summaries) > 1:
+            parts = [(summary, count_tokens(summary)) for summary in summaries]
+            if sum(tokens for _, tokens in parts) <= self.chunk_tokens:
+                break
+            groups = self._split(parts, separator="\n\n")
+            if len(groups) >= len(summaries):
+                break
+            summaries = await self._summarize_chunks(groups, semaphore)
+        
+        return "\n\n".join(
+            f"[Part {i}]\n{summary}" for i, summary in enumerate(summaries, start=1)
+        )
+    
+    def _split(self, lines: List[Tuple[str, int]], separator: str = "\n") -> List[str]:
+        """Greedily pack consecutive lines into chunks of at most chunk_tokens"""
+        chunks = []
+        current, current_tokens = [], 0
+        for line, tokens in lines:
+            if tokens > self.chunk_tokens:
+                # A single oversized message is cut to fit on its own
+                encoding = get_encoding()
+                line = encoding.decode(encoding.encode(line, disallowed_special=())[:self.chunk_tokens])
+                tokens = self.chunk_tokens
+            if current and current_tokens + tokens > self.chunk_tokens:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            current.append(line)
+            current_tokens += tokens
+        if current:
+            chunks.append(separator.join(current))
+        return chunks
+    
+    async def _summarize_chunks(self, chunks: List[str], semaphore: asyncio.Semaphore) -> List[str]:
+        """Summarize chunks concurrently, reusing cached summaries"""
+        return await asyncio.gather(*(
+            self._summarize_chunk(chunk, semaphore) for chunk in chunks
+        ))
+    
+    async def _summarize_chunk(self, chunk: str, semaphore: asyncio.Semaphore) -> str:
+        cache = get_chunk_summary_cache()
+        key = hashlib.sha256(
+            f"{self.provider}:{self.CHUNK_PROMPT_VERSION}\n{chunk}".encode('utf-8')
+        ).hexdigest()
+        summary = await self._cache_call(cache, cache.get, key)
+        if summary is not None:
+            return summary
+        
+        async with semaphore:
+            summary = await self.llm_client.get_completion([
+                {'role': 'user', 'content': self.CHUNK_PROMPT.format(text=chunk)}
+            ], temperature=0.3, max_tokens=400)
+        await self._cache_call(cache, cache.set, key, summary)
+        return summary
+    
+    @staticmethod
+    async def _cache_call(cache, fn, *args):
+        # Redis round trips run off the event loop so chunks stay concurrent
+        if cache.use_redis:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import AsyncGenerator, Dict, List, Optional
+from .llm_client import LLMClient
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when no provider produced a response"""
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker
+    Opens after `failure_threshold` consecutive failures; after
+    `reset_timeout` seconds a single trial request is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        # Request holding the half-open trial, None when no trial is in flight
+        self._trial_owner = None
+        self._lock = threading.Lock()
+
+    def allow(self, owner=None) -> bool:
+        """Whether a request may be sent now (claims the half-open trial for `owner`)"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self._trial_owner is not None:
+                return False
+            self._trial_owner = owner if owner is not None else object()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_owner = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_owner = None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self, owner):
+        """Give back the half-open trial if `owner` holds it (its request was cancelled)"""
+        with self._lock:
+            if owner is not None and self._trial_owner is owner:
+                self._trial_owner = None
+
+
+class ProviderStats:
+    """Request counters and time-to-first-token samples for one provider"""
+
+    def __init__(self, window: int = 200):
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.wins = 0
+        self.ttft = deque(maxlen=window)
+
+    def as_dict(self) -> Dict:
+        samples = sorted(self.ttft)
+        return {
+            'requests': self.requests,
+            'successes': self.successes,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'hedges': self.hedges,
+            'wins': self.wins,
+            'ttft_mean_ms': 1000 * sum(samples) / len(samples) if samples else None,
+            'ttft_p95_ms': 1000 * samples[int(0.95 * (len(samples) - 1))] if samples else None,
+        }
+
+
+class _Attempt:
+    """One provider stream, forwarding its events to the router's queue"""
+
+    def __init__(
+        self, client: LLMClient, queue: asyncio.Queue, messages, temperature, max_tokens,
+        hedge=False, ticket=None, use_cache=None
+    ):
+        self.provider = client.provider
+        self.hedge = hedge
+        # Owner token the provider's circuit breaker was asked with
+        self.ticket = ticket
+        self.started = time.monotonic()
+        self.task = asyncio.create_task(
+            self._run(client, queue, messages, temperature, max_tokens, use_cache)
+        )
+
+    async def _run(self, client, queue, messages, temperature, max_tokens, use_cache):
+        try:
+            async for chunk in client.stream_chat_response(messages, temperature, max_tokens, use_cache):
+                await queue.put((self, 'chunk', chunk))
+            await queue.put((self, 'done', None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            await queue.put((self, 'error', exc))
+
+    def cancel(self):
+        self.task.cancel()
+
+
+class LLMRouter:
+    """
+    Routes chat requests across providers
+    Providers are tried in order, skipping those whose circuit is open. A
+    provider that errors or produces no chunk within `first_token_timeout`
+    seconds is abandoned for the next one. With `hedge_after_ms`, a second
+    provider is started if the first has not produced a chunk by then;
+    whichever streams first wins and the other is cancelled. Once a chunk
+    has been sent the stream is committed to that provider.
+    """
+
+    def __init__(
+        self,
+        providers: List[str],
+        first_token_timeout: float = 10.0,
+        hedge_after_ms: Optional[float] = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clients: Optional[Dict[str, LLMClient]] = None
+    ):
+        """
+        Initialize router
+
+        Args:
+            providers: Provider names in order of preference
+            first_token_timeout: Seconds a provider gets to produce its first chunk
+            hedge_after_ms: Start the next provider in parallel after this
+                            long without a chunk (None disables hedging)
+            failure_threshold: Consecutive failures that open a provider's circuit
+            reset_timeout: Seconds before an open circuit lets a trial through
+            clients: Client per provider (defaults to pooled LLMClients)
+        """
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = [provider.lower() for provider in providers]
+        self.first_token_timeout = first_token_timeout
+        self.hedge_after = hedge_after_ms / 1000 if hedge_after_ms else None
+        self.clients = clients or {provider: LLMClient(provider) for provider in self.providers}
+        self.breakers = {
+            provider: CircuitBreaker(failure_threshold, reset_timeout) for provider in self.providers
+        }
+        self._stats = {provider: ProviderStats() for provider in self.providers}
+
+    @property
+    def provider(self) -> str:
+        """Preferred provider"""
+        return self.providers[0]
+
+    async def stream_chat_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        use_cache: Optional[bool] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream a chat response from the first healthy provider
+
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            temperature: Sampling temperature
+            max_tokens: Maximum tokens to generate
+            use_cache: Passed to each provider's LLMClient (response cache)
+
+        Yields:
+            str: Response chunks
+
+        Raises:
+            LLMUnavailableError: Every provider failed, timed out or is open,
+                                 or the chosen provider failed mid-stream
+        """
+        candidates = iter(self.providers)
+        queue: asyncio.Queue = asyncio.Queue()
+        active: List[_Attempt] = []
+        last_error: Optional[BaseException] = None
+        hedge_at = None
+        winner = None
+
+        def start_next(hedge=False):
+            for provider in candidates:
+                ticket = object()
+                if self.breakers[provider].allow(ticket):
+                    stats = self._stats[provider]
+                    stats.requests += 1
+                    stats.hedges += hedge
+                    active.append(_Attempt(
+                        self.clients[provider], queue, messages, temperature, max_tokens,
+                        hedge, ticket, use_cache
+                    ))
+                    return True
+            return False
+
+        def fail(attempt, timed_out=False):
+            active.remove(attempt)
+            attempt.cancel()
+            self.breakers[attempt.provider].record_failure()
+            self._stats[attempt.provider].failures += 1
+            self._stats[attempt.provider].timeouts += timed_out
+
+        try:
+            # Wait for the first chunk from any attempt
+            start_next()
+            if self.hedge_after is not None:
+                hedge_at = time.monotonic() + self.hedge_after
+            while winner is None:
+                if not active and not start_next():
+                    raise LLMUnavailableError("No LLM provider available") from last_error
+
+                deadlines = [attempt.started + self.first_token_timeout for attempt in active]
+                if hedge_at is not None:
+                    deadlines.append(hedge_at)
+                try:
+                    attempt, kind, value = await asyncio.wait_for(
+                        queue.get(), max(min(deadlines) - time.monotonic(), 0)
+                    )
+                except asyncio.TimeoutError:
+                    now = time.monotonic()
+                    for attempt in [a for a in active if now >= a.started + self.first_token_timeout]:
+                        logger.warning("LLM provider %s produced no output in %.1fs",
+                                       attempt.provider, self.first_token_timeout)
+                        last_error = TimeoutError(f"{attempt.provider} first token timeout")
+                        fail(attempt, timed_out=True)
+                    if hedge_at is not None and now >= hedge_at:
+                        hedge_at = None
+                        if active:
+                            start_next(hedge=True)
+                    continue
+
+                if attempt not in active:
+                    continue
+                if kind == 'error':
+                    logger.warning("LLM provider %s failed: %s", attempt.provider, value)
+                    last_error = value
+                    fail(attempt)
+                    continue
+
+                # First chunk (or an empty response): commit to this provider
+                winner = attempt
+                hedge_at = None
+                self._stats[winner.provider].ttft.append(time.monotonic() - winner.started)
+                self._stats[winner.provider].wins += winner.hedge
+                for loser in [a for a in active if a is not winner]:
+                    active.remove(loser)
+                    loser.cancel()
+                    self.breakers[loser.provider].release(loser.ticket)
+                if kind == 'done':
+                    self._succeed(winner)
+                    return
+                yield value
+
+            # Stream the rest from the winner
+            while True:
+                attempt, kind, value = await queue.get()
+                if attempt is not winner:
+                    continue
+                if kind == 'chunk':
+                    yield value
+                elif kind == 'done':
+                    self._succeed(winner)
+                    return
+                else:
+                    logger.warning("LLM provider %s failed mid-stream: %s", winner.provider, value)
+                    fail(winner)
+                    raise LLMUnavailableError(f"{winner.provider} failed mid-stream") from value
+        finally:
+            # Reached on completion, failure or when the caller stops reading
+            for attempt in active:
+                attempt.cancel()
+                self.breakers[attempt.provider].release(attempt.ticket)
+
+    async def get_completion(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        use_cache: Optional[bool] = None
+    ) -> str:
+        """Complete (non-streaming) response through the router"""
+        full_response = ""
+        async for chunk in self.stream_chat_response(messages, temperature, max_tokens, use_cache):
+            full_response += chunk
+        return full_response
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Routing metrics per provider
+
+        Returns:
+            Dict: provider -> counters, TTFT mean/p95 (ms) and circuit state
+        """
+        return {
+            provider: {**self._stats[provider].as_dict(), 'circuit': self.breakers[provider].state}
+            for provider in self.providers
+        }
+
+    def _succeed(self, attempt):
+        self.breakers[attempt.provider].record_success()
+        self._stats[attempt.provider].successes += 1
+
+
+_router: Optional[LLMRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_llm_router() -> LLMRouter:
+    """Get the process-wide router (breakers and metrics are per worker), configured from Django settings"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                from django.conf import settings
+                _router = LLMRouter(
+                    providers=getattr(settings, 'LLM_PROVIDERS', ['openai']),
+                    first_token_timeout=getattr(settings, 'LLM_FIRST_TOKEN_TIMEOUT', 10.0),
+                    hedge_after_ms=getattr(settings, 'LLM_HEDGE_AFTER_MS', None),
+                    failure_threshold=getattr(settings, 'LLM_BREAKER_FAILURES', 5),
+                    reset_timeout=getattr(settings, 'LLM_BREAKER_RESET_SECONDS', 30.0),
+                )
+    return _router
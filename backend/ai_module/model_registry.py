@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from sentence_transformers import SentenceTransformer
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded SentenceTransformer models
+    Each model is loaded lazily on first use and then shared by every
+    EmbeddingGenerator in the worker, so a request never reloads weights
+    """
+
+    def __init__(self, max_models: int = 2, max_idle_seconds: Optional[float] = None):
+        """
+        Initialize model registry
+
+        Args:
+            max_models: Maximum number of models kept in memory; the least
+                        recently used model is unloaded when exceeded
+            max_idle_seconds: Unload models not used for this long
+                              (checked on access and by evict_idle)
+        """
+        self.max_models = max_models
+        self.max_idle_seconds = max_idle_seconds
+        self._models: "OrderedDict[str, SentenceTransformer]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # One lock per model name so a slow load does not block other models
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, model_name: str) -> SentenceTransformer:
+        """
+        Get a loaded model, loading it on first use
+
+        Args:
+            model_name: HuggingFace model name
+
+        Returns:
+            SentenceTransformer: Shared model instance
+        """
+        with self._lock:
+            model = self._touch(model_name)
+            if model is not None:
+                return model
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        with load_lock:
+            # Another thread may have finished loading while we waited
+            with self._lock:
+                model = self._touch(model_name)
+                if model is not None:
+                    return model
+
+            model = SentenceTransformer(model_name)
+
+            with self._lock:
+                self._models[model_name] = model
+                self._last_used[model_name] = time.monotonic()
+                self._evict_locked()
+            return model
+
+    def warm_up(self, model_names: Iterable[str]) -> List[str]:
+        """
+        Load models ahead of the first request
+
+        Args:
+            model_names: Model names to load
+
+        Returns:
+            List[str]: Names of the models that were loaded
+        """
+        loaded = []
+        for name in model_names:
+            name = name.strip()
+            if name:
+                self.get(name)
+                loaded.append(name)
+        return loaded
+
+    def unload(self, model_name: str) -> bool:
+        """
+        Unload a model so its memory can be reclaimed
+
+        Args:
+            model_name: Model to unload
+
+        Returns:
+            bool: True if the model was loaded
+        """
+        with self._lock:
+            self._last_used.pop(model_name, None)
+            return self._models.pop(model_name, None) is not None
+
+    def evict_idle(self) -> List[str]:
+        """Unload every model idle for longer than max_idle_seconds"""
+        with self._lock:
+            return self._evict_idle_locked()
+
+    def loaded_models(self) -> List[str]:
+        """Names of models currently in memory (least recently used first)"""
+        with self._lock:
+            return list(self._models.keys())
+
+    def _touch(self, model_name: str) -> Optional[SentenceTransformer]:
+        """Return a loaded model and mark it as recently used (lock held)"""
+        self._evict_idle_locked()
+        model = self._models.get(model_name)
+        if model is not None:
+            self._models.move_to_end(model_name)
+            self._last_used[model_name] = time.monotonic()
+        return model
+
+    def _evict_locked(self):
+        """Enforce max_models by dropping least recently used models (lock held)"""
+        while self.max_models and len(self._models) > self.max_models:
+            name, _ = self._models.popitem(last=False)
+            self._last_used.pop(name, None)
+
+    def _evict_idle_locked(self) -> List[str]:
+        if not self.max_idle_seconds:
+            return []
+        cutoff = time.monotonic() - self.max_idle_seconds
+        evicted = [name for name, ts in self._last_used.items() if ts < cutoff]
+        for name in evicted:
+            self._models.pop(name, None)
+            self._last_used.pop(name, None)
+        return evicted
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Get the process-wide model registry, configured from Django settings"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from django.conf import settings
+                _registry = ModelRegistry(
+                    max_models=getattr(settings, 'EMBEDDING_MAX_LOADED_MODELS', 2),
+                    max_idle_seconds=getattr(settings, 'EMBEDDING_MODEL_IDLE_TIMEOUT', None),
+                )
+    return _registry
+
+
+def warm_up_models() -> List[str]:
+    """Load the models listed in settings.EMBEDDING_WARMUP_MODELS (server startup hook)"""
+    from django.conf import settings
+    model_names = getattr(settings, 'EMBEDDING_WARMUP_MODELS', [])
+    return get_model_registry().warm_up(model_names)
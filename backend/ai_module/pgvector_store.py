@@ -0,0 +1,205 @@
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from django.db import connection, transaction
+from conversations.models import Conversation, ConversationEmbedding
+from .quantization import decode_embedding
+
+# Native pgvector column added next to ConversationEmbedding.embedding_vector
+# by `manage.py setup_pgvector`; it is not declared on the model, so regular
+# ORM queries never transfer it
+VECTOR_COLUMN = 'embedding_pgvector'
+
+
+class PgVectorStore:
+    """
+    In-database similarity search using the pgvector extension
+    The date/status filters and the cosine top-k run in a single SQL query,
+    so only the k winners leave the database
+    """
+
+    def __init__(self, ef_search: Optional[int] = None, probes: Optional[int] = None):
+        """
+        Initialize store
+
+        Args:
+            ef_search: HNSW candidate list size per query (recall/latency knob)
+            probes: IVFFlat lists scanned per query (recall/latency knob)
+        """
+        self.ef_search = ef_search
+        self.probes = probes
+        self.table = ConversationEmbedding._meta.db_table
+        self.conversation_table = Conversation._meta.db_table
+
+    def setup(self, dim: int = 768):
+        """
+        Create the extension and the vector column
+
+        Args:
+            dim: Embedding dimension
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            cursor.execute(
+                f"ALTER TABLE {self.table} "
+                f"ADD COLUMN IF NOT EXISTS {VECTOR_COLUMN} vector({int(dim)})"
+            )
+
+    def create_index(
+        self,
+        index_type: str = 'hnsw',
+        m: int = 16,
+        ef_construction: int = 64,
+        lists: int = 100
+    ):
+        """
+        Create the cosine ANN index (after backfilling, so IVFFlat lists are trained on data)
+
+        Args:
+            index_type: 'hnsw' or 'ivfflat'
+            m: HNSW graph degree
+            ef_construction: HNSW build-time candidate list size
+            lists: IVFFlat list count
+        """
+        if index_type == 'hnsw':
+            index_sql = (
+                f"USING hnsw ({VECTOR_COLUMN} vector_cosine_ops) "
+                f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+            )
+        elif index_type == 'ivfflat':
+            index_sql = f"USING ivfflat ({VECTOR_COLUMN} vector_cosine_ops) WITH (lists = {int(lists)})"
+        else:
+            raise ValueError(f"Unknown pgvector index type: {index_type}")
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_{VECTOR_COLUMN}_idx "
+                f"ON {self.table} {index_sql}"
+            )
+
+    def backfill(self, batch_size: int = 5000) -> int:
+        """
+        Copy existing embeddings into the vector column
+
+        Array rows are cast inside the database; rows in a compact binary
+        format are decoded in Python and written back in batches.
+
+        Returns:
+            int: Number of rows updated
+        """
+        total = 0
+        with connection.cursor() as cursor:
+            while True:
+                cursor.execute(
+                    f"UPDATE {self.table} SET {VECTOR_COLUMN} = embedding_vector::vector "
+                    f"WHERE id IN (SELECT id FROM {self.table} "
+                    f"WHERE {VECTOR_COLUMN} IS NULL AND embedding_vector IS NOT NULL LIMIT %s)",
+                    [batch_size]
+                )
+                if cursor.rowcount <= 0:
+                    break
+                total += cursor.rowcount
+
+            while True:
+                cursor.execute(
+                    f"SELECT conversation_id, embedding_data, embedding_format, embedding_scale "
+                    f"FROM {self.table} "
+                    f"WHERE {VECTOR_COLUMN} IS NULL AND embedding_data IS NOT NULL LIMIT %s",
+                    [batch_size]
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                self.write_many(
+                    (conversation_id, decode_embedding(data, storage_format, scale))
+                    for conversation_id, data, storage_format, scale in rows
+                )
+                total += len(rows)
+        return total
+
+    def write(self, conversation_id, vector: np.ndarray):
+        """Store the vector for one conversation"""
+        self.write_many([(conversation_id, vector)])
+
+    def write_many(self, rows: Iterable[Tuple]):
+        """
+        Store vectors for several conversations
+
+        Args:
+            rows: (conversation_id, vector) pairs; the embedding row must exist
+        """
+        params = [(self._to_literal(vector), str(conversation_id)) for conversation_id, vector in rows]
+        if not params:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {self.table} SET {VECTOR_COLUMN} = %s::vector WHERE conversation_id = %s",
+                params
+            )
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        status: Optional[str] = 'ended',
+        min_similarity: Optional[float] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Find the most similar conversations in the database
+
+        Args:
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+            date_from: Only conversations created at or after this time
+            date_to: Only conversations created at or before this time
+            status: Only conversations with this status (None for any)
+            min_similarity: Drop results below this cosine similarity
+
+        Returns:
+            List[Tuple[str, float]]: (conversation_id, cosine similarity), best first
+        """
+        query = self._to_literal(query_embedding)
+        where = [f"e.{VECTOR_COLUMN} IS NOT NULL"]
+        params = [query]
+
+        if status is not None:
+            where.append("c.status = %s")
+            params.append(status)
+        if date_from is not None:
+            where.append("c.created_at >= %s")
+            params.append(date_from)
+        if date_to is not None:
+            where.append("c.created_at <= %s")
+            params.append(date_to)
+
+        params.extend([query, top_k])
+        sql = (
+            f"SELECT e.conversation_id, 1 - (e.{VECTOR_COLUMN} <=> %s::vector) AS score "
+            f"FROM {self.table} e "
+            f"JOIN {self.conversation_table} c ON c.id = e.conversation_id "
+            f"WHERE {' AND '.join(where)} "
+            f"ORDER BY e.{VECTOR_COLUMN} <=> %s::vector "
+            f"LIMIT %s"
+        )
+
+        # SET LOCAL only lasts for the surrounding transaction
+        with transaction.atomic(), connection.cursor() as cursor:
+            if self.ef_search:
+                cursor.execute(f"SET LOCAL hnsw.ef_search = {int(self.ef_search)}")
+            if self.probes:
+                cursor.execute(f"SET LOCAL ivfflat.probes = {int(self.probes)}")
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        results = [(str(conversation_id), float(score)) for conversation_id, score in rows]
+        if min_similarity is not None:
+            results = [(cid, score) for cid, score in results if score >= min_similarity]
+        return results
+
+    @staticmethod
+    def _to_literal(vector) -> str:
+        """Format a vector as a pgvector text literal"""
+        values = np.asarray(vector, dtype=np.float32).tolist()
+        return '[' + ','.join(repr(v) for v in values) + ']'
@@ -0,0 +1,117 @@
+from typing import Optional, Sequence, Tuple
+import numpy as np
+
+# Compact binary embedding formats stored in ConversationEmbedding.embedding_data
+# 'array' is the legacy double precision[] column
+STORAGE_FORMATS = ('array', 'float32', 'float16', 'int8')
+
+_DTYPES = {
+    'float32': np.dtype('<f4'),
+    'float16': np.dtype('<f2'),
+    'int8': np.dtype('i1'),
+}
+
+
+def encode_embedding(vector, storage_format: str) -> Tuple[bytes, Optional[float]]:
+    """
+    Serialize an embedding into compact bytes
+
+    Args:
+        vector: Embedding vector
+        storage_format: 'float32', 'float16' or 'int8' (scalar-quantized)
+
+    Returns:
+        Tuple[bytes, Optional[float]]: Raw bytes and the per-vector scale
+                                       (int8 only, None otherwise)
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+
+    if storage_format == 'int8':
+        # Symmetric per-vector quantization: value = code * scale
+        max_abs = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = max_abs / 127 if max_abs > 0 else 1.0
+        codes = np.clip(np.rint(vector / scale), -127, 127).astype(_DTYPES['int8'])
+        return codes.tobytes(), scale
+
+    if storage_format in _DTYPES:
+        return vector.astype(_DTYPES[storage_format]).tobytes(), None
+
+    raise ValueError(f"Unknown embedding storage format: {storage_format}")
+
+
+def decode_embedding(data, storage_format: str, scale: Optional[float] = None) -> np.ndarray:
+    """
+    Load an embedding from compact bytes
+
+    float32 data is returned as a zero-copy read-only view over the buffer;
+    float16 and int8 are widened to float32.
+
+    Args:
+        data: bytes/memoryview from embedding_data
+        storage_format: Format the bytes were written with
+        scale: Per-vector scale for int8
+
+    Returns:
+        np.ndarray: float32 embedding
+    """
+    dtype = _DTYPES.get(storage_format)
+    if dtype is None:
+        raise ValueError(f"Unknown embedding storage format: {storage_format}")
+
+    codes = np.frombuffer(data, dtype=dtype)
+    if storage_format == 'float32':
+        return codes
+    vector = codes.astype(np.float32)
+    if storage_format == 'int8':
+        vector *= scale if scale is not None else 1.0
+    return vector
+
+
+def stored_embedding(
+    array: Optional[Sequence[float]],
+    data,
+    storage_format: str,
+    scale: Optional[float]
+) -> np.ndarray:
+    """
+    Embedding of a ConversationEmbedding row in whichever column holds it
+
+    Args:
+        array: embedding_vector (legacy column, may be None)
+        data: embedding_data
+        storage_format: embedding_format
+        scale: embedding_scale
+
+    Returns:
+        np.ndarray: float32 embedding
+    """
+    if data is not None and storage_format in _DTYPES:
+        return decode_embedding(data, storage_format, scale)
+    return np.asarray(array, dtype=np.float32)
+
+
+def storage_fields(vector, storage_format: str) -> dict:
+    """
+    ConversationEmbedding field values for storing a vector
+
+    Args:
+        vector: Embedding vector
+        storage_format: One of STORAGE_FORMATS
+
+    Returns:
+        dict: Values for embedding_vector/embedding_data/embedding_format/embedding_scale
+    """
+    if storage_format == 'array':
+        return {
+            'embedding_vector': np.asarray(vector, dtype=np.float64).tolist(),
+            'embedding_data': None,
+            'embedding_format': 'array',
+            'embedding_scale': None,
+        }
+    data, scale = encode_embedding(vector, storage_format)
+    return {
+        'embedding_vector': None,
+        'embedding_data': data,
+        'embedding_format': storage_format,
+        'embedding_scale': scale,
+    }
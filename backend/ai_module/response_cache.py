@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, Dict, List, NamedTuple, Optional
+import numpy as np
+from .cache import LRUCache, TextCache
+
+
+class CacheLookup(NamedTuple):
+    """Result of ResponseCache.lookup, passed back to store() on a miss"""
+    key: str
+    scope: str
+    embedding: Optional[np.ndarray]
+    response: Optional[str]
+
+
+class ResponseCache:
+    """
+    Cache of LLM responses
+    Exact mode keys on a hash of (provider, model, messages, temperature,
+    max_tokens) in an LRU/TTL tier, optionally backed by Redis.
+
+    Semantic mode also reuses the answer to a near-duplicate prompt: the
+    last message is embedded (shared EmbeddingGenerator via the batcher)
+    and compared with cached prompts that have the same provider, model,
+    parameters and identical earlier messages, so only the final question
+    may differ.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = 3600,
+        use_redis: bool = False,
+        semantic: bool = False,
+        semantic_threshold: float = 0.95,
+        semantic_model: str = 'all-mpnet-base-v2',
+        semantic_entries_per_scope: int = 256,
+        replay_chunk_chars: int = 24
+    ):
+        """
+        Initialize cache
+
+        Args:
+            max_size: Exact-match entries kept in process
+            ttl: Seconds a response stays cached
+            use_redis: Share exact-match entries through Redis
+            semantic: Enable near-duplicate matching
+            semantic_threshold: Cosine similarity needed for a semantic hit
+            semantic_model: Embedding model for prompts
+            semantic_entries_per_scope: Prompts remembered per shared prefix
+            replay_chunk_chars: Characters per chunk when replaying a response
+        """
+        self.exact = TextCache(max_size=max_size, ttl=ttl, use_redis=use_redis, key_prefix='llm-response')
+        self.ttl = ttl
+        self.semantic = semantic
+        self.semantic_threshold = semantic_threshold
+        self.semantic_model = semantic_model
+        self.semantic_entries_per_scope = semantic_entries_per_scope
+        self.replay_chunk_chars = replay_chunk_chars
+        # scope -> OrderedDict[key, (embedding, response, expires_at)]
+        self._scopes = LRUCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    async def lookup(
+        self,
+        provider: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> CacheLookup:
+        """
+        Find a cached response
+
+        Returns:
+            CacheLookup: response is None on a miss
+        """
+        key = self._hash(provider, model, messages, temperature, max_tokens)
+        response = await self._call(self.exact.get, key)
+        if response is not None:
+            self.hits += 1
+            return CacheLookup(key, '', None, response)
+
+        scope, embedding = '', None
+        if self.semantic and messages:
+            scope = self._hash(provider, model, messages[:-1], temperature, max_tokens)
+            embedding = await self._embed(messages[-1]['content'])
+            response = self._semantic_match(scope, embedding)
+            if response is not None:
+                self.semantic_hits += 1
+                return CacheLookup(key, scope, embedding, response)
+
+        self.misses += 1
+        return CacheLookup(key, scope, embedding, None)
+
+    async def store(self, lookup: CacheLookup, response: str):
+        """Cache the response for a lookup that missed"""
+        await self._call(self.exact.set, lookup.key, response)
+        if lookup.embedding is None:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            entries = self._scopes.get(lookup.scope)
+            if entries is None:
+                entries = OrderedDict()
+                self._scopes.set(lookup.scope, entries)
+            entries[lookup.key] = (lookup.embedding, response, expires_at)
+            entries.move_to_end(lookup.key)
+            while len(entries) > self.semantic_entries_per_scope:
+                entries.popitem(last=False)
+
+    async def replay(self, response: str) -> AsyncGenerator[str, None]:
+        """Yield a cached response in chunks, like a provider stream"""
+        size = self.replay_chunk_chars
+        for start in range(0, len(response), size):
+            yield response[start:start + size]
+            # Let the consumer flush each chunk to the socket
+            await asyncio.sleep(0)
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'semantic_hits': self.semantic_hits, 'misses': self.misses}
+
+    async def _call(self, fn, *args):
+        # Redis round trips run off the event loop
+        if self.exact.use_redis:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _hash(self, provider, model, messages, temperature, max_tokens) -> str:
+        payload = json.dumps(
+            [provider, model, messages, temperature, max_tokens],
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def _embed(self, text: str) -> np.ndarray:
+        from .embedding_batcher import get_embedding_batcher
+        embedding = np.asarray(await get_embedding_batcher(self.semantic_model).aembed(text), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _semantic_match(self, scope: str, embedding: np.ndarray) -> Optional[str]:
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if not entries:
+                return None
+            now = time.monotonic()
+            for key in [k for k, (_, _, expires_at) in entries.items() if expires_at and expires_at <= now]:
+                del entries[key]
+            if not entries:
+                return None
+            keys = list(entries)
+            matrix = np.stack([entries[k][0] for k in keys])
+            scores = matrix @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] < self.semantic_threshold:
+                return None
+            entries.move_to_end(keys[best])
+            return entries[keys[best]][1]
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the process-wide LLM response cache (None when disabled in settings)"""
+    global _response_cache
+    from django.conf import settings
+    if not getattr(settings, 'LLM_RESPONSE_CACHE_ENABLED', False):
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            max_size=getattr(settings, 'LLM_RESPONSE_CACHE_SIZE', 1024),
+            ttl=getattr(settings, 'LLM_RESPONSE_CACHE_TTL', 3600),
+            use_redis=getattr(settings, 'LLM_RESPONSE_CACHE_REDIS', False),
+            semantic=getattr(settings, 'LLM_RESPONSE_CACHE_SEMANTIC', False),
+            semantic_threshold=getattr(settings, 'LLM_RESPONSE_CACHE_SEMANTIC_THRESHOLD', 0.95),
+            replay_chunk_chars=getattr(settings, 'LLM_RESPONSE_CACHE_REPLAY_CHARS', 24),
+        )
+    return _response_cache
@@ -1,18 +1,48 @@
-import numpy as np
 from typing import List, Dict, Optional
 from datetime import datetime
-from django.db.models import Q
+from django.conf import settings
+from django.utils import timezone
 from conversations.models import Conversation, ConversationEmbedding
+from .cache import (
+    get_query_embedding_cache,
+    get_search_index_version,
+    get_search_result_cache,
+    normalize_query
+)
 from .embeddings import EmbeddingGenerator
+from .embedding_batcher import get_embedding_batcher
+from .quantization import storage_fields
+from .vector_index import get_vector_index
 
 class SemanticSearch:
     """
     Semantic search implementation for conversations
     Uses sentence transformers for embedding generation
+    
+    Ranking runs either against the resident in-memory vector index
+    ('memory') or inside Postgres with pgvector ('pgvector'), selected by
+    settings.SEMANTIC_SEARCH_BACKEND.
     """
     
+    model_name = 'all-mpnet-base-v2'
+    
     def __init__(self):
-        self.embedding_generator = EmbeddingGenerator(model_name='all-mpnet-base-v2')
+        # Coalesces concurrent single-text encodes into one model call
+        self.batcher = get_embedding_batcher(self.model_name)
+        self.storage_format = getattr(settings, 'EMBEDDING_STORAGE_FORMAT', 'float32')
+        self.backend = getattr(settings, 'SEMANTIC_SEARCH_BACKEND', 'memory')
+        self.pgvector_store = None
+        if self.backend == 'pgvector':
+            from .pgvector_store import PgVectorStore
+            self.pgvector_store = PgVectorStore(
+                ef_search=getattr(settings, 'PGVECTOR_EF_SEARCH', None),
+                probes=getattr(settings, 'PGVECTOR_PROBES', None)
+            )
+    
+    @property
+    def embedding_generator(self) -> EmbeddingGenerator:
+        """Direct (unbatched) generator; the model is loaded on first access"""
+        return EmbeddingGenerator(model_name=self.model_name)
     
     def generate_conversation_embedding(self, conversation: Conversation):
         """
@@ -25,20 +55,56 @@ class SemanticSearch:
         text_content = self._prepare_conversation_text(conversation)
         
         # Generate embedding
-        embedding = self.embedding_generator.generate_embedding(text_content)
+        embedding = self.batcher.embed(text_content)
         
         # Store in database
         ConversationEmbedding.objects.update_or_create(
             conversation=conversation,
-            defaults={
-                'embedding_vector': embedding.tolist(),
-                'metadata': {
-                    'title': conversation.title,
-                    'message_count': conversation.messages.count(),
-                    'topics': self._extract_topics(text_content)
-                }
-            }
+            defaults=self.embedding_fields(conversation, text_content, embedding)
         )
+        
+        if self.pgvector_store is not None:
+            self.pgvector_store.write(conversation.id, embedding)
+        
+        # Keep the resident index current without waiting for its next sync
+        index = get_vector_index()
+        if index.loaded:
+            index.upsert(
+                conversation.id,
+                embedding,
+                conversation.created_at,
+                conversation.status
+            )
+    
+    def embedding_fields(
+        self,
+        conversation: Conversation,
+        text_content: str,
+        embedding,
+        message_count: Optional[int] = None
+    ) -> Dict:
+        """
+        ConversationEmbedding field values for a freshly encoded conversation
+        
+        Args:
+            conversation: Conversation object
+            text_content: Text the embedding was generated from
+            embedding: Embedding vector
+            message_count: Message count (defaults to conversation.message_count)
+            
+        Returns:
+            Dict: Field values (vector storage + metadata)
+        """
+        if message_count is None:
+            message_count = conversation.message_count
+        return {
+            **storage_fields(embedding, self.storage_format),
+            'metadata': {
+                'title': conversation.title,
+                'message_count': message_count,
+                'topics': self._extract_topics(text_content)
+            }
+        }
     
     def search_conversations(
         self,
@@ -61,56 +127,130 @@ class SemanticSearch:
         Returns:
             List[Dict]: List of conversation results with scores
         """
-        # Generate query embedding
-        query_embedding = self.embedding_generator.generate_embedding(query)
+        # Repeated searches are served from the result cache until the
+        # index version changes
+        cache_key = self._result_cache_key(query, top_k, date_from, date_to, min_similarity)
+        if cache_key is not None:
+            cached = get_search_result_cache().get(cache_key)
+            if cached is not None:
+                return [dict(result) for result in cached]
         
-        # Build filters
-        filters = Q(conversation__status='ended')
+        formatted_results = self._search(query, top_k, date_from, date_to, min_similarity)
         
-        if date_from:
-            filters &= Q(conversation__created_at__gte=datetime.fromisoformat(date_from))
-        if date_to:
-            filters &= Q(conversation__created_at__lte=datetime.fromisoformat(date_to))
+        if cache_key is not None:
+            get_search_result_cache().set(cache_key, [dict(result) for result in formatted_results])
+        return formatted_results
+    
+    def _search(self, query, top_k, date_from, date_to, min_similarity) -> List[Dict]:
+        """Uncached search_conversations"""
+        # Generate query embedding (cached per normalized query text)
+        query_embedding = self._embed_query(query)
         
-        # Get all conversation embeddings
-        embeddings_qs = ConversationEmbedding.objects.filter(filters).select_related('conversation')
+        results = self._rank(
+            query_embedding,
+            top_k,
+            self._parse_date(date_from),
+            self._parse_date(date_to),
+            min_similarity
+        )
         
-        if not embeddings_qs.exists():
+        if not results:
             return []
         
-        # Extract embeddings and IDs
-        conversations = []
-        corpus_embeddings = []
-        
-        for emb in embeddings_qs:
-            conversations.append(emb.conversation)
-            corpus_embeddings.append(np.array(emb.embedding_vector))
-        
-        corpus_embeddings = np.array(corpus_embeddings)
-        
-        # Find similar conversations
-        results = self.embedding_generator.find_most_similar(
-            query_embedding,
-            corpus_embeddings,
-            top_k=top_k
-        )
+        conversations = {
+            str(pk): conv
+            for pk, conv in Conversation.objects.in_bulk([conv_id for conv_id, _ in results]).items()
+        }
         
         # Format results
         formatted_results = []
-        for idx, score in results:
-            if score >= min_similarity:
-                conv = conversations[idx]
-                formatted_results.append({
-                    'conversation_id': str(conv.id),
-                    'title': conv.title,
-                    'score': score,
-                    'summary': conv.summary,
-                    'created_at': conv.created_at.isoformat(),
-                    'message_count': conv.messages.count()
-                })
+        for conv_id, score in results:
+            conv = conversations.get(conv_id)
+            if conv is None:
+                # Deleted since the index last synced
+                continue
+            formatted_results.append({
+                'conversation_id': str(conv.id),
+                'title': conv.title,
+                'score': score,
+                'summary': conv.summary,
+                'created_at': conv.created_at.isoformat(),
+                'message_count': conv.message_count
+            })
         
         return formatted_results
     
+    def _result_cache_key(self, query, top_k, date_from, date_to, min_similarity):
+        """
+        Result cache key, or None when results must not be cached
+        
+        Includes the resident index version (bumped by every index change,
+        including catch-up syncs from other workers) and the search index
+        version counter (bumped by embedding writes and conversation
+        deletes/updates, see conversations.signals).
+        """
+        version = get_search_index_version().current()
+        if version is None:
+            return None
+        index_version = None
+        if self.pgvector_store is None:
+            index = get_vector_index()
+            index.ensure_loaded()
+            index_version = index.version
+        return (
+            self.model_name,
+            self.backend,
+            normalize_query(query),
+            top_k,
+            date_from,
+            date_to,
+            min_similarity,
+            index_version,
+            version,
+        )
+    
+    def _embed_query(self, query: str):
+        """Query embedding, served from the query cache when possible"""
+        cache = get_query_embedding_cache()
+        embedding = cache.get(self.model_name, query)
+        if embedding is None:
+            embedding = self.batcher.embed(normalize_query(query))
+            cache.set(self.model_name, query, embedding)
+        return embedding
+    
+    def _rank(self, query_embedding, top_k, date_from, date_to, min_similarity):
+        """Top-k ended conversations as (conversation_id, score) pairs"""
+        if self.pgvector_store is not None:
+            return self.pgvector_store.search(
+                query_embedding,
+                top_k=top_k,
+                date_from=date_from,
+                date_to=date_to,
+                status='ended',
+                min_similarity=min_similarity
+            )
+        
+        # Rank against the resident index of ended conversations
+        index = get_vector_index()
+        index.ensure_loaded()
+        results = index.search(
+            query_embedding,
+            top_k=top_k,
+            date_from=date_from,
+            date_to=date_to,
+            status='ended'
+        )
+        return [(conv_id, score) for conv_id, score in results if score >= min_similarity]
+    
+    def _parse_date(self, value: Optional[str]) -> Optional[datetime]:
+        """Parse an ISO date filter into an aware datetime"""
+        if not value:
+            return None
+        parsed = datetime.fromisoformat(value)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+    
     def _prepare_conversation_text(self, conversation: Conversation) -> str:
         """Prepare conversation text for embedding"""
         messages = conversation.messages.all()
@@ -1,6 +1,23 @@
 import tiktoken
+from functools import lru_cache
 from typing import List, Dict
 
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-4"):
+    """
+    Tokenizer for a model, loaded once per process
+    
+    Args:
+        model: Model name (models tiktoken does not know use cl100k_base)
+    
+    Returns:
+        tiktoken.Encoding: Cached encoding
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
 def count_tokens(text: str, model: str = "gpt-4") -> int:
     """
     Count tokens in text for a given model
@@ -12,8 +29,7 @@ def count_tokens(text: str, model: str = "gpt-4") -> int:
     Returns:
         int: Number of tokens
     """
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(text))
+    return len(get_encoding(model).encode(text, disallowed_special=()))
 
 def truncate_conversation(
     messages: List[Dict[str, str]], 
@@ -23,7 +39,7 @@ def truncate_conversation(
     Truncate conversation to fit within token limit
     
     Args:
-        messages: List of message dicts
+        messages: List of message dicts (an int 'tokens' entry skips re-counting)
         max_tokens: Maximum token limit
         
     Returns:
@@ -34,11 +50,14 @@ def truncate_conversation(
     
     # Keep recent messages, remove oldest if needed
     for msg in reversed(messages):
-        msg_tokens = count_tokens(msg['content'])
+        msg_tokens = msg.get('tokens')
+        if msg_tokens is None:
+            msg_tokens = count_tokens(msg['content'])
         if total_tokens + msg_tokens <= max_tokens:
-            truncated.insert(0, msg)
+            truncated.append(msg)
             total_tokens += msg_tokens
         else:
             break
     
+    truncated.reverse()
     return truncated
@@ -0,0 +1,515 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .ann_index import build_ann_index
+from .quantization import stored_embedding
+
+logger = logging.getLogger(__name__)
+
+# Conversation status codes stored in the index side array
+STATUS_CODES = {'active': 0, 'ended': 1}
+
+
+class VectorIndex:
+    """
+    Resident in-memory index of conversation embeddings
+    Vectors are kept L2-normalized in a float32 matrix so a query is a
+    single matrix-vector product followed by argpartition. An optional ANN
+    quantizer (see ann_index) narrows the scan to a few buckets once the
+    corpus is large enough.
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        initial_capacity: int = 1024,
+        ann_min_size: int = 20000
+    ):
+        """
+        Initialize empty index
+
+        Args:
+            dim: Embedding dimension (inferred from the first vector if None)
+            initial_capacity: Number of rows to preallocate
+            ann_min_size: Below this many vectors search stays exact
+        """
+        self.dim = dim
+        self._capacity = initial_capacity
+        self._size = 0
+        self._vectors = None
+        self._created_at = np.zeros(initial_capacity, dtype=np.float64)
+        self._status = np.zeros(initial_capacity, dtype=np.int8)
+        # ANN bucket per row, -1 when unassigned (always scanned)
+        self._buckets = np.full(initial_capacity, -1, dtype=np.int32)
+        self.ann = None
+        self.ann_min_size = ann_min_size
+        # Incremented on every change to the indexed contents (result cache key)
+        self.version = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        if dim is not None:
+            self._vectors = np.zeros((initial_capacity, dim), dtype=np.float32)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, conversation_id):
+        return str(conversation_id) in self._rows
+
+    def upsert(
+        self,
+        conversation_id,
+        vector,
+        created_at: datetime,
+        status: str = 'ended'
+    ):
+        """
+        Insert or replace the vector for a conversation
+
+        Args:
+            conversation_id: Conversation primary key
+            vector: Embedding vector (any float dtype)
+            created_at: Conversation creation time (used for date filters)
+            status: Conversation status
+        """
+        vector = self._normalize(np.asarray(vector, dtype=np.float32))
+        key = str(conversation_id)
+
+        with self._lock:
+            if self._vectors is None:
+                self.dim = vector.shape[0]
+                self._vectors = np.zeros((self._capacity, self.dim), dtype=np.float32)
+
+            timestamp = created_at.timestamp()
+            code = STATUS_CODES.get(status, -1)
+            row = self._rows.get(key)
+            if row is None:
+                self._ensure_capacity(self._size + 1)
+                row = self._size
+                self._size += 1
+                self._ids.append(key)
+                self._rows[key] = row
+            elif (
+                self._status[row] == code
+                and self._created_at[row] == timestamp
+                and np.array_equal(self._vectors[row], vector)
+            ):
+                # Unchanged (sync re-reads the watermark row): keep the version
+                # so cached search results stay valid
+                return
+
+            self._vectors[row] = vector
+            self._created_at[row] = timestamp
+            self._status[row] = code
+            self._buckets[row] = self.ann.assign(vector) if self._ann_ready() else -1
+            self.version += 1
+
+    def set_ann(self, ann, assignments: Dict[str, int]):
+        """
+        Install a trained ANN quantizer
+
+        Args:
+            ann: Trained ANN index
+            assignments: Conversation id -> bucket id; rows missing here
+                         are assigned against the new centroids
+        """
+        with self._lock:
+            n = self._size
+            buckets = np.full(self._capacity, -1, dtype=np.int32)
+            for row, key in enumerate(self._ids):
+                buckets[row] = assignments.get(key, -1)
+            missing = np.flatnonzero(buckets[:n] < 0)
+            if missing.size:
+                buckets[missing] = ann.assign(self._vectors[missing])
+            self._buckets = buckets
+            self.ann = ann
+            self.version += 1
+
+    def update_status(self, conversation_id, status: str):
+        """Update the status side array for a conversation already in the index"""
+        with self._lock:
+            row = self._rows.get(str(conversation_id))
+            code = STATUS_CODES.get(status, -1)
+            if row is not None and self._status[row] != code:
+                self._status[row] = code
+                self.version += 1
+
+    def remove(self, conversation_id) -> bool:
+        """
+        Remove a conversation from the index
+
+        The last row is moved into the freed slot so the matrix stays dense.
+
+        Returns:
+            bool: True if the conversation was indexed
+        """
+        key = str(conversation_id)
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is None:
+                return False
+
+            last = self._size - 1
+            if row != last:
+                moved_key = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._created_at[row] = self._created_at[last]
+                self._status[row] = self._status[last]
+                self._buckets[row] = self._buckets[last]
+                self._ids[row] = moved_key
+                self._rows[moved_key] = row
+
+            self._ids.pop()
+            self._size -= 1
+            self.version += 1
+            return True
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        status: Optional[str] = 'ended',
+        exact: bool = False
+    ) -> List[Tuple[str, float]]:
+        """
+        Find the most similar conversations
+
+        Args:
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+            date_from: Only conversations created at or after this time
+            date_to: Only conversations created at or before this time
+            status: Only conversations with this status (None for any)
+            exact: Scan every vector even when an ANN quantizer is installed
+
+        Returns:
+            List[Tuple[str, float]]: (conversation_id, cosine similarity), best first
+        """
+        query = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+
+        with self._lock:
+            n = self._size
+            if n == 0 or top_k <= 0:
+                return []
+
+            if not exact and self._ann_ready():
+                results = self._search_ann(query, top_k, date_from, date_to, status)
+                if results is not None:
+                    return results
+
+            scores = self._vectors[:n] @ query
+
+            mask = self._filter_mask(date_from, date_to, status)
+            if mask is not None:
+                candidates = int(np.count_nonzero(mask))
+                if candidates == 0:
+                    return []
+                scores[~mask] = -np.inf
+            else:
+                candidates = n
+
+            top = self._top_rows(scores, min(top_k, candidates))
+            return [(self._ids[row], float(scores[row])) for row in top]
+
+    def _search_ann(self, query, top_k, date_from, date_to, status):
+        """
+        Score only the vectors in the probed buckets (lock held)
+
+        Returns None when the probed buckets hold fewer than top_k matching
+        vectors, so the caller falls back to an exact scan.
+        """
+        n = self._size
+        probed = self.ann.probe(query)
+        buckets = self._buckets[:n]
+        mask = np.isin(buckets, probed) | (buckets < 0)
+        filters = self._filter_mask(date_from, date_to, status)
+        if filters is not None:
+            mask &= filters
+
+        rows = np.flatnonzero(mask)
+        if rows.size < top_k:
+            return None
+
+        scores = self._vectors[rows] @ query
+        top = self._top_rows(scores, top_k)
+        return [(self._ids[rows[i]], float(scores[i])) for i in top]
+
+    def _filter_mask(self, date_from, date_to, status) -> Optional[np.ndarray]:
+        """Boolean row mask for the status/date filters, None if unfiltered"""
+        n = self._size
+        mask = None
+        if status is not None:
+            mask = self._status[:n] == STATUS_CODES.get(status, -1)
+        if date_from is not None:
+            cond = self._created_at[:n] >= date_from.timestamp()
+            mask = cond if mask is None else mask & cond
+        if date_to is not None:
+            cond = self._created_at[:n] <= date_to.timestamp()
+            mask = cond if mask is None else mask & cond
+        return mask
+
+    @staticmethod
+    def _top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest scores, best first"""
+        n = scores.shape[0]
+        if k <= 0:
+            return np.arange(0)
+        if k < n:
+            top = np.argpartition(scores, n - k)[n - k:]
+        else:
+            top = np.arange(n)
+        return top[np.argsort(scores[top])[::-1]]
+
+    def _ann_ready(self) -> bool:
+        return (
+            self.ann is not None
+            and self.ann.is_trained
+            and self._size >= self.ann_min_size
+        )
+
+    def _ensure_capacity(self, size: int):
+        """Grow side arrays and matrix geometrically (lock held)"""
+        if size <= self._capacity:
+            return
+        capacity = max(size, self._capacity * 2)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        self._created_at = np.resize(self._created_at, capacity)
+        self._status = np.resize(self._status, capacity)
+        buckets = np.full(capacity, -1, dtype=np.int32)
+        buckets[:self._size] = self._buckets[:self._size]
+        self._buckets = buckets
+        self._capacity = capacity
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return vector
+        return vector / norm
+
+
+class ConversationVectorIndex(VectorIndex):
+    """
+    VectorIndex backed by the ConversationEmbedding table
+    Loads every stored embedding once, then stays in sync by pulling rows
+    written since the last sync (so writes from other workers show up too).
+    The ANN quantizer is persisted to disk and retrained in a background
+    thread whenever the corpus grows or shrinks by `rebuild_factor`.
+    """
+
+    def __init__(
+        self,
+        sync_interval: float = 5.0,
+        sync_overlap: float = 30.0,
+        backend: str = 'exact',
+        ann_options: Optional[Dict] = None,
+        ann_path: Optional[str] = None,
+        rebuild_factor: float = 1.5,
+        **kwargs
+    ):
+        """
+        Args:
+            sync_interval: Minimum seconds between catch-up queries
+            sync_overlap: Seconds before the watermark that each catch-up re-reads
+            backend: ANN backend name ('exact' or 'ivf')
+            ann_options: Keyword arguments for the ANN index (nlist, nprobe, ...)
+            ann_path: File the trained ANN index is persisted to
+            rebuild_factor: Corpus growth/shrink ratio that triggers retraining
+        """
+        super().__init__(**kwargs)
+        self.sync_interval = sync_interval
+        self.sync_overlap = sync_overlap
+        self.backend = backend
+        self.ann_options = ann_options or {}
+        self.ann_path = ann_path
+        self.rebuild_factor = rebuild_factor
+        self._loaded = False
+        self._watermark = None
+        self._last_sync = 0.0
+        self._load_lock = threading.Lock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self):
+        """Build the index on first use, afterwards catch up periodically"""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self.reload()
+            return
+        if time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def reload(self):
+        """Rebuild the whole index from the database"""
+        from conversations.models import ConversationEmbedding
+
+        with self._lock:
+            self._size = 0
+            self._ids = []
+            self._rows = {}
+            self._watermark = None
+            self.version += 1
+            # Bulk-assign buckets after loading instead of row by row
+            ann, self.ann = self.ann, None
+            self._apply_rows(ConversationEmbedding.objects.all())
+            assignments = {}
+            if ann is None:
+                ann, assignments = self._load_persisted_ann()
+            if ann is not None:
+                self.set_ann(ann, assignments)
+            self._loaded = True
+            self._last_sync = time.monotonic()
+
+        self._maybe_rebuild_ann()
+
+    def sync(self):
+        """Pull embeddings written since the last sync and detect deletions"""
+        from conversations.models import ConversationEmbedding
+
+        with self._lock:
+            queryset = ConversationEmbedding.objects.all()
+            if self._watermark is not None:
+                # updated_at is stamped before commit, so a row can become
+                # visible after a newer one was synced; re-reading a margin
+                # catches it (unchanged rows are skipped by upsert)
+                since = self._watermark - timedelta(seconds=self.sync_overlap)
+                queryset = queryset.filter(updated_at__gte=since)
+            self._apply_rows(queryset)
+            self._last_sync = time.monotonic()
+
+            # Rows deleted by another process: fall back to a full rebuild
+            if ConversationEmbedding.objects.count() != self._size:
+                self.reload()
+                return
+
+        self._maybe_rebuild_ann()
+
+    def rebuild_ann(self):
+        """
+        Retrain the ANN quantizer on the current corpus and persist it
+
+        Training runs on a snapshot without holding the index lock, so
+        searches keep being served (exactly or by the old quantizer).
+        """
+        ann = build_ann_index(self.backend, **self.ann_options)
+        if ann is None:
+            return
+
+        with self._lock:
+            n = self._size
+            vectors = self._vectors[:n].copy()
+            ids = list(self._ids)
+
+        ann.train(vectors)
+        assignments = ann.assign(vectors)
+        del vectors
+
+        self.set_ann(ann, dict(zip(ids, assignments.tolist())))
+
+        if self.ann_path:
+            with self._lock:
+                ids = list(self._ids)
+                buckets = self._buckets[:self._size].copy()
+            ann.save(self.ann_path, ids, buckets)
+
+    def _maybe_rebuild_ann(self):
+        """Start a background retrain when the corpus outgrew the quantizer"""
+        if self.backend == 'exact' or self._size < self.ann_min_size:
+            return
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+
+        if self.ann is not None and self.ann.is_trained:
+            trained = max(self.ann.trained_size, 1)
+            ratio = self._size / trained
+            if 1 / self.rebuild_factor < ratio < self.rebuild_factor:
+                return
+
+        self._rebuild_thread = threading.Thread(
+            target=self._rebuild_ann_safely,
+            name='vector-index-ann-rebuild',
+            daemon=True
+        )
+        self._rebuild_thread.start()
+
+    def _rebuild_ann_safely(self):
+        try:
+            self.rebuild_ann()
+        except Exception:
+            logger.exception("ANN index rebuild failed; search stays exact")
+
+    def _load_persisted_ann(self):
+        """
+        Load the quantizer saved by a previous process, if compatible
+
+        Returns:
+            Tuple: (ann index or None, saved conversation id -> bucket id)
+        """
+        if not self.ann_path or not os.path.exists(self.ann_path):
+            return None, {}
+        ann = build_ann_index(self.backend, **self.ann_options)
+        if ann is None:
+            return None, {}
+        try:
+            assignments = ann.load(self.ann_path)
+        except (OSError, ValueError, KeyError):
+            logger.warning("Ignoring unreadable ANN index at %s", self.ann_path)
+            return None, {}
+        if self.dim is not None and ann.centroids.shape[1] != self.dim:
+            return None, {}
+        return ann, assignments
+
+    def _apply_rows(self, queryset):
+        """Upsert embedding rows from a queryset (lock held)"""
+        rows = queryset.values_list(
+            'conversation_id',
+            'embedding_vector',
+            'embedding_data',
+            'embedding_format',
+            'embedding_scale',
+            'conversation__created_at',
+            'conversation__status',
+            'updated_at',
+        ).order_by('updated_at')
+
+        for row in rows.iterator(chunk_size=2000):
+            conversation_id, array, data, storage_format, scale, created_at, status, updated_at = row
+            vector = stored_embedding(array, data, storage_format, scale)
+            self.upsert(conversation_id, vector, created_at, status)
+            if self._watermark is None or updated_at > self._watermark:
+                self._watermark = updated_at
+
+
+_index: Optional[ConversationVectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> ConversationVectorIndex:
+    """Get the process-wide conversation vector index"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from django.conf import settings
+                _index = ConversationVectorIndex(
+                    sync_interval=getattr(settings, 'VECTOR_INDEX_SYNC_INTERVAL', 5.0),
+                    sync_overlap=getattr(settings, 'VECTOR_INDEX_SYNC_OVERLAP', 30.0),
+                    backend=getattr(settings, 'VECTOR_INDEX_BACKEND', 'exact'),
+                    ann_options=getattr(settings, 'VECTOR_INDEX_ANN_OPTIONS', {}),
+                    ann_path=getattr(settings, 'VECTOR_INDEX_ANN_PATH', None),
+                    ann_min_size=getattr(settings, 'VECTOR_INDEX_ANN_MIN_SIZE', 20000),
+                )
+    return _index
@@ -23,3 +23,7 @@ application = ProtocolTypeRouter({
         )
     ),
 })
+
+# Load embedding models up front so the first search does not pay for it
+from ai_module.model_registry import warm_up_models
+warm_up_models()
@@ -0,0 +1,15 @@
+"""
+Celery application for background conversation processing.
+
+Start a worker with:
+    celery -A chat_portal worker -l info
+"""
+
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chat_portal.settings')
+
+app = Celery('chat_portal')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -92,6 +92,14 @@ DATABASES = {
         'PASSWORD': os.getenv('DATABASE_PASSWORD'),
         'HOST': os.getenv('DATABASE_HOST'),
         'PORT': os.getenv('DATABASE_PORT'),
+        # Persistent connections stay off: under Daphne/ASGI every sync view
+        # and async ORM call runs in its own executor context, so connections
+        # pile up instead of being reused. To avoid reconnect cost, point
+        # DATABASE_HOST at a pooler (pgbouncer in transaction mode, with
+        # DATABASE_DISABLE_SERVER_SIDE_CURSORS=True) rather than raising this
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DATABASE_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True',
     }
 }
 
@@ -155,11 +163,13 @@ CORS_ALLOW_CREDENTIALS = True
 
 ASGI_APPLICATION = 'chat_portal.asgi.application'
 
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [os.getenv('REDIS_URL', 'redis://localhost:6379/0')],
+            "hosts": [REDIS_URL],
         },
     },
 }
@@ -167,4 +177,168 @@ CHANNEL_LAYERS = {
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Embedding models
+# Comma-separated model names loaded at ASGI/WSGI startup instead of on first request
+EMBEDDING_WARMUP_MODELS = [
+    name for name in os.getenv('EMBEDDING_WARMUP_MODELS', '').split(',') if name.strip()
+]
+# Least recently used models are unloaded beyond this count
+EMBEDDING_MAX_LOADED_MODELS = int(os.getenv('EMBEDDING_MAX_LOADED_MODELS', '2'))
+# Unload models idle for this many seconds (unset keeps them for the worker lifetime)
+EMBEDDING_MODEL_IDLE_TIMEOUT = (
+    float(os.getenv('EMBEDDING_MODEL_IDLE_TIMEOUT'))
+    if os.getenv('EMBEDDING_MODEL_IDLE_TIMEOUT') else None
+)
+
+# Semantic search
+# Seconds between catch-up queries that pull embeddings written by other workers
+VECTOR_INDEX_SYNC_INTERVAL = float(os.getenv('VECTOR_INDEX_SYNC_INTERVAL', '5'))
+# Each catch-up also re-reads rows stamped this many seconds before the newest
+# one seen, for writes that committed late (longer than any embedding transaction)
+VECTOR_INDEX_SYNC_OVERLAP = float(os.getenv('VECTOR_INDEX_SYNC_OVERLAP', '30'))
+# 'exact' scans every vector; 'ivf' narrows the scan with an IVF-flat quantizer
+VECTOR_INDEX_BACKEND = os.getenv('VECTOR_INDEX_BACKEND', 'exact')
+# Corpora smaller than this are always searched exactly
+VECTOR_INDEX_ANN_MIN_SIZE = int(os.getenv('VECTOR_INDEX_ANN_MIN_SIZE', '20000'))
+# Recall/latency knobs: more buckets probed (nprobe) means better recall, slower queries
+VECTOR_INDEX_ANN_OPTIONS = {
+    'nlist': int(os.getenv('VECTOR_INDEX_IVF_NLIST', '0')) or None,
+    'nprobe': int(os.getenv('VECTOR_INDEX_IVF_NPROBE', '8')),
+}
+VECTOR_INDEX_ANN_PATH = os.getenv(
+    'VECTOR_INDEX_ANN_PATH', str(BASE_DIR / 'var' / 'vector_index' / 'ivf.npz')
+)
+# 'memory' ranks in the resident vector index; 'pgvector' ranks inside Postgres
+# (run `manage.py setup_pgvector` first)
+SEMANTIC_SEARCH_BACKEND = os.getenv('SEMANTIC_SEARCH_BACKEND', 'memory')
+PGVECTOR_EF_SEARCH = int(os.getenv('PGVECTOR_EF_SEARCH', '0')) or None
+PGVECTOR_PROBES = int(os.getenv('PGVECTOR_PROBES', '0')) or None
+# Format for newly written embeddings: 'float32' (lossless), 'float16', 'int8'
+# (scalar-quantized) or 'array' (legacy double precision[] column).
+# Convert existing rows with `manage.py compact_embeddings`
+EMBEDDING_STORAGE_FORMAT = os.getenv('EMBEDDING_STORAGE_FORMAT', 'float32')
+
+# Celery (background summarization and embedding)
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+# Run tasks inline (no worker needed) for local development
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+
+# Embedding micro-batching: concurrent single-text encodes wait up to
+# EMBEDDING_BATCH_MAX_LATENCY_MS for others and run as one model call
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', '32'))
+EMBEDDING_BATCH_MAX_LATENCY_MS = float(os.getenv('EMBEDDING_BATCH_MAX_LATENCY_MS', '5'))
+
+# Query embedding cache: repeated searches skip the transformer.
+# QUERY_EMBEDDING_CACHE_REDIS adds a tier shared by all workers (REDIS_URL)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '2048'))
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv('QUERY_EMBEDDING_CACHE_TTL', '3600'))
+QUERY_EMBEDDING_CACHE_REDIS = os.getenv('QUERY_EMBEDDING_CACHE_REDIS', 'False') == 'True'
+
+# search_conversations result cache (per process); entries are keyed by the
+# index version, so writes invalidate them. SEARCH_RESULT_CACHE_REDIS_VERSION
+# shares the version counter across workers (REDIS_URL)
+SEARCH_RESULT_CACHE_SIZE = int(os.getenv('SEARCH_RESULT_CACHE_SIZE', '1024'))
+SEARCH_RESULT_CACHE_TTL = int(os.getenv('SEARCH_RESULT_CACHE_TTL', '300'))
+SEARCH_RESULT_CACHE_REDIS_VERSION = os.getenv('SEARCH_RESULT_CACHE_REDIS_VERSION', 'False') == 'True'
+
+# Chat context: the newest messages (at most CHAT_CONTEXT_MAX_MESSAGES) that
+# fit each provider's context window after reserving room for the reply
+LLM_CONTEXT_TOKENS = {
+    'openai': int(os.getenv('OPENAI_CONTEXT_TOKENS', '8192')),
+    'claude': int(os.getenv('CLAUDE_CONTEXT_TOKENS', '200000')),
+    'gemini': int(os.getenv('GEMINI_CONTEXT_TOKENS', '30720')),
+    'lmstudio': int(os.getenv('LM_STUDIO_CONTEXT_TOKENS', '4096')),
+}
+CHAT_CONTEXT_MAX_MESSAGES = int(os.getenv('CHAT_CONTEXT_MAX_MESSAGES', '200'))
+
+# Rolling memory: once CHAT_MEMORY_FOLD_THRESHOLD messages follow the running
+# summary, a Celery task folds all but the newest CHAT_MEMORY_KEEP_MESSAGES
+# into it; prompts become summary + recent turns
+CHAT_MEMORY_ENABLED = os.getenv('CHAT_MEMORY_ENABLED', 'True') == 'True'
+CHAT_MEMORY_KEEP_MESSAGES = int(os.getenv('CHAT_MEMORY_KEEP_MESSAGES', '20'))
+CHAT_MEMORY_FOLD_THRESHOLD = int(os.getenv('CHAT_MEMORY_FOLD_THRESHOLD', '40'))
+CHAT_MEMORY_FOLD_BATCH = int(os.getenv('CHAT_MEMORY_FOLD_BATCH', '200'))
+# A fold is enqueued at most once per conversation in this many seconds
+# (flag in the default cache; use a shared backend to dedupe across workers)
+CHAT_MEMORY_FOLD_DEDUPE_SECONDS = int(os.getenv('CHAT_MEMORY_FOLD_DEDUPE_SECONDS', '60'))
+
+# Map-reduce summaries: transcripts over SUMMARY_CHUNK_TOKENS are summarized
+# in chunks (SUMMARY_MAX_CONCURRENCY at a time) and the chunk summaries are
+# cached by content; SUMMARY_CHUNK_CACHE_REDIS shares them across workers
+SUMMARY_CHUNK_TOKENS = int(os.getenv('SUMMARY_CHUNK_TOKENS', '3000'))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv('SUMMARY_MAX_CONCURRENCY', '4'))
+SUMMARY_CHUNK_CACHE_SIZE = int(os.getenv('SUMMARY_CHUNK_CACHE_SIZE', '4096'))
+SUMMARY_CHUNK_CACHE_TTL = int(os.getenv('SUMMARY_CHUNK_CACHE_TTL', str(7 * 24 * 3600)))
+SUMMARY_CHUNK_CACHE_REDIS = os.getenv('SUMMARY_CHUNK_CACHE_REDIS', 'False') == 'True'
+
+# LLM provider HTTP clients: one keep-alive pool per provider per worker
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '100'))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', '20'))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', '30'))
+LLM_HTTP_TIMEOUT = float(os.getenv('LLM_HTTP_TIMEOUT', '60'))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv('LLM_HTTP_CONNECT_TIMEOUT', '5'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+
+# LLM routing: providers in order of preference. A provider that errors or
+# sends no token within LLM_FIRST_TOKEN_TIMEOUT seconds is skipped for the
+# next; LLM_HEDGE_AFTER_MS starts the next provider in parallel instead.
+# Provider endpoints can point at stub servers via OPENAI_BASE_URL,
+# ANTHROPIC_BASE_URL and LM_STUDIO_URL
+LLM_PROVIDERS = [
+    name.strip() for name in os.getenv('LLM_PROVIDERS', 'openai').split(',') if name.strip()
+]
+LLM_FIRST_TOKEN_TIMEOUT = float(os.getenv('LLM_FIRST_TOKEN_TIMEOUT', '10'))
+LLM_HEDGE_AFTER_MS = float(os.getenv('LLM_HEDGE_AFTER_MS')) if os.getenv('LLM_HEDGE_AFTER_MS') else None
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+
+# LLM response cache: identical requests (provider, model, messages,
+# temperature, max_tokens) replay the stored answer as a stream. Only
+# temperature 0 calls and callers opting in (use_cache=True: conversation
+# summaries) are cached. Chat replies are sampled, so the WebSocket path
+# is cached only with LLM_RESPONSE_CACHE_CHAT (e.g. FAQ-style deployments;
+# the key covers the whole prompt, history included).
+# LLM_RESPONSE_CACHE_SEMANTIC also reuses answers when only the last message
+# differs and is a near-duplicate (cosine >= threshold)
+LLM_RESPONSE_CACHE_ENABLED = os.getenv('LLM_RESPONSE_CACHE_ENABLED', 'True') == 'True'
+LLM_RESPONSE_CACHE_CHAT = os.getenv('LLM_RESPONSE_CACHE_CHAT', 'False') == 'True'
+LLM_RESPONSE_CACHE_SIZE = int(os.getenv('LLM_RESPONSE_CACHE_SIZE', '1024'))
+LLM_RESPONSE_CACHE_TTL = int(os.getenv('LLM_RESPONSE_CACHE_TTL', '3600'))
+LLM_RESPONSE_CACHE_REDIS = os.getenv('LLM_RESPONSE_CACHE_REDIS', 'False') == 'True'
+LLM_RESPONSE_CACHE_SEMANTIC = os.getenv('LLM_RESPONSE_CACHE_SEMANTIC', 'False') == 'True'
+LLM_RESPONSE_CACHE_SEMANTIC_THRESHOLD = float(os.getenv('LLM_RESPONSE_CACHE_SEMANTIC_THRESHOLD', '0.95'))
+LLM_RESPONSE_CACHE_REPLAY_CHARS = int(os.getenv('LLM_RESPONSE_CACHE_REPLAY_CHARS', '24'))
+
+# Streamed responses: chunks are coalesced into one WebSocket frame per
+# STREAM_FLUSH_BYTES or STREAM_FLUSH_INTERVAL_MS (0 sends every chunk)
+STREAM_FLUSH_BYTES = int(os.getenv('STREAM_FLUSH_BYTES', '256'))
+STREAM_FLUSH_INTERVAL_MS = float(os.getenv('STREAM_FLUSH_INTERVAL_MS', '50'))
+
+# Write-behind chat messages: WebSocket messages are inserted in batches every
+# MESSAGE_BUFFER_FLUSH_MS (sooner once MESSAGE_BUFFER_MAX_PENDING wait), with
+# ids reserved MESSAGE_BUFFER_ID_BLOCK at a time. The newest
+# CHAT_CONTEXT_MAX_MESSAGES of active conversations are cached for
+# MESSAGE_HISTORY_CACHE_TTL seconds; MESSAGE_HISTORY_CACHE_REDIS shares them
+# across workers as Redis lists (REDIS_URL)
+MESSAGE_BUFFER_FLUSH_MS = float(os.getenv('MESSAGE_BUFFER_FLUSH_MS', '100'))
+MESSAGE_BUFFER_MAX_PENDING = int(os.getenv('MESSAGE_BUFFER_MAX_PENDING', '500'))
+MESSAGE_BUFFER_ID_BLOCK = int(os.getenv('MESSAGE_BUFFER_ID_BLOCK', '100'))
+MESSAGE_HISTORY_CACHE_SIZE = int(os.getenv('MESSAGE_HISTORY_CACHE_SIZE', '1000'))
+MESSAGE_HISTORY_CACHE_TTL = int(os.getenv('MESSAGE_HISTORY_CACHE_TTL', '300'))
+MESSAGE_HISTORY_CACHE_REDIS = os.getenv('MESSAGE_HISTORY_CACHE_REDIS', 'False') == 'True'
+
+# Resumable responses: events of each generation are kept STREAM_RESUME_TTL
+# seconds after the last one (in process, or in Redis with STREAM_RESUME_REDIS
+# so any worker can resume). A generation whose client disconnected keeps
+# running STREAM_RESUME_GRACE_SECONDS (0 cancels at once) unless a client
+# resumes it; resumed clients poll for new events every STREAM_RESUME_POLL_MS
+STREAM_RESUME_TTL = int(os.getenv('STREAM_RESUME_TTL', '120'))
+STREAM_RESUME_REDIS = os.getenv('STREAM_RESUME_REDIS', 'False') == 'True'
+STREAM_RESUME_GRACE_SECONDS = float(os.getenv('STREAM_RESUME_GRACE_SECONDS', '30'))
+STREAM_RESUME_POLL_MS = float(os.getenv('STREAM_RESUME_POLL_MS', '50'))
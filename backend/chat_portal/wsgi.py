@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chat_portal.settings')
 
 application = get_wsgi_application()
+
+# Load embedding models up front so the first search does not pay for it
+from ai_module.model_registry import warm_up_models
+warm_up_models()
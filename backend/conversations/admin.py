@@ -3,7 +3,7 @@ from .models import Conversation, Message, ConversationEmbedding
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
-    list_display = ['id', 'title', 'status', 'start_timestamp', 'end_timestamp']
+    list_display = ['id', 'title', 'status', 'message_count', 'start_timestamp', 'end_timestamp']
     list_filter = ['status', 'created_at']
     search_fields = ['title', 'summary']
     readonly_fields = ['id', 'created_at', 'updated_at']
@@ -1,19 +1,78 @@
-import json
 import asyncio
+import logging
+import time
+import weakref
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from .models import Conversation, Message
-from ai_module.llm_client import LLMClient
+from django.conf import settings
+from django.utils import timezone
+from .message_buffer import get_message_buffer
+from .models import Conversation
+from .protocol import negotiate
+from .stream_buffer import get_stream_buffer
+from .streaming import ChunkCoalescer
+from .tasks import enqueue_history_fold
+from ai_module.context_builder import ContextBuilder
+from ai_module.llm_router import LLMUnavailableError, get_llm_router
+
+logger = logging.getLogger(__name__)
+
+# One lock per conversation so turns from every connection on this worker
+# run one at a time and in order
+_turn_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def conversation_turn_lock(conversation_id) -> asyncio.Lock:
+    lock = _turn_locks.get(str(conversation_id))
+    if lock is None:
+        lock = asyncio.Lock()
+        _turn_locks[str(conversation_id)] = lock
+    return lock
+
+# Generations running on this worker by (conversation id, stream id), so a
+# resumed connection can stop them (only in its own conversation), and
+# watchdogs of generations whose client went away
+_generations: "weakref.WeakValueDictionary[tuple, asyncio.Task]" = weakref.WeakValueDictionary()
+_watchdogs = set()
+
+# Events that end a stream
+TERMINAL_EVENTS = {'ai_response_complete', 'ai_response_cancelled', 'ai_error'}
 
 class ChatConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time chat with LLM
+    
+    Each chat message is handled in its own task so typing events, further
+    messages and 'cancel_generation' are processed while a response streams.
+    Turns of a conversation are serialized; cancelled generations stop
+    pulling from the provider and keep the partial response.
+    
+    Every generation is a stream: its events carry stream_id/stream_seq and
+    are recorded in the stream buffer. A generation whose client disconnects
+    keeps running for STREAM_RESUME_GRACE_SECONDS; a reconnecting client
+    sends 'resume_stream' with its last stream_seq to get the missed events
+    and follow the rest.
     """
     
+    # Per-connection counters of text frames and bytes sent
+    frames_sent = 0
+    bytes_sent = 0
+    # Stream generated by this connection, and stream followed after a resume
+    stream_id = None
+    stream_seq = 0
+    following = None
+    relay = None
+    
     async def connect(self):
         """Handle WebSocket connection"""
         self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
         self.room_group_name = f'chat_{self.conversation_id}'
+        self.turns = set()
+        self.generation = None
+        self.closed = False
+        
+        # Buffered messages are inserted later, so refuse unknown conversations now
+        if not await Conversation.objects.filter(id=self.conversation_id).aexists():
+            await self.close()
+            return
         
         # Join room group
         await self.channel_layer.group_add(
@@ -21,31 +80,133 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.accept()
+        # Frame protocol from the offered subprotocols (JSON v1 if none match)
+        self.codec = negotiate(self.scope.get('subprotocols', []))
+        self.seq = 0
+        await self.accept(subprotocol=self.codec.subprotocol)
         
-        # Send connection confirmation
-        await self.send(text_data=json.dumps({
+        # Send connection confirmation, with any generation the client can resume
+        active = await get_stream_buffer().active(self.conversation_id)
+        await self.send_event({
             'type': 'connection_established',
-            'message': 'Connected to chat'
-        }))
+            'message': 'Connected to chat',
+            'active_stream': {'stream_id': active[0], 'stream_seq': active[1]} if active else None
+        })
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
+        self.closed = True
+        if self.relay is not None:
+            self.relay.cancel()
+        
+        # Drop queued turns; the running generation gets a grace period to be
+        # resumed before it is cancelled (partial responses are saved)
+        generation = getattr(self, 'generation', None)
+        queued = [turn for turn in getattr(self, 'turns', ()) if turn is not generation]
+        for turn in queued:
+            turn.cancel()
+        if queued:
+            await asyncio.gather(*queued, return_exceptions=True)
+        if generation is not None and not generation.done():
+            grace = getattr(settings, 'STREAM_RESUME_GRACE_SECONDS', 30)
+            if grace > 0:
+                watchdog = asyncio.create_task(self._cancel_unless_resumed(generation, self.stream_id, grace))
+                _watchdogs.add(watchdog)
+                watchdog.add_done_callback(_watchdogs.discard)
+            else:
+                generation.cancel()
+                await asyncio.gather(generation, return_exceptions=True)
+        # Don't leave this connection's messages waiting for the next interval
+        await get_message_buffer().flush()
+        
+        logger.debug(
+            "Chat %s closed: %d frames, %d bytes sent",
+            getattr(self, 'conversation_id', None), self.frames_sent, self.bytes_sent
+        )
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Receive message from WebSocket"""
-        data = json.loads(text_data)
+        data = self.codec.decode(text_data if text_data is not None else bytes_data)
         message_type = data.get('type')
         
         if message_type == 'chat_message':
-            await self.handle_chat_message(data)
+            self.start_turn(data)
+        elif message_type == 'cancel_generation':
+            self.cancel_generation()
+        elif message_type == 'resume_stream':
+            self.resume_stream(data)
         elif message_type == 'typing':
             await self.handle_typing_indicator(data)
     
+    def start_turn(self, data):
+        """Run a chat turn in the background (queued behind the conversation's current turn)"""
+        turn = asyncio.create_task(self.run_turn(data))
+        self.turns.add(turn)
+        turn.add_done_callback(self._turn_finished)
+    
+    async def run_turn(self, data):
+        async with conversation_turn_lock(self.conversation_id):
+            if self.closed:
+                return
+            self.generation = asyncio.current_task()
+            try:
+                await self.handle_chat_message(data)
+            finally:
+                self.generation = None
+    
+    def cancel_generation(self):
+        """Stop the response currently streaming on this connection (or the one it resumed)"""
+        generation = self.generation or _generations.get((str(self.conversation_id), self.following))
+        if generation is not None:
+            generation.cancel()
+    
+    def resume_stream(self, data):
+        """Replay a stream's events after the client's last stream_seq, then follow it"""
+        if self.relay is not None:
+            self.relay.cancel()
+        self.following = str(data.get('stream_id') or '')
+        self.relay = asyncio.create_task(self.relay_stream(self.following, int(data.get('last_seq') or 0)))
+    
+    async def relay_stream(self, stream_id, last_seq):
+        """Forward a stream's recorded events until it ends (polling the stream buffer)"""
+        streams = get_stream_buffer()
+        interval = getattr(settings, 'STREAM_RESUME_POLL_MS', 50) / 1000
+        grace = max(getattr(settings, 'STREAM_RESUME_GRACE_SECONDS', 30), 1)
+        attached_until = 0.0
+        while True:
+            events = await streams.since(self.conversation_id, stream_id, last_seq)
+            if events is None:
+                await self.send_event({'type': 'stream_expired', 'stream_id': stream_id})
+                return
+            for event in events:
+                await self.send_event(event)
+                last_seq = event['stream_seq']
+                if event['type'] in TERMINAL_EVENTS:
+                    return
+            # Keeps the generation from being cancelled by its watchdog
+            now = time.monotonic()
+            if now >= attached_until:
+                await streams.attach(self.conversation_id, stream_id, grace)
+                attached_until = now + grace / 2
+            await asyncio.sleep(interval)
+    
+    async def _cancel_unless_resumed(self, generation, stream_id, grace):
+        """Cancel a generation whose client left, once no resumed client is following it"""
+        streams = get_stream_buffer()
+        while not generation.done():
+            await asyncio.wait({generation}, timeout=grace)
+            if not generation.done() and not await streams.attached(self.conversation_id, stream_id):
+                generation.cancel()
+    
+    def _turn_finished(self, turn):
+        self.turns.discard(turn)
+        if not turn.cancelled() and turn.exception() is not None:
+            logger.error("Chat turn failed", exc_info=turn.exception())
+    
     async def handle_chat_message(self, data):
         """Handle incoming chat message and get LLM response"""
         user_message = data.get('message', '')
@@ -64,36 +225,118 @@ class ChatConsumer(AsyncWebsocketConsumer):
             }
         )
         
-        # Get conversation history for context
-        messages = await self.get_conversation_history()
+        # Get LLM response with streaming (failover across providers)
+        llm_client = get_llm_router()
         
-        # Get LLM response with streaming
-        llm_client = LLMClient()
+        # Recent history that fits the preferred provider's context window
+        messages = await self.get_conversation_history(llm_client.provider)
         
+        # Stream AI response as a resumable stream
+        streams = get_stream_buffer()
+        self.stream_id = await streams.start(self.conversation_id)
+        self.stream_seq = 0
+        _generations[(str(self.conversation_id), self.stream_id)] = asyncio.current_task()
+        try:
+            await self.stream_response(llm_client, messages)
+        finally:
+            await streams.finish(self.conversation_id, self.stream_id)
+    
+    async def stream_response(self, llm_client, messages):
+        """Stream, save and complete the AI response"""
         # Send typing indicator
-        await self.send(text_data=json.dumps({
+        await self.emit_stream_event({
             'type': 'ai_typing',
             'is_typing': True
-        }))
+        })
         
-        # Stream AI response
-        full_response = ""
-        async for chunk in llm_client.stream_chat_response(messages):
-            full_response += chunk
-            await self.send(text_data=json.dumps({
-                'type': 'ai_response_chunk',
-                'chunk': chunk
-            }))
+        # Stream AI response, coalescing chunks into fewer frames
+        coalescer = ChunkCoalescer(
+            self.send_response_chunk,
+            max_bytes=getattr(settings, 'STREAM_FLUSH_BYTES', 256),
+            max_delay_ms=getattr(settings, 'STREAM_FLUSH_INTERVAL_MS', 50)
+        )
+        stream = llm_client.stream_chat_response(
+            messages, use_cache=getattr(settings, 'LLM_RESPONSE_CACHE_CHAT', False)
+        )
+        try:
+            async for chunk in stream:
+                await coalescer.add(chunk)
+        except Exception as exc:
+            # No provider answered, or the provider failed mid-stream: keep
+            # what was generated and end the stream
+            if not isinstance(exc, LLMUnavailableError):
+                logger.exception("LLM stream failed")
+            coalescer.discard()
+            partial = coalescer.text()
+            if partial:
+                await self.save_message(partial, 'ai')
+            await self.emit_stream_event({
+                'type': 'ai_error',
+                'message': 'The AI service is temporarily unavailable. Please try again.',
+                'partial': partial,
+                'timestamp': str(timezone.now())
+            })
+            return
+        except asyncio.CancelledError:
+            # Stopped by the user or a disconnect: keep what was generated
+            coalescer.discard()
+            partial = coalescer.text()
+            if partial:
+                await self.save_message(partial, 'ai')
+            await self.emit_stream_event({
+                'type': 'ai_response_cancelled',
+                'message': partial,
+                'timestamp': str(timezone.now())
+            })
+            raise
+        finally:
+            # Closes the provider stream(s) right away
+            await stream.aclose()
+        full_response = await coalescer.close()
         
         # Save complete AI response
         await self.save_message(full_response, 'ai')
         
         # Send completion signal
-        await self.send(text_data=json.dumps({
+        await self.emit_stream_event({
             'type': 'ai_response_complete',
             'message': full_response,
             'timestamp': str(timezone.now())
-        }))
+        })
+    
+    async def send_response_chunk(self, text):
+        """Send one (coalesced) frame of the streamed response"""
+        await self.emit_stream_event({
+            'type': 'ai_response_chunk',
+            'chunk': text
+        })
+    
+    async def emit_stream_event(self, event):
+        """Record an event of the current stream and send it if the client is still connected"""
+        self.stream_seq += 1
+        event = {**event, 'stream_id': self.stream_id, 'stream_seq': self.stream_seq}
+        await get_stream_buffer().append(self.conversation_id, self.stream_id, event)
+        if not self.closed:
+            await self.send_event(event)
+    
+    async def send_event(self, event):
+        """Encode an event with the connection's codec and send it as one frame"""
+        self.seq += 1
+        frame = self.codec.encode(event, self.seq)
+        if self.codec.binary:
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+    
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        """Send a frame, counting frames and bytes for this connection"""
+        if text_data is not None:
+            self.frames_sent += 1
+            self.bytes_sent += len(text_data.encode('utf-8'))
+        elif bytes_data is not None:
+            self.frames_sent += 1
+            self.bytes_sent += len(bytes_data)
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
     
     async def handle_typing_indicator(self, data):
         """Handle typing indicator"""
@@ -107,39 +350,34 @@ class ChatConsumer(AsyncWebsocketConsumer):
     
     async def chat_message(self, event):
         """Send chat message to WebSocket"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'chat_message',
             'message': event['message'],
             'sender': event['sender'],
             'timestamp': event['timestamp']
-        }))
+        })
     
     async def typing_indicator(self, event):
         """Send typing indicator to WebSocket"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'typing_indicator',
             'is_typing': event['is_typing']
-        }))
-    
-    @database_sync_to_async
-    def save_message(self, content, sender):
-        """Save message to database"""
-        from django.utils import timezone
-        conversation = Conversation.objects.get(id=self.conversation_id)
-        return Message.objects.create(
-            conversation=conversation,
-            content=content,
-            sender=sender,
-            timestamp=timezone.now()
-        )
+        })
+    
+    async def conversation_processing(self, event):
+        """Forward background summary/embedding progress to WebSocket"""
+        await self.send_event(event)
+    
+    async def save_message(self, content, sender):
+        """Queue message for the worker's next batched insert"""
+        return await get_message_buffer().add(self.conversation_id, content, sender)
     
-    @database_sync_to_async
-    def get_conversation_history(self):
-        """Get conversation history for context"""
-        conversation = Conversation.objects.get(id=self.conversation_id)
-        messages = conversation.messages.all().order_by('timestamp')
-        return [
-            {'role': 'user' if msg.sender == 'user' else 'assistant', 
-             'content': msg.content}
-            for msg in messages
-        ]
+    async def get_conversation_history(self, provider='openai'):
+        """Get the running summary and most recent history that fit the context window"""
+        history = await get_message_buffer().history(self.conversation_id)
+        builder = ContextBuilder(provider=provider)
+        messages = await builder.abuild(self.conversation_id, history)
+        if builder.should_fold():
+            # Publishing to the broker blocks
+            await asyncio.to_thread(enqueue_history_fold, self.conversation_id)
+        return messages
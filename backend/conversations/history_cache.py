@@ -0,0 +1,179 @@
+import json
+import threading
+from collections import deque
+from typing import List, Optional
+from django.utils.dateparse import parse_datetime
+from ai_module.cache import LRUCache, get_redis_client
+from .models import Message
+
+
+class HistoryCache:
+    """
+    Newest messages of active conversations, oldest first
+    An in-process LRU of bounded deques in front of an optional Redis tier
+    holding one list per conversation (RPUSH + LTRIM to the window), so a
+    conversation continued on another worker or after a reconnect does not
+    re-read its history from the database.
+
+    Appends only extend a Redis list that already exists (RPUSHX): a list is
+    created whole from the database, never from a partial tail. With Redis,
+    a local entry is used only while its newest message is also the list's
+    newest (one LINDEX per read), and is dropped when an append finds that
+    another worker wrote since.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        max_conversations: int = 1000,
+        ttl: Optional[float] = 300,
+        use_redis: bool = False,
+        key_prefix: str = 'chat-history'
+    ):
+        """
+        Initialize cache
+
+        Args:
+            window: Messages kept per conversation
+            max_conversations: Conversations kept in process
+            ttl: Seconds an entry stays cached (both tiers; refreshed on append)
+            use_redis: Share histories through Redis lists
+            key_prefix: Redis key namespace
+        """
+        self.window = window
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.key_prefix = key_prefix
+        self.local = LRUCache(max_size=max_conversations, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id) -> Optional[List[Message]]:
+        """
+        Cached history of a conversation
+
+        Returns:
+            List[Message] or None on a miss in both tiers
+        """
+        key = self._key(conversation_id)
+        with self._lock:
+            local = self.local.get(key)
+            local = list(local) if local is not None else None
+        if not self.use_redis:
+            return local
+
+        client = get_redis_client()
+        if client is None:
+            return local
+        try:
+            if local:
+                newest = client.lindex(key, -1)
+                if newest is not None and json.loads(newest)['id'] == local[-1].id:
+                    return local
+            items = client.lrange(key, 0, -1)
+        except Exception:
+            return local
+        if not items:
+            self.local.delete(key)
+            return None
+
+        # A message appended while its history was being loaded is listed twice
+        decoded = {}
+        for item in items:
+            message = self._decode(conversation_id, item)
+            decoded[message.id] = message
+        messages = sorted(decoded.values(), key=lambda message: (message.timestamp, message.id))
+        with self._lock:
+            self.local.set(key, deque(messages, maxlen=self.window))
+        return messages
+
+    def set(self, conversation_id, messages: List[Message]):
+        """Replace a conversation's history (oldest first), e.g. after reading it from the database"""
+        key = self._key(conversation_id)
+        messages = messages[-self.window:]
+        with self._lock:
+            self.local.set(key, deque(messages, maxlen=self.window))
+
+        if not self.use_redis or not messages:
+            return
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.rpush(key, *[self._encode(message) for message in messages])
+            if self.ttl:
+                pipe.expire(key, int(self.ttl))
+            pipe.execute()
+        except Exception:
+            pass
+
+    def append(self, conversation_id, message: Message):
+        """Add a new message to the conversation's history in whichever tiers hold it"""
+        key = self._key(conversation_id)
+        with self._lock:
+            local = self.local.get(key)
+            previous = local[-1].id if local else None
+            if local is not None and all(cached.id != message.id for cached in local):
+                local.append(message)
+
+        if not self.use_redis:
+            return
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=True)
+            pipe.lindex(key, -1)
+            pipe.rpushx(key, self._encode(message))
+            pipe.ltrim(key, -self.window, -1)
+            if self.ttl:
+                pipe.expire(key, int(self.ttl))
+            newest = pipe.execute()[0]
+        except Exception:
+            return
+        if newest is None or json.loads(newest)['id'] != previous:
+            # Another worker appended (or the list expired): reload on next get
+            self.local.delete(key)
+
+    def invalidate(self, conversation_id):
+        """Drop a conversation's history from both tiers (written outside the message buffer)"""
+        key = self._key(conversation_id)
+        with self._lock:
+            self.local.delete(key)
+
+        if not self.use_redis:
+            return
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            # Other workers' local entries fail the LINDEX check on their next get
+            client.delete(key)
+        except Exception:
+            pass
+
+    def _key(self, conversation_id) -> str:
+        return f"{self.key_prefix}:{conversation_id}"
+
+    def _encode(self, message: Message) -> str:
+        return json.dumps({
+            'id': message.id,
+            'sender': message.sender,
+            'content': message.content,
+            'token_count': message.token_count,
+            'timestamp': message.timestamp.isoformat(),
+        })
+
+    def _decode(self, conversation_id, item) -> Message:
+        data = json.loads(item)
+        message = Message(
+            id=data['id'],
+            conversation_id=conversation_id,
+            sender=data['sender'],
+            content=data['content'],
+            token_count=data['token_count'],
+            timestamp=parse_datetime(data['timestamp'])
+        )
+        message._state.adding = False
+        return message
@@ -0,0 +1,136 @@
+import asyncio
+import time
+import numpy as np
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from ai_module.context_builder import ContextBuilder, message_tokens
+from conversations.history_cache import HistoryCache
+from conversations.message_buffer import MessageBuffer
+from conversations.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = "Concurrent chat conversations per worker: per-turn database overhead, previous vs async path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, nargs='+', default=[10, 50, 100, 200],
+                            help='Concurrent active conversations to test')
+        parser.add_argument('--turns', type=int, default=5, help='Turns per conversation')
+        parser.add_argument('--history', type=int, default=50, help='Existing messages per conversation')
+        parser.add_argument('--response-ms', type=float, default=500.0,
+                            help='Simulated LLM streaming time per turn')
+        parser.add_argument('--target-ms', type=float, default=100.0,
+                            help='p95 overhead a conversation count must stay under')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"turns={options['turns']} history={options['history']} "
+            f"response={options['response_ms']:g}ms CONN_MAX_AGE={settings.DATABASES['default'].get('CONN_MAX_AGE', 0)}"
+        )
+        self.stdout.write(
+            f"{'path':<10} {'conversations':>13} {'p50 ms':>8} {'p95 ms':>8} {'turns/s':>8}"
+        )
+        supported = {}
+        for path in ('previous', 'async'):
+            for count in options['conversations']:
+                overheads, elapsed = self._run(path, count, options)
+                overheads = np.array(overheads) * 1000
+                p95 = np.percentile(overheads, 95)
+                self.stdout.write(
+                    f"{path:<10} {count:>13} {np.percentile(overheads, 50):>8.1f} {p95:>8.1f} "
+                    f"{len(overheads) / elapsed:>8.1f}"
+                )
+                if p95 <= options['target_ms']:
+                    supported[path] = max(supported.get(path, 0), count)
+
+        for path in ('previous', 'async'):
+            self.stdout.write(
+                f"{path}: {supported.get(path, 0)} concurrent conversations within "
+                f"p95 {options['target_ms']:g}ms overhead"
+            )
+
+    def _run(self, path, count, options):
+        # Rows are committed (the sync thread pool uses its own connection)
+        # and deleted afterwards
+        conversations = self._create_conversations(count, options['history'])
+        try:
+            return asyncio.run(self._load(path, conversations, options))
+        finally:
+            Conversation.objects.filter(id__in=[c.id for c in conversations]).delete()
+
+    def _create_conversations(self, count, history):
+        conversations = Conversation.objects.bulk_create([
+            Conversation(title=f'bench-chat-load-{i}') for i in range(count)
+        ])
+        Message.objects.bulk_create([
+            Message(
+                conversation=conversation,
+                content=f'Earlier message {j} about caching and latency',
+                sender='user' if j % 2 == 0 else 'ai',
+                token_count=8
+            )
+            for conversation in conversations
+            for j in range(history)
+        ], batch_size=1000)
+        return conversations
+
+    async def _load(self, path, conversations, options):
+        overheads = []
+        buffer = MessageBuffer(
+            flush_interval_ms=getattr(settings, 'MESSAGE_BUFFER_FLUSH_MS', 100),
+            history_cache=HistoryCache(window=getattr(settings, 'CHAT_CONTEXT_MAX_MESSAGES', 200))
+        )
+        turn = self._previous_turn if path == 'previous' else self._async_turn
+
+        async def converse(conversation):
+            for i in range(options['turns']):
+                overheads.append(await turn(buffer, conversation.id, f'Question {i}', options))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[converse(conversation) for conversation in conversations])
+        await buffer.flush()
+        return overheads, time.perf_counter() - start
+
+    async def _previous_turn(self, buffer, conversation_id, text, options):
+        """Previous ChatConsumer data access: thread-pool hops, re-fetch + insert per message"""
+        start = time.perf_counter()
+        await self._legacy_save(conversation_id, text, 'user')
+        await self._legacy_history(conversation_id)
+        overhead = time.perf_counter() - start
+
+        await asyncio.sleep(options['response_ms'] / 1000)
+
+        start = time.perf_counter()
+        await self._legacy_save(conversation_id, 'Answer', 'ai')
+        return overhead + time.perf_counter() - start
+
+    async def _async_turn(self, buffer, conversation_id, text, options):
+        """Current path: buffered writes, cached history, async ORM for the summary"""
+        start = time.perf_counter()
+        await buffer.add(conversation_id, text, 'user')
+        history = await buffer.history(conversation_id)
+        await ContextBuilder().abuild(conversation_id, history)
+        overhead = time.perf_counter() - start
+
+        await asyncio.sleep(options['response_ms'] / 1000)
+
+        start = time.perf_counter()
+        await buffer.add(conversation_id, 'Answer', 'ai')
+        return overhead + time.perf_counter() - start
+
+    @database_sync_to_async
+    def _legacy_save(self, conversation_id, content, sender):
+        conversation = Conversation.objects.get(id=conversation_id)
+        return Message.objects.create(
+            conversation=conversation,
+            content=content,
+            sender=sender,
+            timestamp=timezone.now(),
+            token_count=message_tokens(content)
+        )
+
+    @database_sync_to_async
+    def _legacy_history(self, conversation_id):
+        return ContextBuilder().build(conversation_id)
@@ -0,0 +1,86 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from ai_module.context_builder import ContextBuilder
+from ai_module.utils import truncate_conversation
+from conversations.models import Conversation, Message
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Per-turn latency of building LLM context for long conversations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, nargs='+', default=[100, 1000, 5000],
+                            help='Conversation lengths to test')
+        parser.add_argument('--turns', type=int, default=20, help='Timed turns per length')
+        parser.add_argument('--provider', default='openai')
+        parser.add_argument('--words', type=int, default=60, help='Words per synthetic message')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'messages':>9} {'method':<16} {'mean ms':>9} {'p95 ms':>9} {'context':>8}")
+        # Synthetic conversations are rolled back when the run finishes
+        try:
+            with transaction.atomic():
+                for length in options['messages']:
+                    conversation = self._create_conversation(length, options['words'])
+                    self._bench(conversation, length, options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _create_conversation(self, length, words):
+        rng = np.random.default_rng(length)
+        vocabulary = ['model', 'query', 'index', 'latency', 'vector', 'token', 'cache',
+                      'summary', 'python', 'database', 'request', 'stream']
+        conversation = Conversation.objects.create(title=f'bench-context-{length}')
+        Message.objects.bulk_create([
+            Message(
+                conversation=conversation,
+                content=' '.join(rng.choice(vocabulary, words)),
+                sender='user' if i % 2 == 0 else 'ai'
+            )
+            for i in range(length)
+        ], batch_size=1000)
+        return conversation
+
+    def _bench(self, conversation, length, options):
+        builder = ContextBuilder(provider=options['provider'])
+
+        def legacy():
+            # Previous behaviour plus truncation: every message, re-tokenized each turn
+            history = [
+                {'role': 'user' if msg.sender == 'user' else 'assistant', 'content': msg.content}
+                for msg in conversation.messages.all().order_by('timestamp')
+            ]
+            return truncate_conversation(history, builder.budget)
+
+        def build():
+            return builder.build(conversation.id)
+
+        start = time.perf_counter()
+        context = build()
+        self._report(length, 'builder (cold)', [time.perf_counter() - start], len(context))
+
+        self._report(length, 'load all + trim', *self._time(legacy, options['turns']))
+        self._report(length, 'builder', *self._time(build, options['turns']))
+
+    def _time(self, fn, turns):
+        timings = []
+        result = None
+        for _ in range(turns):
+            start = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - start)
+        return timings, len(result)
+
+    def _report(self, length, method, timings, context_size):
+        timings = np.array(timings) * 1000
+        self.stdout.write(
+            f"{length:>9} {method:<16} {timings.mean():>9.2f} "
+            f"{np.percentile(timings, 95):>9.2f} {context_size:>8}"
+        )
@@ -0,0 +1,64 @@
+import asyncio
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from conversations.protocol import FrameCodec, available_codecs
+from conversations.streaming import ChunkCoalescer
+
+
+class Command(BaseCommand):
+    help = "Bytes on the wire and encode CPU per streamed response for each frame codec"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=800, help='Chunks per response')
+        parser.add_argument('--responses', type=int, default=200)
+        parser.add_argument('--flush-bytes', type=int, default=256,
+                            help='Coalescing size per frame (0 = one frame per chunk)')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        words = ['the', ' model', ' returns', ' a', ' streamed', ' answer', ',', ' token', ' by', ' token', '.']
+        chunks = [str(w) for w in rng.choice(words, options['tokens'])]
+        events = asyncio.run(self._events(chunks, options['flush_bytes']))
+
+        self.stdout.write(
+            f"tokens={len(chunks)} frames/response={len(events)} responses={options['responses']}"
+        )
+        self.stdout.write(f"{'codec':<26} {'bytes/resp':>11} {'vs v1':>7} {'encode us/resp':>15} {'us/token':>9}")
+        baseline = None
+        for codec in [FrameCodec()] + available_codecs():
+            size, cpu = self._bench(codec, events, options['responses'])
+            baseline = baseline or size
+            self.stdout.write(
+                f"{codec.subprotocol or 'v1 (json, default)':<26} {size:>11.0f} {size / baseline:>7.2f} "
+                f"{1e6 * cpu:>15.1f} {1e6 * cpu / len(chunks):>9.3f}"
+            )
+
+    async def _events(self, chunks, flush_bytes):
+        """Events ChatConsumer sends for one response"""
+        events = [{'type': 'ai_typing', 'is_typing': True}]
+
+        async def send_chunk(text):
+            events.append({'type': 'ai_response_chunk', 'chunk': text})
+
+        # Size-based flushing only, so the frame count is deterministic
+        coalescer = ChunkCoalescer(send_chunk, flush_bytes, 3600 * 1000)
+        for chunk in chunks:
+            await coalescer.add(chunk)
+        full_response = await coalescer.close()
+        events.append({
+            'type': 'ai_response_complete',
+            'message': full_response,
+            'timestamp': '2024-01-01 00:00:00.000000+00:00'
+        })
+        return events
+
+    def _bench(self, codec, events, responses):
+        size = 0
+        start = time.process_time()
+        for _ in range(responses):
+            size = 0
+            for seq, event in enumerate(events, 1):
+                frame = codec.encode(event, seq)
+                size += len(frame) if isinstance(frame, bytes) else len(frame.encode('utf-8'))
+        return size, (time.process_time() - start) / responses
@@ -0,0 +1,75 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from ai_module.ann_index import recall_at_k
+from ai_module.embeddings import EmbeddingGenerator
+from ai_module.quantization import decode_embedding, encode_embedding, stored_embedding
+
+
+class Command(BaseCommand):
+    help = "Compare size, decode throughput and recall of embedding storage formats"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=20000, help='Synthetic corpus size')
+        parser.add_argument('--dim', type=int, default=768)
+        parser.add_argument('--clusters', type=int, default=200)
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--top-k', type=int, default=5)
+        parser.add_argument('--from-db', action='store_true',
+                            help='Use stored ConversationEmbedding vectors instead of synthetic data')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        corpus = self._load_corpus(options, rng)
+        n, dim = corpus.shape
+        top_k = options['top_k']
+
+        picks = rng.choice(n, options['queries'], replace=False)
+        queries = corpus[picks] + rng.normal(0, 0.5 / np.sqrt(dim), (len(picks), dim))
+        reference = [
+            [idx for idx, _ in EmbeddingGenerator.find_most_similar(q, corpus, top_k)]
+            for q in queries
+        ]
+
+        self.stdout.write(f"corpus={n} dim={dim} queries={len(queries)} top_k={top_k}")
+        self.stdout.write(f"{'format':<8} {'bytes/vec':>10} {'decode vec/s':>14} {'recall@k':>9}")
+
+        # Legacy column: a list of Python floats per row, parsed with np.array
+        as_lists = corpus.tolist()
+        start = time.perf_counter()
+        decoded = np.array([np.array(row) for row in as_lists])
+        elapsed = time.perf_counter() - start
+        self._report('array', 8 * dim, n / elapsed, 1.0)
+
+        for storage_format in ('float32', 'float16', 'int8'):
+            encoded = [encode_embedding(row, storage_format) for row in corpus]
+            start = time.perf_counter()
+            decoded = np.stack([decode_embedding(data, storage_format, scale) for data, scale in encoded])
+            elapsed = time.perf_counter() - start
+
+            results = [
+                [idx for idx, _ in EmbeddingGenerator.find_most_similar(q, decoded, top_k)]
+                for q in queries
+            ]
+            recall = float(np.mean([recall_at_k(ref, res) for ref, res in zip(reference, results)]))
+            self._report(storage_format, len(encoded[0][0]), n / elapsed, recall)
+
+    def _load_corpus(self, options, rng) -> np.ndarray:
+        if options['from_db']:
+            from conversations.models import ConversationEmbedding
+            rows = ConversationEmbedding.objects.values_list(
+                'embedding_vector', 'embedding_data', 'embedding_format', 'embedding_scale'
+            )
+            return np.array(
+                [stored_embedding(*row) for row in rows.iterator(chunk_size=2000)],
+                dtype=np.float64
+            )
+
+        n, dim = options['size'], options['dim']
+        centers = rng.standard_normal((options['clusters'], dim))
+        labels = rng.integers(0, options['clusters'], n)
+        return centers[labels] + rng.standard_normal((n, dim)) * 0.6
+
+    def _report(self, name, size, throughput, recall):
+        self.stdout.write(f"{name:<8} {size:>10} {throughput:>14,.0f} {recall:>9.3f}")
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from conversations.streaming import ChunkCoalescer
+
+
+class Command(BaseCommand):
+    help = "Frames per response and server CPU per streamed token, per chunk vs coalesced"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=800, help='Chunks per response')
+        parser.add_argument('--responses', type=int, default=20)
+        parser.add_argument('--interval-ms', type=float, default=0.0,
+                            help='Delay between provider chunks (0 = as fast as possible)')
+        parser.add_argument('--flush-bytes', type=int, default=256)
+        parser.add_argument('--flush-ms', type=float, default=50.0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        words = ['the', ' model', ' returns', ' a', ' streamed', ' answer', ',', ' token', ' by', ' token', '.']
+        chunks = [str(w) for w in rng.choice(words, options['tokens'])]
+
+        self.stdout.write(
+            f"tokens={len(chunks)} responses={options['responses']} interval={options['interval_ms']}ms"
+        )
+        self.stdout.write(f"{'policy':<22} {'frames/resp':>12} {'bytes/resp':>11} {'cpu us/token':>13}")
+        self._report('per chunk (before)', asyncio.run(self._run(chunks, options, coalesce=False)), len(chunks))
+        self._report(
+            f"coalesced {options['flush_bytes']}B/{options['flush_ms']:g}ms",
+            asyncio.run(self._run(chunks, options, coalesce=True)),
+            len(chunks)
+        )
+
+    async def _run(self, chunks, options, coalesce):
+        sent = {'frames': 0, 'bytes': 0}
+
+        async def send_frame(text):
+            frame = json.dumps({'type': 'ai_response_chunk', 'chunk': text})
+            sent['frames'] += 1
+            sent['bytes'] += len(frame.encode('utf-8'))
+
+        async def provider():
+            for chunk in chunks:
+                if options['interval_ms']:
+                    await asyncio.sleep(options['interval_ms'] / 1000)
+                yield chunk
+
+        cpu_start = time.process_time()
+        for _ in range(options['responses']):
+            if coalesce:
+                coalescer = ChunkCoalescer(send_frame, options['flush_bytes'], options['flush_ms'])
+                async for chunk in provider():
+                    await coalescer.add(chunk)
+                await coalescer.close()
+            else:
+                # Previous ChatConsumer loop
+                full_response = ""
+                async for chunk in provider():
+                    full_response += chunk
+                    await send_frame(chunk)
+        cpu = time.process_time() - cpu_start
+        return sent['frames'] / options['responses'], sent['bytes'] / options['responses'], cpu / options['responses']
+
+    def _report(self, name, result, tokens):
+        frames, size, cpu = result
+        self.stdout.write(f"{name:<22} {frames:>12.1f} {size:>11.0f} {1e6 * cpu / tokens:>13.2f}")
@@ -0,0 +1,103 @@
+import time
+from datetime import datetime, timezone
+import numpy as np
+from django.core.management.base import BaseCommand
+from ai_module.ann_index import IVFFlatIndex, recall_at_k
+from ai_module.embeddings import EmbeddingGenerator
+from ai_module.quantization import stored_embedding
+from ai_module.vector_index import VectorIndex
+
+
+class Command(BaseCommand):
+    help = "Benchmark recall and latency of the vector index backends against find_most_similar"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100000, help='Synthetic corpus size')
+        parser.add_argument('--dim', type=int, default=768, help='Embedding dimension')
+        parser.add_argument('--clusters', type=int, default=200,
+                            help='Topic clusters in the synthetic corpus')
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--top-k', type=int, default=5)
+        parser.add_argument('--nlist', type=int, default=None)
+        parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+        parser.add_argument('--from-db', action='store_true',
+                            help='Use stored ConversationEmbedding vectors instead of synthetic data')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        corpus = self._load_corpus(options, rng)
+        top_k = options['top_k']
+        n, dim = corpus.shape
+
+        # Queries are perturbed corpus vectors, like real searches near stored topics
+        picks = rng.choice(n, options['queries'], replace=False)
+        queries = corpus[picks] + rng.normal(0, 0.5 / np.sqrt(dim), (len(picks), dim)).astype(np.float32)
+
+        created_at = datetime.now(timezone.utc)
+        index = VectorIndex(dim=dim, initial_capacity=n, ann_min_size=0)
+        for i, vector in enumerate(corpus):
+            index.upsert(i, vector, created_at)
+
+        self.stdout.write(f"corpus={n} dim={dim} queries={len(queries)} top_k={top_k}")
+
+        reference, ref_time = self._timed(
+            lambda q: [idx for idx, _ in EmbeddingGenerator.find_most_similar(q, corpus, top_k)],
+            queries
+        )
+        self._report('find_most_similar', ref_time, 1.0)
+
+        exact, exact_time = self._timed(
+            lambda q: [int(cid) for cid, _ in index.search(q, top_k, exact=True)],
+            queries
+        )
+        self._report('VectorIndex exact', exact_time, self._recall(reference, exact))
+
+        ann = IVFFlatIndex(nlist=options['nlist'], seed=options['seed'])
+        start = time.perf_counter()
+        normalized = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+        ann.train(normalized)
+        index.set_ann(ann, {})
+        self.stdout.write(
+            f"ivf trained nlist={ann.centroids.shape[0]} in {time.perf_counter() - start:.1f}s"
+        )
+
+        for nprobe in options['nprobe']:
+            ann.nprobe = nprobe
+            approx, approx_time = self._timed(
+                lambda q: [int(cid) for cid, _ in index.search(q, top_k)],
+                queries
+            )
+            self._report(f'ivf nprobe={nprobe}', approx_time, self._recall(reference, approx))
+
+    def _load_corpus(self, options, rng) -> np.ndarray:
+        if options['from_db']:
+            from conversations.models import ConversationEmbedding
+            rows = ConversationEmbedding.objects.values_list(
+                'embedding_vector', 'embedding_data', 'embedding_format', 'embedding_scale'
+            )
+            return np.array(
+                [stored_embedding(*row) for row in rows.iterator(chunk_size=2000)],
+                dtype=np.float32
+            )
+
+        # Gaussian mixture: real sentence embeddings cluster by topic
+        n, dim = options['size'], options['dim']
+        centers = rng.standard_normal((options['clusters'], dim)).astype(np.float32)
+        labels = rng.integers(0, options['clusters'], n)
+        noise = rng.standard_normal((n, dim)).astype(np.float32) * 0.6
+        return centers[labels] + noise
+
+    def _timed(self, search, queries):
+        results = []
+        start = time.perf_counter()
+        for query in queries:
+            results.append(search(query))
+        elapsed = (time.perf_counter() - start) / len(queries)
+        return results, elapsed
+
+    def _recall(self, reference, results) -> float:
+        return float(np.mean([recall_at_k(ref, res) for ref, res in zip(reference, results)]))
+
+    def _report(self, name, seconds, recall):
+        self.stdout.write(f"{name:<22} {seconds * 1000:8.2f} ms/query  recall@k={recall:.3f}")
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from ai_module.quantization import STORAGE_FORMATS, storage_fields, stored_embedding
+from conversations.models import ConversationEmbedding
+
+
+class Command(BaseCommand):
+    help = "Convert stored embeddings to a compact binary format (or back to arrays)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            default=getattr(settings, 'EMBEDDING_STORAGE_FORMAT', 'float32'),
+            help=f"Target format: {', '.join(STORAGE_FORMATS)}"
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--keep-array', action='store_true',
+                            help='Keep embedding_vector populated for rollback')
+
+    def handle(self, *args, **options):
+        target = options['format']
+        if target not in STORAGE_FORMATS:
+            raise CommandError(f"Unknown format '{target}'")
+
+        fields = ['embedding_data', 'embedding_format', 'embedding_scale', 'updated_at']
+        if target == 'array' or not options['keep_array']:
+            fields.append('embedding_vector')
+
+        converted = 0
+        last_id = 0
+        while True:
+            batch = list(
+                ConversationEmbedding.objects
+                .filter(id__gt=last_id)
+                .exclude(embedding_format=target)
+                .order_by('id')
+                .only('id', 'embedding_vector', 'embedding_data', 'embedding_format', 'embedding_scale')
+                [:options['batch_size']]
+            )
+            if not batch:
+                break
+
+            now = timezone.now()
+            for embedding in batch:
+                vector = stored_embedding(
+                    embedding.embedding_vector,
+                    embedding.embedding_data,
+                    embedding.embedding_format,
+                    embedding.embedding_scale
+                )
+                for field, value in storage_fields(vector, target).items():
+                    if field == 'embedding_vector' and field not in fields:
+                        continue
+                    setattr(embedding, field, value)
+                # bulk_update skips auto_now; bump it so vector indexes re-sync
+                embedding.updated_at = now
+
+            ConversationEmbedding.objects.bulk_update(batch, fields)
+            converted += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"Converted {converted} embeddings...")
+
+        self.stdout.write(self.style.SUCCESS(f"Converted {converted} embeddings to {target}"))
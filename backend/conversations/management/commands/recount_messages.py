@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from conversations.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = "Recompute Conversation.message_count/last_message_at from the messages table"
+
+    def handle(self, *args, **options):
+        messages = Message.objects.filter(conversation=OuterRef('pk')).order_by().values('conversation')
+        updated = Conversation.objects.update(
+            message_count=Coalesce(
+                Subquery(messages.annotate(total=Count('id')).values('total'), output_field=IntegerField()),
+                Value(0)
+            ),
+            last_message_at=Subquery(messages.annotate(latest=Max('timestamp')).values('latest'))
+        )
+        self.stdout.write(self.style.SUCCESS(f"Recounted messages for {updated} conversations"))
@@ -0,0 +1,177 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from ai_module.cache import get_search_index_version
+from ai_module.embeddings import EmbeddingGenerator
+from ai_module.semantic_search import SemanticSearch
+from conversations.models import Conversation, ConversationEmbedding, Message
+
+# Messages used by SemanticSearch._prepare_conversation_text
+TEXT_MESSAGE_LIMIT = 50
+
+_worker_generator = None
+
+
+def _init_worker(model_name):
+    """Load the embedding model once per pool process"""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+    global _worker_generator
+    _worker_generator = EmbeddingGenerator(model_name=model_name)
+
+
+def _encode_chunk(texts):
+    return _worker_generator.generate_batch_embeddings(texts)
+
+
+class Command(BaseCommand):
+    help = "Regenerate ConversationEmbedding rows in bulk (resumable)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=256,
+                            help='Conversations fetched and written per page')
+        parser.add_argument('--encode-batch', type=int, default=32,
+                            help='Texts per model.encode call')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Encoding processes (1 encodes in this process)')
+        parser.add_argument('--include-active', action='store_true',
+                            help='Also embed conversations that have not ended')
+        parser.add_argument(
+            '--checkpoint',
+            default=str(settings.BASE_DIR / 'var' / 'reembed_checkpoint.json'),
+            help='File recording the last written conversation id'
+        )
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore an existing checkpoint and start over')
+
+    def handle(self, *args, **options):
+        search = SemanticSearch()
+        checkpoint_path = options['checkpoint']
+        checkpoint = self._read_checkpoint(checkpoint_path, options['restart'])
+        if checkpoint.get('model') not in (None, search.model_name):
+            self.stdout.write(self.style.WARNING(
+                f"Checkpoint was written for {checkpoint['model']}; continuing with {search.model_name}"
+            ))
+
+        last_id = checkpoint.get('last_id')
+        processed = checkpoint.get('processed', 0)
+        if last_id:
+            self.stdout.write(f"Resuming after {last_id} ({processed} already done)")
+
+        pool = None
+        if options['workers'] > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=_init_worker,
+                initargs=(search.model_name,)
+            )
+        else:
+            _init_worker(search.model_name)
+
+        started = time.perf_counter()
+        written = 0
+        try:
+            page = self._fetch_page(last_id, options)
+            while page:
+                texts = [search._prepare_conversation_text(conversation) for conversation in page]
+                pending = self._submit(pool, texts, options['encode_batch'])
+
+                # Read the next page while this one is encoding
+                next_page = self._fetch_page(page[-1].id, options)
+
+                embeddings = [row for chunk in pending for row in self._result(chunk)]
+                self._write(search, page, texts, embeddings)
+
+                written += len(page)
+                processed += len(page)
+                last_id = page[-1].id
+                self._write_checkpoint(checkpoint_path, {
+                    'last_id': str(last_id),
+                    'processed': processed,
+                    'model': search.model_name,
+                })
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{processed} embedded ({written / elapsed:.1f} rows/sec)")
+                page = next_page
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            # bulk_create skips post_save, so invalidate cached search results here
+            if written:
+                get_search_index_version().bump()
+
+        elapsed = time.perf_counter() - started
+        rate = written / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-embedded {written} conversations in {elapsed:.1f}s ({rate:.1f} rows/sec)"
+        ))
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def _fetch_page(self, after_id, options):
+        """Next keyset page of conversations with their first messages prefetched"""
+        queryset = Conversation.objects.order_by('id').prefetch_related(
+            Prefetch(
+                'messages',
+                queryset=Message.objects.order_by('timestamp')[:TEXT_MESSAGE_LIMIT]
+            )
+        )
+        if not options['include_active']:
+            queryset = queryset.filter(status='ended')
+        if after_id:
+            queryset = queryset.filter(id__gt=after_id)
+        return list(queryset[:options['batch_size']])
+
+    def _submit(self, pool, texts, encode_batch):
+        chunks = [texts[i:i + encode_batch] for i in range(0, len(texts), encode_batch)]
+        if pool is None:
+            return [_encode_chunk(chunk) for chunk in chunks]
+        return [pool.submit(_encode_chunk, chunk) for chunk in chunks]
+
+    def _result(self, chunk):
+        return chunk.result() if hasattr(chunk, 'result') else chunk
+
+    def _write(self, search, page, texts, embeddings):
+        """Upsert one page of embeddings with a single INSERT ... ON CONFLICT"""
+        rows = [
+            ConversationEmbedding(
+                conversation=conversation,
+                **search.embedding_fields(conversation, text, embedding)
+            )
+            for conversation, text, embedding in zip(page, texts, embeddings)
+        ]
+        ConversationEmbedding.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['conversation'],
+            update_fields=[
+                'embedding_vector', 'embedding_data', 'embedding_format',
+                'embedding_scale', 'metadata', 'updated_at'
+            ]
+        )
+
+        if search.pgvector_store is not None:
+            search.pgvector_store.write_many(
+                (conversation.id, embedding) for conversation, embedding in zip(page, embeddings)
+            )
+
+    def _read_checkpoint(self, path, restart):
+        if restart or not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_checkpoint(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
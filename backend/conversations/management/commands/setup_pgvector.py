@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from ai_module.pgvector_store import PgVectorStore
+
+
+class Command(BaseCommand):
+    help = "Add a pgvector column and ANN index to ConversationEmbedding and backfill it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dim', type=int, default=768)
+        parser.add_argument('--index', choices=['hnsw', 'ivfflat'], default='hnsw')
+        parser.add_argument('--m', type=int, default=16, help='HNSW graph degree')
+        parser.add_argument('--ef-construction', type=int, default=64)
+        parser.add_argument('--lists', type=int, default=100, help='IVFFlat list count')
+        parser.add_argument('--skip-backfill', action='store_true')
+
+    def handle(self, *args, **options):
+        store = PgVectorStore()
+        store.setup(dim=options['dim'])
+        self.stdout.write(self.style.SUCCESS("pgvector column ready"))
+
+        if not options['skip_backfill']:
+            count = store.backfill()
+            self.stdout.write(self.style.SUCCESS(f"Backfilled {count} embeddings"))
+
+        store.create_index(
+            index_type=options['index'],
+            m=options['m'],
+            ef_construction=options['ef_construction'],
+            lists=options['lists']
+        )
+        self.stdout.write(self.style.SUCCESS(f"{options['index']} index ready"))
+
+        self.stdout.write("Set SEMANTIC_SEARCH_BACKEND=pgvector to search in the database")
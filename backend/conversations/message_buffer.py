@@ -0,0 +1,256 @@
+import asyncio
+import atexit
+import logging
+import threading
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+from channels.db import database_sync_to_async
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from ai_module.context_builder import message_tokens
+from .history_cache import HistoryCache
+from .models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBuffer:
+    """
+    Write-behind buffer for chat messages on a worker
+    add() returns a Message with its id (reserved in blocks from the
+    table's sequence) and timestamp already set; rows are inserted with
+    one bulk_create per flush interval across every connection on the
+    worker. bulk_create skips post_save, so Conversation.message_count and
+    last_message_at are updated here, one UPDATE per conversation.
+
+    The newest messages of each active conversation are also kept in a
+    HistoryCache (in process, optionally shared through Redis), so building
+    the next prompt does not re-read what was just written.
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: float = 100.0,
+        max_pending: int = 500,
+        id_block: int = 100,
+        history_cache: Optional[HistoryCache] = None
+    ):
+        """
+        Initialize buffer
+
+        Args:
+            flush_interval_ms: Longest a message waits before it is inserted
+                               (0 disables the background flusher; call flush())
+            max_pending: Flush right away once this many messages are waiting
+            id_block: Message ids reserved per sequence round trip
+            history_cache: Recent history per conversation (defaults to in-process only)
+        """
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.id_block = id_block
+        self.history_cache = history_cache or HistoryCache()
+        self._pending: List[Message] = []
+        self._ids: deque = deque()
+        self._lock = threading.Lock()
+        self._id_lock: Optional[asyncio.Lock] = None
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.flushes = 0
+        self.flushed = 0
+
+    async def add(self, conversation_id, content: str, sender: str) -> Message:
+        """
+        Queue a message for insertion
+
+        Args:
+            conversation_id: Conversation primary key
+            content: Message text
+            sender: 'user' or 'ai'
+
+        Returns:
+            Message: Unsaved instance with id, timestamp and token_count set
+        """
+        message = Message(
+            id=await self._next_id(),
+            conversation_id=Conversation._meta.pk.to_python(conversation_id),
+            content=content,
+            sender=sender,
+            timestamp=timezone.now(),
+            token_count=message_tokens(content)
+        )
+        with self._lock:
+            self._pending.append(message)
+            pending = len(self._pending)
+        await self._cache_call(self.history_cache.append, conversation_id, message)
+
+        if self.flush_interval > 0:
+            self._ensure_flusher()
+            if pending >= self.max_pending:
+                self._wakeup.set()
+        return message
+
+    async def history(self, conversation_id) -> List[Message]:
+        """
+        Newest messages of a conversation, oldest first
+        Loaded from the database on a cache miss and merged with messages
+        still waiting to be flushed.
+
+        Returns:
+            List[Message]: At most history_cache.window messages
+        """
+        history = await self._cache_call(self.history_cache.get, conversation_id)
+        if history is None:
+            history = await database_sync_to_async(self._load)(conversation_id)
+        return history
+
+    async def flush(self) -> int:
+        """Insert every waiting message"""
+        return await database_sync_to_async(self.flush_sync)()
+
+    def flush_sync(self) -> int:
+        """
+        Insert every waiting message (blocking)
+
+        Returns:
+            int: Messages inserted
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                try:
+                    inserted = self._insert(batch)
+                except IntegrityError:
+                    # Conversation deleted while its messages waited
+                    existing = set(Conversation.objects.filter(
+                        id__in={message.conversation_id for message in batch}
+                    ).values_list('id', flat=True))
+                    orphans = [message for message in batch if message.conversation_id not in existing]
+                    logger.warning("Dropping %d buffered messages of deleted conversations", len(orphans))
+                    batch = [message for message in batch if message.conversation_id in existing]
+                    inserted = self._insert(batch)
+            except Exception:
+                logger.exception("Message flush failed; %d messages will be retried", len(batch))
+                with self._lock:
+                    self._pending[:0] = batch
+                return 0
+            self.flushes += 1
+            self.flushed += inserted
+            return inserted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'flushes': self.flushes,
+            'flushed': self.flushed,
+            'history': len(self.history_cache.local),
+        }
+
+    def _insert(self, batch: List[Message]) -> int:
+        if not batch:
+            return 0
+        by_conversation = defaultdict(list)
+        for message in batch:
+            by_conversation[message.conversation_id].append(message.timestamp)
+        with transaction.atomic():
+            Message.objects.bulk_create(batch)
+            for conversation_id, timestamps in by_conversation.items():
+                Conversation.objects.filter(id=conversation_id).update(
+                    message_count=F('message_count') + len(timestamps),
+                    last_message_at=Greatest('last_message_at', max(timestamps))
+                )
+        for message in batch:
+            message._state.adding = False
+        return len(batch)
+
+    def _load(self, conversation_id) -> List[Message]:
+        # Holding the flush lock, every message is either in the rows read
+        # or still pending
+        with self._flush_lock:
+            rows = list(
+                Message.objects.filter(conversation_id=conversation_id)
+                .order_by('-timestamp')
+                .only('id', 'conversation_id', 'sender', 'content', 'token_count', 'timestamp')
+                [:self.history_cache.window]
+            )
+        key = str(conversation_id)
+        with self._lock:
+            seen = {message.id for message in rows}
+            rows.extend(
+                message for message in self._pending
+                if str(message.conversation_id) == key and message.id not in seen
+            )
+            rows.sort(key=lambda message: (message.timestamp, message.id))
+            self.history_cache.set(conversation_id, rows)
+        return rows[-self.history_cache.window:]
+
+    async def _cache_call(self, fn, *args):
+        # Redis round trips run off the event loop
+        if self.history_cache.use_redis:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def _next_id(self) -> int:
+        if self._id_lock is None:
+            self._id_lock = asyncio.Lock()
+        async with self._id_lock:
+            if not self._ids:
+                self._ids.extend(await database_sync_to_async(self._reserve_ids)())
+            return self._ids.popleft()
+
+    def _reserve_ids(self) -> List[int]:
+        """Take a block of ids from the message table's sequence"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [Message._meta.db_table, self.id_block]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _ensure_flusher(self):
+        loop = asyncio.get_running_loop()
+        if self._flusher is None or self._flusher.done() or self._flusher.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._flusher = loop.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+_buffer: Optional[MessageBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_message_buffer() -> MessageBuffer:
+    """Get the worker's message buffer (flushed at interpreter exit), configured from Django settings"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                from django.conf import settings
+                _buffer = MessageBuffer(
+                    flush_interval_ms=getattr(settings, 'MESSAGE_BUFFER_FLUSH_MS', 100),
+                    max_pending=getattr(settings, 'MESSAGE_BUFFER_MAX_PENDING', 500),
+                    id_block=getattr(settings, 'MESSAGE_BUFFER_ID_BLOCK', 100),
+                    history_cache=HistoryCache(
+                        window=getattr(settings, 'CHAT_CONTEXT_MAX_MESSAGES', 200),
+                        max_conversations=getattr(settings, 'MESSAGE_HISTORY_CACHE_SIZE', 1000),
+                        ttl=getattr(settings, 'MESSAGE_HISTORY_CACHE_TTL', 300),
+                        use_redis=getattr(settings, 'MESSAGE_HISTORY_CACHE_REDIS', False),
+                    ),
+                )
+                atexit.register(_buffer.flush_sync)
+    return _buffer
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
 import uuid
 
 class Conversation(models.Model):
@@ -8,10 +9,26 @@ class Conversation(models.Model):
         ('ended', 'Ended'),
     ]
     
+    PROCESSING_CHOICES = [
+        ('none', 'Not started'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=255, default='New Conversation')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     summary = models.TextField(blank=True, null=True)
+    # State of the background summary/embedding pipeline started on end
+    processing_status = models.CharField(max_length=10, choices=PROCESSING_CHOICES, default='none')
+    # Denormalized from Message, maintained on insert (conversations.signals)
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(blank=True, null=True)
+    # Rolling memory: summary of every message up to running_summary_until,
+    # sent in place of those messages (see ai_module.context_builder)
+    running_summary = models.TextField(blank=True, null=True)
+    running_summary_until = models.DateTimeField(blank=True, null=True)
     start_timestamp = models.DateTimeField(auto_now_add=True)
     end_timestamp = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -41,7 +58,11 @@ class Message(models.Model):
     )
     content = models.TextField()
     sender = models.CharField(max_length=10, choices=SENDER_CHOICES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Cached tokenizer length of content (see ai_module.context_builder)
+    token_count = models.PositiveIntegerField(blank=True, null=True)
+    # Set when the message is accepted (it may be inserted later, see
+    # conversations.message_buffer)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -60,9 +81,27 @@ class ConversationEmbedding(models.Model):
         on_delete=models.CASCADE,
         related_name='embedding'
     )
-    embedding_vector = ArrayField(models.FloatField(), size=768)
+    FORMAT_CHOICES = [
+        ('array', 'Float array'),
+        ('float32', 'Float32 bytes'),
+        ('float16', 'Float16 bytes'),
+        ('int8', 'Int8 quantized bytes'),
+    ]
+    
+    # Legacy representation; empty once a row is stored in a compact format
+    embedding_vector = ArrayField(models.FloatField(), size=768, null=True, blank=True)
+    embedding_data = models.BinaryField(null=True, blank=True)
+    embedding_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='array')
+    embedding_scale = models.FloatField(null=True, blank=True)
     metadata = models.JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # Used by the in-memory vector index to catch up on new rows
+            models.Index(fields=['updated_at']),
+        ]
     
     def __str__(self):
         return f"Embedding for {self.conversation.title}"
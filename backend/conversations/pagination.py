@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class MessageCursorPagination(CursorPagination):
+    """
+    Keyset pagination over a conversation's messages, newest first
+    Each page is an index range scan on (conversation, timestamp), so deep
+    pages cost the same as the first; 'next' walks back in time
+    """
+    ordering = '-timestamp'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,129 @@
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Numeric event types of protocol v2 (keep in step with frontend/src/api/chatProtocol.js)
+EVENT_CODES = {
+    'connection_established': 1,
+    'chat_message': 2,
+    'ai_typing': 3,
+    'ai_response_chunk': 4,
+    'ai_response_complete': 5,
+    'ai_response_cancelled': 6,
+    'ai_error': 7,
+    'typing_indicator': 8,
+    'conversation_processing': 9,
+    'stream_expired': 10,
+}
+EVENT_NAMES = {code: name for name, code in EVENT_CODES.items()}
+
+# Deflated frames start with one of these bytes
+FRAME_RAW = 0
+FRAME_DEFLATED = 1
+
+
+class FrameCodec:
+    """
+    Protocol v1: one verbose JSON text frame per event, {'type': name, ...}
+    Used when the client offers no subprotocol we support. Events are sent
+    unchanged (no sequence number) so existing clients keep working.
+    """
+
+    subprotocol: Optional[str] = None
+    binary = False
+
+    def encode(self, event: Dict[str, Any], seq: int) -> Union[str, bytes]:
+        return json.dumps(event)
+
+    def decode(self, data: Union[str, bytes]) -> Dict[str, Any]:
+        """Client -> server messages keep named types in every protocol version"""
+        return json.loads(data)
+
+    def _pack(self, event: Dict[str, Any], seq: int) -> List:
+        """v2 frame: [type code, sequence number, remaining fields]"""
+        payload = {key: value for key, value in event.items() if key != 'type'}
+        return [EVENT_CODES[event['type']], seq, payload]
+
+
+class CompactJSONCodec(FrameCodec):
+    """Protocol v2 as JSON text: [code, seq, payload] without whitespace"""
+
+    subprotocol = 'chat.v2.json'
+
+    def encode(self, event: Dict[str, Any], seq: int) -> str:
+        return json.dumps(self._pack(event, seq), separators=(',', ':'), ensure_ascii=False)
+
+
+class MsgpackCodec(FrameCodec):
+    """Protocol v2 as msgpack binary frames (needs the msgpack package)"""
+
+    subprotocol = 'chat.v2.msgpack'
+    binary = True
+
+    def encode(self, event: Dict[str, Any], seq: int) -> bytes:
+        return msgpack.packb(self._pack(event, seq), use_bin_type=True)
+
+    def decode(self, data: Union[str, bytes]) -> Dict[str, Any]:
+        if isinstance(data, bytes):
+            return msgpack.unpackb(data, raw=False)
+        return json.loads(data)
+
+
+class DeflateCodec(FrameCodec):
+    """
+    Compresses another v2 codec's frames into binary frames
+    Each frame is deflated on its own (raw deflate, no shared window), so
+    the browser can inflate it with DecompressionStream('deflate-raw').
+    Frames below `min_bytes` are sent uncompressed; the first byte says
+    which (FRAME_RAW / FRAME_DEFLATED).
+    """
+
+    binary = True
+
+    def __init__(self, inner: FrameCodec, level: int = 6, min_bytes: int = 128):
+        self.inner = inner
+        self.level = level
+        self.min_bytes = min_bytes
+        self.subprotocol = f'{inner.subprotocol}+deflate'
+
+    def encode(self, event: Dict[str, Any], seq: int) -> bytes:
+        data = self.inner.encode(event, seq)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if len(data) < self.min_bytes:
+            return bytes([FRAME_RAW]) + data
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        return bytes([FRAME_DEFLATED]) + compressor.compress(data) + compressor.flush()
+
+    def decode(self, data: Union[str, bytes]) -> Dict[str, Any]:
+        return self.inner.decode(data)
+
+
+def available_codecs() -> List[FrameCodec]:
+    """Supported v2 codecs (msgpack ones only when the package is installed)"""
+    codecs = [CompactJSONCodec()]
+    if msgpack is not None:
+        codecs.append(MsgpackCodec())
+    return codecs + [DeflateCodec(codec) for codec in list(codecs)]
+
+
+def negotiate(offered: List[str]) -> FrameCodec:
+    """
+    Pick the codec for a connection
+
+    Args:
+        offered: Subprotocols from the client's handshake, in its order of preference
+
+    Returns:
+        FrameCodec: The first offered codec we support, else protocol v1
+    """
+    codecs = {codec.subprotocol: codec for codec in available_codecs()}
+    for subprotocol in offered:
+        if subprotocol in codecs:
+            return codecs[subprotocol]
+    return FrameCodec()
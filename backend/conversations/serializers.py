@@ -8,25 +8,30 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'timestamp']
 
 class ConversationListSerializer(serializers.ModelSerializer):
-    message_count = serializers.SerializerMethodField()
-    
     class Meta:
         model = Conversation
         fields = ['id', 'title', 'status', 'start_timestamp', 
-                  'end_timestamp', 'message_count', 'created_at']
-        read_only_fields = ['id', 'start_timestamp', 'created_at']
-    
-    def get_message_count(self, obj):
-        return obj.messages.count()
+                  'end_timestamp', 'message_count', 'last_message_at',
+                  'created_at']
+        read_only_fields = ['id', 'start_timestamp', 'message_count',
+                            'last_message_at', 'created_at']
 
-class ConversationDetailSerializer(serializers.ModelSerializer):
-    messages = MessageSerializer(many=True, read_only=True)
-    
+class ConversationInfoSerializer(serializers.ModelSerializer):
+    """Conversation detail without messages (history is paged separately)"""
     class Meta:
         model = Conversation
-        fields = ['id', 'title', 'status', 'summary', 'start_timestamp',
-                  'end_timestamp', 'messages', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'start_timestamp', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'status', 'summary', 'processing_status',
+                  'start_timestamp', 'end_timestamp', 'message_count',
+                  'last_message_at', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'processing_status', 'start_timestamp',
+                            'message_count', 'last_message_at', 'created_at',
+                            'updated_at']
+
+class ConversationDetailSerializer(ConversationInfoSerializer):
+    messages = MessageSerializer(many=True, read_only=True)
+    
+    class Meta(ConversationInfoSerializer.Meta):
+        fields = ConversationInfoSerializer.Meta.fields + ['messages']
 
 class ConversationCreateSerializer(serializers.ModelSerializer):
     class Meta:
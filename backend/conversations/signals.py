@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .message_buffer import get_message_buffer
+from .models import Conversation, ConversationEmbedding, Message
+from ai_module.cache import get_search_index_version
+from ai_module.vector_index import get_vector_index
+
+
+@receiver(post_delete, sender=ConversationEmbedding)
+def remove_embedding_from_index(sender, instance, **kwargs):
+    """Drop deleted embeddings (including cascades from Conversation) from the resident index"""
+    get_vector_index().remove(instance.conversation_id)
+    get_search_index_version().bump()
+
+
+@receiver(post_save, sender=ConversationEmbedding)
+def invalidate_search_results(sender, instance, **kwargs):
+    """A new or re-generated embedding changes search results"""
+    get_search_index_version().bump()
+
+
+@receiver(post_delete, sender=Conversation)
+def invalidate_search_results_on_delete(sender, instance, **kwargs):
+    get_search_index_version().bump()
+
+
+@receiver(post_save, sender=Conversation)
+def sync_index_status(sender, instance, created, **kwargs):
+    """Keep the index status side array and cached results (title, summary) in step"""
+    if not created:
+        get_vector_index().update_status(instance.id, instance.status)
+        get_search_index_version().bump()
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_message_history(sender, instance, **kwargs):
+    """
+    Messages saved one by one (REST API, admin) bypass the message buffer,
+    so drop the cached chat history instead of serving a window without them
+    """
+    history_cache = get_message_buffer().history_cache
+    conversation_id = instance.conversation_id
+    transaction.on_commit(lambda: history_cache.invalidate(conversation_id))
+
+
+@receiver(post_save, sender=Message)
+def update_message_stats(sender, instance, created, **kwargs):
+    """Maintain Conversation.message_count/last_message_at in one UPDATE"""
+    if not created:
+        return
+    Conversation.objects.filter(id=instance.conversation_id).update(
+        message_count=F('message_count') + 1,
+        # GREATEST ignores NULL on PostgreSQL, so the first message sets it
+        last_message_at=Greatest('last_message_at', instance.timestamp)
+    )
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from ai_module.cache import LRUCache, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class StreamBuffer:
+    """
+    Short-lived record of the events of each generation (stream)
+    ChatConsumer numbers every event of a response (stream_seq, from 1)
+    and appends it here, so a client that reconnects can fetch what it
+    missed after its last received sequence number and keep following the
+    generation instead of starting another one.
+
+    Events live for `ttl` seconds after the last append. In process they
+    are only visible to the worker running the generation; with Redis
+    (a list per stream) any worker can resume it.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 120,
+        max_streams: int = 1000,
+        use_redis: bool = False,
+        key_prefix: str = 'chat-stream'
+    ):
+        """
+        Initialize buffer
+
+        Args:
+            ttl: Seconds a stream's events are kept after its last event
+            max_streams: Streams kept in process
+            use_redis: Keep streams in Redis, shared by all workers
+            key_prefix: Redis key namespace
+        """
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.key_prefix = key_prefix
+        self._streams = LRUCache(max_size=max_streams, ttl=ttl)
+        self._active = LRUCache(max_size=max_streams, ttl=ttl)
+        self._attached = LRUCache(max_size=max_streams)
+        self._lock = threading.Lock()
+
+    async def start(self, conversation_id) -> str:
+        """Open a stream for a new generation and make it the conversation's active one"""
+        stream_id = uuid.uuid4().hex
+        await self._call(self._start, str(conversation_id), stream_id)
+        return stream_id
+
+    async def append(self, conversation_id, stream_id: str, event: Dict[str, Any]):
+        """Record an event (its stream_seq must follow the previous one)"""
+        await self._call(self._append, str(conversation_id), stream_id, event)
+
+    async def finish(self, conversation_id, stream_id: str):
+        """The generation ended; its events stay readable until they expire"""
+        await self._call(self._finish, str(conversation_id), stream_id)
+
+    async def since(self, conversation_id, stream_id: str, seq: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Events after a sequence number
+
+        Returns:
+            List[Dict] (possibly empty), or None if the stream is unknown or expired
+        """
+        return await self._call(self._since, str(conversation_id), stream_id, seq)
+
+    async def active(self, conversation_id) -> Optional[Tuple[str, int]]:
+        """(stream_id, last stream_seq) of the conversation's running generation"""
+        return await self._call(self._get_active, str(conversation_id))
+
+    async def attach(self, conversation_id, stream_id: str, seconds: float):
+        """Note that a client is following the stream for the next `seconds`"""
+        await self._call(self._attach, str(conversation_id), stream_id, seconds)
+
+    async def attached(self, conversation_id, stream_id: str) -> bool:
+        return await self._call(self._is_attached, str(conversation_id), stream_id)
+
+    async def _call(self, fn, *args):
+        if not self.use_redis:
+            return fn(*args)
+        # Redis round trips run off the event loop; an unreachable Redis
+        # only costs resumability, never the generation itself
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except Exception:
+            logger.warning("Stream buffer unavailable", exc_info=True)
+            return None
+
+    def _key(self, conversation_id: str, *parts: str) -> str:
+        return ':'.join((self.key_prefix, conversation_id) + parts)
+
+    def _redis(self):
+        return get_redis_client() if self.use_redis else None
+
+    def _start(self, conversation_id, stream_id):
+        client = self._redis()
+        if client is None:
+            with self._lock:
+                self._streams.set((conversation_id, stream_id), [])
+                self._active.set(conversation_id, stream_id)
+            return
+        client.set(self._key(conversation_id, 'active'), stream_id, ex=int(self.ttl))
+
+    def _append(self, conversation_id, stream_id, event):
+        client = self._redis()
+        if client is None:
+            with self._lock:
+                events = self._streams.get((conversation_id, stream_id))
+                if events is None:
+                    events = []
+                events.append(event)
+                # Re-set to extend the TTL
+                self._streams.set((conversation_id, stream_id), events)
+            return
+        key = self._key(conversation_id, stream_id)
+        pipe = client.pipeline(transaction=False)
+        pipe.rpush(key, json.dumps(event))
+        pipe.expire(key, int(self.ttl))
+        pipe.expire(self._key(conversation_id, 'active'), int(self.ttl))
+        pipe.execute()
+
+    def _finish(self, conversation_id, stream_id):
+        client = self._redis()
+        if client is None:
+            with self._lock:
+                if self._active.get(conversation_id) == stream_id:
+                    self._active.delete(conversation_id)
+            return
+        key = self._key(conversation_id, 'active')
+        if client.get(key) == stream_id.encode():
+            client.delete(key)
+
+    def _since(self, conversation_id, stream_id, seq):
+        client = self._redis()
+        if client is None:
+            with self._lock:
+                events = self._streams.get((conversation_id, stream_id))
+                return None if events is None else events[seq:]
+        key = self._key(conversation_id, stream_id)
+        pipe = client.pipeline(transaction=False)
+        pipe.exists(key)
+        pipe.lrange(key, seq, -1)
+        exists, items = pipe.execute()
+        if not exists:
+            return None
+        return [json.loads(item) for item in items]
+
+    def _get_active(self, conversation_id):
+        client = self._redis()
+        if client is None:
+            with self._lock:
+                stream_id = self._active.get(conversation_id)
+                if stream_id is None:
+                    return None
+                events = self._streams.get((conversation_id, stream_id)) or []
+                return stream_id, len(events)
+        stream_id = client.get(self._key(conversation_id, 'active'))
+        if stream_id is None:
+            return None
+        stream_id = stream_id.decode()
+        return stream_id, client.llen(self._key(conversation_id, stream_id))
+
+    def _attach(self, conversation_id, stream_id, seconds):
+        client = self._redis()
+        if client is None:
+            self._attached.set((conversation_id, stream_id), time.monotonic() + seconds)
+            return
+        client.set(self._key(conversation_id, stream_id, 'attached'), 1, ex=max(int(seconds), 1))
+
+    def _is_attached(self, conversation_id, stream_id):
+        client = self._redis()
+        if client is None:
+            return self._attached.get((conversation_id, stream_id), 0) > time.monotonic()
+        return bool(client.exists(self._key(conversation_id, stream_id, 'attached')))
+
+
+_stream_buffer: Optional[StreamBuffer] = None
+_stream_buffer_lock = threading.Lock()
+
+
+def get_stream_buffer() -> StreamBuffer:
+    """Get the process-wide stream buffer, configured from Django settings"""
+    global _stream_buffer
+    if _stream_buffer is None:
+        with _stream_buffer_lock:
+            if _stream_buffer is None:
+                from django.conf import settings
+                _stream_buffer = StreamBuffer(
+                    ttl=getattr(settings, 'STREAM_RESUME_TTL', 120),
+                    use_redis=getattr(settings, 'STREAM_RESUME_REDIS', False),
+                )
+    return _stream_buffer
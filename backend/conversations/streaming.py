@@ -0,0 +1,101 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional
+
+
+class ChunkCoalescer:
+    """
+    Coalesces streamed LLM chunks into fewer WebSocket frames
+    Chunks are buffered and flushed as one frame once `max_bytes` are
+    pending or `max_delay_ms` has passed since the first buffered chunk
+    (a timer flushes when the provider pauses). The full response is
+    accumulated in a list and joined once.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        max_bytes: int = 256,
+        max_delay_ms: float = 50.0
+    ):
+        """
+        Initialize coalescer
+
+        Args:
+            send: Coroutine function sending one frame's text
+            max_bytes: Flush once this many bytes are buffered (0 flushes every chunk)
+            max_delay_ms: Longest a chunk waits in the buffer (0 flushes every chunk)
+        """
+        self._send = send
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay_ms / 1000
+        self._parts: List[str] = []
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._first_pending_at = 0.0
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.frames = 0
+        self.bytes = 0
+        self.chunks = 0
+
+    async def add(self, chunk: str):
+        """Buffer a chunk, flushing if the policy says so"""
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        self.chunks += 1
+        if not self._pending:
+            self._first_pending_at = time.monotonic()
+        self._pending.append(chunk)
+        self._pending_bytes += len(chunk.encode('utf-8'))
+
+        if (
+            self.max_bytes <= 0
+            or self.max_delay <= 0
+            or self._pending_bytes >= self.max_bytes
+            or time.monotonic() - self._first_pending_at >= self.max_delay
+        ):
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        """Send everything buffered as one frame"""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        async with self._lock:
+            if not self._pending:
+                return
+            text = "".join(self._pending)
+            self._pending = []
+            self._pending_bytes = 0
+            self.frames += 1
+            self.bytes += len(text.encode('utf-8'))
+            await self._send(text)
+
+    async def close(self) -> str:
+        """
+        Flush the remainder
+
+        Returns:
+            str: Full response text
+        """
+        await self.flush()
+        return self.text()
+
+    def discard(self):
+        """Drop buffered chunks without sending them (stream abandoned)"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = None
+        self._pending = []
+        self._pending_bytes = 0
+
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        await self.flush()
@@ -0,0 +1,205 @@
+import logging
+from asgiref.sync import async_to_sync
+from celery import Task, chain, shared_task
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from .models import Conversation, ConversationEmbedding, Message
+
+logger = logging.getLogger(__name__)
+
+# Retries for transient LLM/database failures; tasks are idempotent so a
+# redelivered or retried task never duplicates work
+RETRY_OPTIONS = {
+    'autoretry_for': (Exception,),
+    'retry_backoff': True,
+    'retry_backoff_max': 300,
+    'retry_jitter': True,
+    'retry_kwargs': {'max_retries': 5},
+    'acks_late': True,
+}
+
+
+def notify_conversation(conversation_id, stage: str, status: str, **data):
+    """
+    Push a processing update to clients connected to the conversation
+
+    Args:
+        conversation_id: Conversation primary key
+        stage: Pipeline stage ('summary', 'embedding', 'topics', 'pipeline')
+        status: 'completed' or 'failed'
+        **data: Extra fields for the client (e.g. summary)
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        f'chat_{conversation_id}',
+        {
+            'type': 'conversation_processing',
+            'conversation_id': str(conversation_id),
+            'stage': stage,
+            'status': status,
+            **data
+        }
+    )
+
+
+class ConversationTask(Task):
+    """Marks the conversation as failed once a task gives up retrying"""
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        conversation_id = args[0] if args else kwargs.get('conversation_id')
+        if conversation_id is None:
+            return
+        Conversation.objects.filter(id=conversation_id).update(processing_status='failed')
+        notify_conversation(conversation_id, 'pipeline', 'failed', error=str(exc))
+
+
+@shared_task(base=ConversationTask, **RETRY_OPTIONS)
+def summarize_conversation(conversation_id):
+    """Generate and store the AI summary (skipped if one already exists)"""
+    from ai_module.conversation_analyzer import ConversationAnalyzer
+
+    conversation = Conversation.objects.get(id=conversation_id)
+    if not conversation.summary:
+        analyzer = ConversationAnalyzer()
+        if conversation.running_summary and conversation.running_summary_until:
+            # Only the messages after the running summary are sent again
+            remaining = conversation.messages.filter(timestamp__gt=conversation.running_summary_until)
+            summary = analyzer.generate_summary(list(remaining), conversation.running_summary)
+        else:
+            summary = analyzer.generate_summary(list(conversation.messages.all()))
+        Conversation.objects.filter(id=conversation_id).update(summary=summary)
+        conversation.summary = summary
+
+    notify_conversation(conversation_id, 'summary', 'completed', summary=conversation.summary)
+    return conversation_id
+
+
+@shared_task(base=ConversationTask, **RETRY_OPTIONS)
+def embed_conversation(conversation_id):
+    """Generate the semantic search embedding (upsert, safe to repeat)"""
+    from ai_module.semantic_search import SemanticSearch
+
+    conversation = Conversation.objects.get(id=conversation_id)
+    SemanticSearch().generate_conversation_embedding(conversation)
+
+    notify_conversation(conversation_id, 'embedding', 'completed')
+    return conversation_id
+
+
+@shared_task(base=ConversationTask, **RETRY_OPTIONS)
+def extract_conversation_topics(conversation_id):
+    """Store key points alongside the embedding and mark processing complete"""
+    from ai_module.conversation_analyzer import ConversationAnalyzer
+
+    conversation = Conversation.objects.get(id=conversation_id)
+    key_points = ConversationAnalyzer().extract_key_points(list(conversation.messages.all()))
+
+    embedding = ConversationEmbedding.objects.filter(conversation_id=conversation_id).first()
+    topics = []
+    if embedding is not None:
+        embedding.metadata = {**embedding.metadata, 'key_points': key_points}
+        embedding.save(update_fields=['metadata', 'updated_at'])
+        topics = embedding.metadata.get('topics', [])
+
+    Conversation.objects.filter(id=conversation_id).update(processing_status='completed')
+    notify_conversation(conversation_id, 'topics', 'completed', topics=topics, key_points=key_points)
+    return conversation_id
+
+
+@shared_task(**RETRY_OPTIONS)
+def fold_conversation_history(conversation_id):
+    """
+    Fold older messages into the conversation's running summary
+    
+    Everything but the newest CHAT_MEMORY_KEEP_MESSAGES is folded, at most
+    CHAT_MEMORY_FOLD_BATCH messages per run (the task re-enqueues itself
+    until caught up). Concurrent runs are harmless: only the one whose
+    starting point is still current stores its summary.
+    """
+    from ai_module.conversation_analyzer import ConversationAnalyzer
+    
+    conversation = Conversation.objects.get(id=conversation_id)
+    keep = getattr(settings, 'CHAT_MEMORY_KEEP_MESSAGES', 20)
+    batch = getattr(settings, 'CHAT_MEMORY_FOLD_BATCH', 200)
+    
+    pending = Message.objects.filter(conversation_id=conversation_id)
+    if conversation.running_summary_until:
+        pending = pending.filter(timestamp__gt=conversation.running_summary_until)
+    
+    # Newest message to fold; the `keep` messages after it stay verbatim
+    boundary = pending.order_by('-timestamp').values_list('timestamp', flat=True)[keep:keep + 1]
+    boundary = boundary[0] if boundary else None
+    if boundary is None:
+        return conversation_id
+    to_fold = list(pending.filter(timestamp__lte=boundary).order_by('timestamp')[:batch])
+    
+    summary = ConversationAnalyzer().update_running_summary(conversation.running_summary, to_fold)
+    updated = Conversation.objects.filter(
+        id=conversation_id,
+        running_summary_until=conversation.running_summary_until
+    ).update(running_summary=summary, running_summary_until=to_fold[-1].timestamp)
+    
+    if updated and to_fold[-1].timestamp < boundary:
+        fold_conversation_history.delay(conversation_id)
+    return conversation_id
+
+
+def enqueue_history_fold(conversation_id) -> bool:
+    """
+    Enqueue fold_conversation_history unless one was enqueued recently
+    Every chat turn past the fold threshold asks for a fold until it has
+    landed; a cache flag held for CHAT_MEMORY_FOLD_DEDUPE_SECONDS keeps that
+    to one task (one summarization call) per conversation. A broker
+    failure is logged rather than failing the chat turn.
+
+    Returns:
+        bool: True if a task was enqueued
+    """
+    key = f'fold-enqueued:{conversation_id}'
+    if not cache.add(key, 1, timeout=getattr(settings, 'CHAT_MEMORY_FOLD_DEDUPE_SECONDS', 60)):
+        return False
+    try:
+        fold_conversation_history.delay(conversation_id)
+    except Exception:
+        cache.delete(key)
+        logger.warning("Could not enqueue history fold for conversation %s", conversation_id, exc_info=True)
+        return False
+    return True
+
+
+def process_ended_conversation(conversation_id):
+    """
+    Enqueue summary -> embedding -> topic extraction for an ended conversation
+
+    Returns:
+        AsyncResult: Result handle of the chain
+    """
+    conversation_id = str(conversation_id)
+    return chain(
+        summarize_conversation.si(conversation_id),
+        embed_conversation.si(conversation_id),
+        extract_conversation_topics.si(conversation_id),
+    ).apply_async()
+
+
+def start_conversation_processing(conversation_id) -> bool:
+    """
+    Enqueue the ended-conversation pipeline, marking it failed if that fails
+    No task runs when the chain cannot be published, so ConversationTask
+    never gets to record the failure; without this the conversation would
+    stay 'processing' for good.
+
+    Returns:
+        bool: True if the pipeline was enqueued
+    """
+    try:
+        process_ended_conversation(conversation_id)
+    except Exception as exc:
+        logger.exception("Could not enqueue processing of conversation %s", conversation_id)
+        Conversation.objects.filter(id=conversation_id).update(processing_status='failed')
+        notify_conversation(conversation_id, 'pipeline', 'failed', error=str(exc))
+        return False
+    return True
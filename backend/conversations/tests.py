@@ -1,3 +1,851 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import zlib
+from datetime import timedelta
+from unittest import mock
+import msgpack
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from ai_module.context_builder import ContextBuilder
+from ai_module.llm_client import ConversationSummarizer, LLMClient
+from ai_module.llm_router import CircuitBreaker, LLMRouter, LLMUnavailableError
+from ai_module.response_cache import ResponseCache
+from ai_module.semantic_search import SemanticSearch
+from ai_module.vector_index import ConversationVectorIndex, VectorIndex
+from .consumers import ChatConsumer
+from .history_cache import HistoryCache
+from .message_buffer import MessageBuffer
+from .models import Conversation, Message
+from .protocol import EVENT_NAMES, CompactJSONCodec, DeflateCodec, FrameCodec, MsgpackCodec, negotiate
+from .streaming import ChunkCoalescer
+from .tasks import enqueue_history_fold
+
+
+def create_conversations(count, messages_each=3):
+    conversations = []
+    for i in range(count):
+        conversation = Conversation.objects.create(title=f'Conversation {i}', status='ended')
+        for j in range(messages_each):
+            Message.objects.create(
+                conversation=conversation,
+                content=f'Message {j}',
+                sender='user' if j % 2 == 0 else 'ai'
+            )
+        conversations.append(conversation)
+    return conversations
+
+
+class MessageStatsTests(TestCase):
+    def test_message_insert_updates_denormalized_fields(self):
+        conversation = Conversation.objects.create()
+        first = Message.objects.create(conversation=conversation, content='hi', sender='user')
+        last = Message.objects.create(conversation=conversation, content='hello', sender='ai')
+
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.message_count, 2)
+        self.assertEqual(conversation.last_message_at, max(first.timestamp, last.timestamp))
+
+
+class ContextBuilderTests(TestCase):
+    def test_keeps_newest_messages_within_budget(self):
+        conversation = Conversation.objects.create()
+        for i in range(50):
+            Message.objects.create(
+                conversation=conversation, content=f'Message {i}', sender='user', token_count=100
+            )
+        builder = ContextBuilder(context_tokens=1000, max_output_tokens=0, safety_margin=0, use_memory=False)
+
+        with self.assertNumQueries(1):
+            context = builder.build(conversation.id)
+
+        # 104 tokens each including per-message overhead
+        self.assertEqual([m['content'] for m in context], [f'Message {i}' for i in range(41, 50)])
+
+    def test_running_summary_replaces_folded_messages(self):
+        conversation = Conversation.objects.create()
+        messages = [
+            Message.objects.create(
+                conversation=conversation, content=f'Message {i}', sender='user', token_count=10
+            )
+            for i in range(10)
+        ]
+        Conversation.objects.filter(id=conversation.id).update(
+            running_summary='Talked about caching.',
+            running_summary_until=messages[6].timestamp
+        )
+        builder = ContextBuilder(context_tokens=100000, use_memory=True)
+
+        with self.assertNumQueries(2):
+            context = builder.build(conversation.id)
+
+        self.assertEqual(context[0]['role'], 'system')
+        self.assertIn('Talked about caching.', context[0]['content'])
+        self.assertEqual([m['content'] for m in context[1:]], ['Message 7', 'Message 8', 'Message 9'])
+        self.assertEqual(builder.unsummarized, 3)
+
+    def test_async_build_matches_build(self):
+        conversation = Conversation.objects.create()
+        messages = [
+            Message.objects.create(conversation=conversation, content=f'Message {i}', sender='ai')
+            for i in range(6)
+        ]
+        Conversation.objects.filter(id=conversation.id).update(
+            running_summary='Earlier turns.',
+            running_summary_until=messages[2].timestamp
+        )
+        builder = ContextBuilder(context_tokens=100000, use_memory=True)
+
+        self.assertEqual(async_to_sync(builder.abuild)(conversation.id), builder.build(conversation.id))
+        self.assertEqual(builder.unsummarized, 3)
+
+    def test_uses_given_history_without_reading_messages(self):
+        conversation = Conversation.objects.create()
+        history = [
+            Message(id=i, conversation=conversation, content=f'Message {i}', sender='user', token_count=10)
+            for i in range(5)
+        ]
+        builder = ContextBuilder(context_tokens=100000, use_memory=False)
+
+        with self.assertNumQueries(0):
+            context = builder.build(conversation.id, history)
+
+        self.assertEqual([m['content'] for m in context], [f'Message {i}' for i in range(5)])
+
+
+class MessageBufferTests(TestCase):
+    def test_flush_inserts_batch_and_updates_stats(self):
+        conversation = Conversation.objects.create()
+        buffer = MessageBuffer(flush_interval_ms=0, id_block=10)
+
+        first = async_to_sync(buffer.add)(conversation.id, 'hi', 'user')
+        second = async_to_sync(buffer.add)(conversation.id, 'hello', 'ai')
+        self.assertEqual(second.id, first.id + 1)
+        self.assertFalse(Message.objects.filter(conversation=conversation).exists())
+
+        with self.assertNumQueries(4):
+            # SAVEPOINT, INSERT, UPDATE, RELEASE
+            self.assertEqual(buffer.flush_sync(), 2)
+
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.message_count, 2)
+        self.assertEqual(conversation.last_message_at, second.timestamp)
+        self.assertEqual(
+            list(conversation.messages.values_list('id', 'content')),
+            [(first.id, 'hi'), (second.id, 'hello')]
+        )
+
+    def test_history_merges_pending_messages(self):
+        conversation = create_conversations(1, messages_each=2)[0]
+        buffer = MessageBuffer(flush_interval_ms=0)
+        pending = async_to_sync(buffer.add)(conversation.id, 'not flushed yet', 'user')
+
+        history = async_to_sync(buffer.history)(conversation.id)
+        self.assertEqual([m.content for m in history], ['Message 0', 'Message 1', 'not flushed yet'])
+
+        # Cached: later messages are appended without another query
+        async_to_sync(buffer.add)(conversation.id, 'reply', 'ai')
+        with self.assertNumQueries(0):
+            history = async_to_sync(buffer.history)(conversation.id)
+        self.assertEqual([m.id for m in history[-2:]], [pending.id, pending.id + 1])
+
+
+class QueryCountTests(TestCase):
+    """Endpoints must run a constant number of queries regardless of size"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_queries(self, method, url, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, format='json', **kwargs)
+        self.assertLess(response.status_code, 300, response.content)
+        return len(queries), response
+
+    def test_list_queries_independent_of_page_size(self):
+        create_conversations(2)
+        small, _ = self.count_queries('get', '/api/conversations/')
+
+        create_conversations(18)
+        full, response = self.count_queries('get', '/api/conversations/')
+
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(small, full)
+        self.assertEqual(response.data['results'][0]['message_count'], 3)
+
+    def test_detail_queries_independent_of_message_count(self):
+        short, long = create_conversations(1, 2)[0], create_conversations(1, 40)[0]
+
+        few, _ = self.count_queries('get', f'/api/conversations/{short.id}/')
+        many, response = self.count_queries('get', f'/api/conversations/{long.id}/')
+
+        self.assertEqual(len(response.data['messages']), 40)
+        self.assertEqual(few, many)
+        self.assertEqual(many, 2)
+
+    def test_message_pages_walk_back_in_time(self):
+        conversation = create_conversations(1, 25)[0]
+        url = f'/api/conversations/{conversation.id}/messages/?page_size=10'
+
+        queries, response = self.count_queries('get', url)
+        self.assertEqual(queries, 2)
+        newest = response.data['results']
+        self.assertEqual(len(newest), 10)
+
+        _, response = self.count_queries('get', response.data['next'])
+        older = response.data['results']
+        self.assertLessEqual(older[0]['timestamp'], newest[-1]['timestamp'])
+        self.assertFalse({m['id'] for m in newest} & {m['id'] for m in older})
+
+    def test_detail_without_messages(self):
+        conversation = create_conversations(1, 5)[0]
+
+        queries, response = self.count_queries('get', f'/api/conversations/{conversation.id}/?messages=false')
+
+        self.assertEqual(queries, 1)
+        self.assertNotIn('messages', response.data)
+        self.assertEqual(response.data['message_count'], 5)
+
+    def test_query_past_queries_independent_of_result_count(self):
+        conversations = create_conversations(10)
+
+        def run(top_k):
+            ranking = [(str(c.id), 0.9) for c in conversations[:top_k]]
+            with mock.patch.object(SemanticSearch, '_embed_query', return_value=None), \
+                    mock.patch.object(SemanticSearch, '_rank', return_value=ranking), \
+                    mock.patch.object(SemanticSearch, '_result_cache_key', return_value=None):
+                return self.count_queries(
+                    'post', '/api/conversations/query_past/', data={'query': 'test', 'top_k': top_k}
+                )
+
+        few, _ = run(1)
+        many, response = run(10)
+
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(few, many)
+        self.assertEqual(many, 1)
+
+
+class EndConversationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.conversation = Conversation.objects.create(title='Ending')
+        self.url = f'/api/conversations/{self.conversation.id}/end_conversation/'
+
+    def test_enqueue_failure_marks_failed_and_allows_retry(self):
+        with mock.patch('conversations.tasks.process_ended_conversation',
+                        side_effect=ConnectionError('broker down')), \
+                mock.patch('conversations.tasks.notify_conversation'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.processing_status, 'failed')
+
+        with mock.patch('conversations.tasks.process_ended_conversation') as process, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 202)
+        process.assert_called_once_with(self.conversation.id)
+
+        # Processing again: ending twice is still rejected
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+
+    def test_buffered_messages_are_inserted_before_processing(self):
+        buffer = MessageBuffer(flush_interval_ms=0)
+        async_to_sync(buffer.add)(self.conversation.id, 'last words', 'user')
+
+        with mock.patch('conversations.views.get_message_buffer', return_value=buffer), \
+                mock.patch('conversations.tasks.process_ended_conversation') as process, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url)
+
+        process.assert_called_once()
+        self.assertTrue(self.conversation.messages.filter(content='last words').exists())
+
+
+class StubLLMClient:
+    """Provider stand-in: waits `delay` seconds, then streams `chunks` or raises"""
+
+    def __init__(self, provider, chunks=('Hello', ' world'), delay=0.0, error=None):
+        self.provider = provider
+        self.chunks = chunks
+        self.delay = delay
+        self.error = error
+        self.cancelled = False
+
+    async def stream_chat_response(self, messages, temperature=0.7, max_tokens=2000, use_cache=None):
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error:
+                raise self.error
+            for chunk in self.chunks:
+                yield chunk
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+class MidStreamFailureClient(StubLLMClient):
+    """Provider stand-in that streams `chunks`, then fails"""
+
+    async def stream_chat_response(self, messages, temperature=0.7, max_tokens=2000, use_cache=None):
+        for chunk in self.chunks:
+            yield chunk
+        raise ConnectionError('connection reset')
+
+
+class FoldEnqueueTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_enqueues_once_per_conversation(self):
+        with mock.patch('conversations.tasks.fold_conversation_history') as task:
+            self.assertTrue(enqueue_history_fold('c1'))
+            self.assertFalse(enqueue_history_fold('c1'))
+            self.assertTrue(enqueue_history_fold('c2'))
+        self.assertEqual(task.delay.call_count, 2)
+
+    def test_broker_failure_is_not_raised(self):
+        with mock.patch('conversations.tasks.fold_conversation_history') as task:
+            task.delay.side_effect = ConnectionError('broker down')
+            self.assertFalse(enqueue_history_fold('c1'))
+            # The flag is dropped so the next turn tries again
+            task.delay.side_effect = None
+            self.assertTrue(enqueue_history_fold('c1'))
+
+
+class MessageBufferFailureTests(SimpleTestCase):
+    def test_failed_retry_after_integrity_error_requeues(self):
+        buffer = MessageBuffer(flush_interval_ms=0)
+        kept, orphan = Message(id=1, conversation_id='a'), Message(id=2, conversation_id='b')
+        buffer._pending = [kept, orphan]
+
+        conversations = mock.patch('conversations.message_buffer.Conversation')
+        with conversations as model, mock.patch.object(
+            buffer, '_insert', side_effect=[IntegrityError('fk'), OperationalError('gone')]
+        ):
+            model.objects.filter.return_value.values_list.return_value = ['a']
+            self.assertEqual(buffer.flush_sync(), 0)
+
+        # The orphan is dropped, the rest waits for the next flush
+        self.assertEqual(buffer._pending, [kept])
+
+
+class ResponseCacheTests(SimpleTestCase):
+    messages = [{'role': 'system', 'content': 'Be brief'}, {'role': 'user', 'content': 'hi'}]
+
+    def lookup(self, cache, messages=None, temperature=0.3):
+        return asyncio.run(cache.lookup('openai', 'gpt', messages or self.messages, temperature, 500))
+
+    def test_exact_hit_and_miss(self):
+        cache = ResponseCache()
+        miss = self.lookup(cache)
+        self.assertIsNone(miss.response)
+        asyncio.run(cache.store(miss, 'Hello!'))
+
+        self.assertEqual(self.lookup(cache).response, 'Hello!')
+        # Every request parameter is part of the key
+        self.assertIsNone(self.lookup(cache, temperature=0.7).response)
+        self.assertEqual(cache.stats(), {'hits': 1, 'semantic_hits': 0, 'misses': 2})
+
+    def test_entries_expire(self):
+        cache = ResponseCache(ttl=60)
+        with mock.patch('time.monotonic', return_value=1000.0):
+            asyncio.run(cache.store(self.lookup(cache), 'Hello!'))
+        with mock.patch('time.monotonic', return_value=1059.0):
+            self.assertEqual(self.lookup(cache).response, 'Hello!')
+        with mock.patch('time.monotonic', return_value=1061.0):
+            self.assertIsNone(self.lookup(cache).response)
+
+    def test_semantic_match_needs_threshold_and_same_prefix(self):
+        vectors = {
+            'hi': [1.0, 0.0], 'hi!': [0.99, 0.14], 'bye': [0.0, 1.0],
+        }
+
+        async def embed(text):
+            vector = np.asarray(vectors[text], dtype=np.float32)
+            return vector / np.linalg.norm(vector)
+
+        cache = ResponseCache(semantic=True, semantic_threshold=0.95)
+        cache._embed = embed
+        asyncio.run(cache.store(self.lookup(cache), 'Hello!'))
+
+        near = [self.messages[0], {'role': 'user', 'content': 'hi!'}]
+        self.assertEqual(self.lookup(cache, near).response, 'Hello!')
+        self.assertEqual(cache.semantic_hits, 1)
+
+        far = [self.messages[0], {'role': 'user', 'content': 'bye'}]
+        self.assertIsNone(self.lookup(cache, far).response)
+        other_prefix = [{'role': 'system', 'content': 'Be verbose'}, {'role': 'user', 'content': 'hi!'}]
+        self.assertIsNone(self.lookup(cache, other_prefix).response)
+
+    def test_replay_chunks(self):
+        cache = ResponseCache(replay_chunk_chars=4)
+
+        async def collect():
+            return [chunk async for chunk in cache.replay('abcdefghij')]
+
+        self.assertEqual(asyncio.run(collect()), ['abcd', 'efgh', 'ij'])
+
+    def test_sampled_calls_bypass_cache_unless_opted_in(self):
+        client = LLMClient('openai')
+        provider_calls = []
+
+        async def stream_provider(messages, temperature, max_tokens):
+            provider_calls.append(temperature)
+            yield 'fresh'
+
+        client._stream_provider = stream_provider
+        cache = ResponseCache()
+
+        def complete(**options):
+            return asyncio.run(client.get_completion(self.messages, **options))
+
+        with mock.patch('ai_module.llm_client.get_response_cache', return_value=cache):
+            for _ in range(2):
+                complete()
+                complete(temperature=0)
+                complete(temperature=0.3, use_cache=True)
+
+        # Sampled calls reach the provider every time; the others once
+        self.assertEqual(provider_calls, [0.7, 0, 0.3, 0.7])
+
+
+class ChunkSummaryCacheTests(SimpleTestCase):
+    def test_redis_tier_is_read_off_the_event_loop(self):
+        threads = []
+        cache = mock.Mock(use_redis=True)
+        cache.get.side_effect = lambda key: threads.append(threading.get_ident()) or 'cached summary'
+        summarizer = ConversationSummarizer()
+
+        with mock.patch('ai_module.llm_client.get_chunk_summary_cache', return_value=cache):
+            summary = asyncio.run(summarizer._summarize_chunk('User: hi', asyncio.Semaphore(1)))
+
+        self.assertEqual(summary, 'cached summary')
+        self.assertNotEqual(threads, [threading.get_ident()])
+
+
+class VectorIndexTests(SimpleTestCase):
+    def test_unchanged_upsert_keeps_version(self):
+        index = VectorIndex(dim=3)
+        created_at = timezone.now()
+        index.upsert('a', [1.0, 0.0, 0.0], created_at)
+        version = index.version
+
+        # A periodic sync re-applies the watermark row as is
+        index.upsert('a', [1.0, 0.0, 0.0], created_at)
+        self.assertEqual(index.version, version)
+
+        index.upsert('a', [1.0, 0.0, 0.0], created_at, status='active')
+        self.assertEqual(index.version, version + 1)
+        index.upsert('a', [0.0, 1.0, 0.0], created_at, status='active')
+        self.assertEqual(index.version, version + 2)
+
+    def test_sync_rereads_overlap_before_watermark(self):
+        index = ConversationVectorIndex(sync_overlap=30)
+        index._loaded = True
+        index._watermark = timezone.now()
+
+        with mock.patch('conversations.models.ConversationEmbedding') as model:
+            queryset = model.objects.all.return_value
+            queryset.filter.return_value.values_list.return_value.order_by.return_value.iterator.return_value = []
+            model.objects.count.return_value = 0
+            index.sync()
+
+        # A re-embedded row stamped before the watermark but committed later is still read
+        queryset.filter.assert_called_once_with(updated_at__gte=index._watermark - timedelta(seconds=30))
+
+
+class HistoryCacheTests(SimpleTestCase):
+    def make_message(self, i):
+        return Message(id=i, conversation_id='c', content=f'Message {i}', sender='user',
+                       token_count=3, timestamp=timezone.now())
+
+    def test_window_and_duplicate_appends(self):
+        cache = HistoryCache(window=3)
+        self.assertIsNone(cache.get('c'))
+
+        # Appends to an unknown conversation are dropped: a history is set whole
+        cache.append('c', self.make_message(0))
+        self.assertIsNone(cache.get('c'))
+
+        cache.set('c', [self.make_message(i) for i in range(1, 3)])
+        for i in (3, 3, 4):
+            cache.append('c', self.make_message(i))
+        self.assertEqual([m.id for m in cache.get('c')], [2, 3, 4])
+
+    def test_message_saved_outside_buffer_invalidates(self):
+        from .signals import invalidate_message_history
+
+        history_cache = HistoryCache()
+        history_cache.set('c', [self.make_message(1)])
+        buffer = mock.Mock(history_cache=history_cache)
+        with mock.patch('conversations.signals.get_message_buffer', return_value=buffer), \
+                mock.patch('conversations.signals.transaction.on_commit', side_effect=lambda fn: fn()):
+            invalidate_message_history(Message, self.make_message(2))
+        self.assertIsNone(history_cache.get('c'))
+
+    def test_redis_round_trip(self):
+        cache = HistoryCache()
+        message = self.make_message(7)
+        decoded = cache._decode('c', cache._encode(message))
+
+        self.assertEqual(
+            (decoded.id, decoded.sender, decoded.content, decoded.token_count, decoded.timestamp),
+            (7, 'user', 'Message 7', 3, message.timestamp)
+        )
+        self.assertFalse(decoded._state.adding)
+
+
+class ProtocolTests(SimpleTestCase):
+    event = {'type': 'ai_response_chunk', 'chunk': 'Hello ' * 40}
+
+    def test_negotiation_prefers_client_order_and_defaults_to_v1(self):
+        self.assertIsNone(negotiate([]).subprotocol)
+        self.assertIsNone(negotiate(['chat.v9']).subprotocol)
+        self.assertEqual(negotiate(['chat.v9', 'chat.v2.json', 'chat.v2.msgpack']).subprotocol, 'chat.v2.json')
+
+    def test_v1_frames_are_unchanged(self):
+        self.assertEqual(json.loads(FrameCodec().encode(self.event, 1)), self.event)
+
+    def test_v2_frames_carry_code_and_sequence(self):
+        code, seq, payload = json.loads(CompactJSONCodec().encode(self.event, 7))
+        self.assertEqual((EVENT_NAMES[code], seq, payload), ('ai_response_chunk', 7, {'chunk': self.event['chunk']}))
+
+    def test_deflate_round_trip(self):
+        codec = DeflateCodec(MsgpackCodec())
+        frame = codec.encode(self.event, 3)
+        self.assertEqual(frame[0], 1)
+        self.assertLess(len(frame), len(MsgpackCodec().encode(self.event, 3)))
+
+        inflater = zlib.decompressobj(-15)
+        code, seq, payload = msgpack.unpackb(inflater.decompress(frame[1:]), raw=False)
+        self.assertEqual((code, seq, payload['chunk']), (4, 3, self.event['chunk']))
+
+        # Small frames are not worth compressing
+        self.assertEqual(codec.encode({'type': 'ai_typing', 'is_typing': True}, 4)[0], 0)
+
+
+class ChunkCoalescerTests(SimpleTestCase):
+    def coalesce(self, steps, **options):
+        """Feed chunks (str) and pauses (float seconds); returns (frames, close() result)"""
+        frames = []
+
+        async def send(text):
+            frames.append(text)
+
+        async def run():
+            coalescer = ChunkCoalescer(send, **options)
+            for step in steps:
+                if isinstance(step, str):
+                    await coalescer.add(step)
+                else:
+                    await asyncio.sleep(step)
+            return await coalescer.close()
+
+        return frames, asyncio.run(run())
+
+    def test_flushes_on_bytes(self):
+        frames, text = self.coalesce(['ab', 'cd', 'ef', 'g'], max_bytes=4, max_delay_ms=10000)
+
+        self.assertEqual(frames, ['abcd', 'efg'])
+        self.assertEqual(text, 'abcdefg')
+
+    def test_timer_flushes_when_provider_pauses(self):
+        frames, text = self.coalesce(['a', 'b', 0.05, 'c'], max_bytes=1000, max_delay_ms=10)
+
+        self.assertEqual(frames, ['ab', 'c'])
+        self.assertEqual(text, 'abc')
+
+    def test_zero_flushes_every_chunk(self):
+        frames, _ = self.coalesce(['a', 'b', 'c'], max_bytes=0)
+        self.assertEqual(frames, ['a', 'b', 'c'])
+
+    def test_discard_drops_pending_but_keeps_text(self):
+        frames = []
+
+        async def send(text):
+            frames.append(text)
+
+        async def run():
+            coalescer = ChunkCoalescer(send, max_bytes=1000, max_delay_ms=10)
+            await coalescer.add('partial')
+            coalescer.discard()
+            await asyncio.sleep(0.03)
+            return coalescer.text()
+
+        self.assertEqual(asyncio.run(run()), 'partial')
+        self.assertEqual(frames, [])
+
+
+class SlowRouter:
+    """Router stand-in streaming `chunks` with `delay` seconds between them"""
+
+    provider = 'openai'
+
+    def __init__(self, chunks, delay):
+        self.chunks = chunks
+        self.delay = delay
+        self.closed = False
+        self.calls = 0
+
+    async def stream_chat_response(self, messages, temperature=0.7, max_tokens=2000, use_cache=None):
+        self.calls += 1
+        try:
+            for chunk in self.chunks:
+                await asyncio.sleep(self.delay)
+                yield chunk
+        finally:
+            self.closed = True
+
+
+class LLMRouterTests(SimpleTestCase):
+    def route(self, clients, **options):
+        router = LLMRouter(list(clients), clients=clients, **options)
+
+        async def collect():
+            return [chunk async for chunk in router.stream_chat_response([])]
+
+        return router, asyncio.run(collect())
+
+    def test_fails_over_on_error(self):
+        router, chunks = self.route({
+            'openai': StubLLMClient('openai', error=ConnectionError('down')),
+            'claude': StubLLMClient('claude', chunks=('from claude',)),
+        })
+
+        self.assertEqual(chunks, ['from claude'])
+        self.assertEqual(router.stats()['openai']['failures'], 1)
+        self.assertEqual(router.stats()['claude']['successes'], 1)
+
+    def test_fails_over_on_first_token_timeout(self):
+        router, chunks = self.route({
+            'openai': StubLLMClient('openai', delay=1.0),
+            'claude': StubLLMClient('claude', chunks=('fast',)),
+        }, first_token_timeout=0.05)
+
+        self.assertEqual(chunks, ['fast'])
+        self.assertEqual(router.stats()['openai']['timeouts'], 1)
+
+    def test_hedged_request_cancels_the_loser(self):
+        slow = StubLLMClient('openai', chunks=('slow',), delay=0.5)
+        router, chunks = self.route({
+            'openai': slow,
+            'claude': StubLLMClient('claude', chunks=('hedge',), delay=0.01),
+        }, hedge_after_ms=20)
+
+        self.assertEqual(chunks, ['hedge'])
+        self.assertTrue(slow.cancelled)
+        self.assertEqual(router.stats()['claude']['wins'], 1)
+        # A cancelled loser is not a failure
+        self.assertEqual(router.stats()['openai']['circuit'], CircuitBreaker.CLOSED)
+
+    def test_mid_stream_failure_is_unavailable(self):
+        clients = {'openai': MidStreamFailureClient('openai', chunks=('partial',))}
+        router = LLMRouter(list(clients), clients=clients)
+        chunks = []
+
+        async def collect():
+            async for chunk in router.stream_chat_response([]):
+                chunks.append(chunk)
+
+        with self.assertRaises(LLMUnavailableError):
+            asyncio.run(collect())
+        self.assertEqual(chunks, ['partial'])
+        self.assertEqual(router.stats()['openai']['failures'], 1)
+
+    def test_release_only_frees_own_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        trial, loser = object(), object()
+
+        self.assertTrue(breaker.allow(trial))
+        breaker.release(loser)
+        self.assertFalse(breaker.allow(object()))
+        breaker.release(trial)
+        self.assertTrue(breaker.allow(object()))
+
+    def test_open_circuit_skips_provider(self):
+        clients = {
+            'openai': StubLLMClient('openai', error=ConnectionError('down')),
+            'claude': StubLLMClient('claude'),
+        }
+        router = LLMRouter(list(clients), clients=clients, failure_threshold=1, reset_timeout=60)
+
+        async def collect():
+            return [chunk async for chunk in router.stream_chat_response([])]
+
+        asyncio.run(collect())
+        self.assertEqual(router.stats()['openai']['circuit'], CircuitBreaker.OPEN)
+        asyncio.run(collect())
+        self.assertEqual(router.stats()['openai']['requests'], 1)
+
+    def test_raises_when_every_provider_fails(self):
+        with self.assertRaises(LLMUnavailableError):
+            self.route({'openai': StubLLMClient('openai', error=ConnectionError('down'))})
+
+
+class ChatConsumerTurnTests(SimpleTestCase):
+    """Turn tasks of ChatConsumer with the socket, database and providers stubbed"""
+
+    def make_consumer(self, conversation_id, router, saved, sent):
+        consumer = ChatConsumer()
+        consumer.conversation_id = conversation_id
+        consumer.room_group_name = f'chat_{conversation_id}'
+        consumer.channel_name = 'test-channel'
+        consumer.turns = set()
+        consumer.generation = None
+        consumer.closed = False
+        consumer.codec = FrameCodec()
+        consumer.seq = 0
+        consumer.channel_layer = mock.AsyncMock()
+
+        async def save_message(content, sender):
+            saved.append((sender, content))
+
+        async def get_conversation_history(provider='openai'):
+            return []
+
+        async def send(text_data=None, bytes_data=None, close=False):
+            sent.append(json.loads(text_data))
+
+        consumer.save_message = save_message
+        consumer.get_conversation_history = get_conversation_history
+        consumer.send = send
+        self.patcher = mock.patch('conversations.consumers.get_llm_router', return_value=router)
+        self.patcher.start()
+        self.addCleanup(self.patcher.stop)
+        return consumer
+
+    def test_cancel_saves_partial_response(self):
+        router = SlowRouter(['a', 'b', 'c', 'd'], delay=0.02)
+        saved, sent = [], []
+        consumer = self.make_consumer('c1', router, saved, sent)
+
+        async def run():
+            consumer.start_turn({'message': 'hi'})
+            await asyncio.sleep(0.05)
+            consumer.cancel_generation()
+            await asyncio.gather(*consumer.turns, return_exceptions=True)
+
+        asyncio.run(run())
+
+        partial = saved[-1][1]
+        self.assertEqual(saved[-1][0], 'ai')
+        self.assertTrue(partial and 'abcd'.startswith(partial) and partial != 'abcd')
+        self.assertEqual(sent[-1]['type'], 'ai_response_cancelled')
+        self.assertTrue(router.closed)
+
+    def test_provider_failure_ends_stream_and_saves_partial(self):
+        clients = {'openai': MidStreamFailureClient('openai', chunks=('Hello', ' wor'))}
+        router = LLMRouter(list(clients), clients=clients)
+        saved, sent = [], []
+        consumer = self.make_consumer('c6', router, saved, sent)
+
+        async def run():
+            consumer.start_turn({'message': 'hi'})
+            await asyncio.gather(*consumer.turns)
+
+        asyncio.run(run())
+
+        self.assertEqual(saved[-1], ('ai', 'Hello wor'))
+        self.assertEqual(sent[-1]['type'], 'ai_error')
+        self.assertEqual(sent[-1]['partial'], 'Hello wor')
+
+    def test_turns_of_a_conversation_run_in_order(self):
+        router = SlowRouter(['x', 'y'], delay=0.01)
+        saved, sent = [], []
+        consumer = self.make_consumer('c2', router, saved, sent)
+
+        async def run():
+            consumer.start_turn({'message': 'first'})
+            consumer.start_turn({'message': 'second'})
+            await asyncio.gather(*consumer.turns)
+
+        asyncio.run(run())
+
+        self.assertEqual(saved, [('user', 'first'), ('ai', 'xy'), ('user', 'second'), ('ai', 'xy')])
+
+    @override_settings(STREAM_RESUME_GRACE_SECONDS=0)
+    def test_disconnect_cancels_generation(self):
+        router = SlowRouter(['a'] * 100, delay=0.01)
+        saved, sent = [], []
+        consumer = self.make_consumer('c3', router, saved, sent)
+
+        async def run():
+            consumer.start_turn({'message': 'hi'})
+            await asyncio.sleep(0.05)
+            await consumer.disconnect(1000)
+
+        asyncio.run(run())
+
+        self.assertEqual(saved[-1][0], 'ai')
+        self.assertLess(len(saved[-1][1]), 100)
+        self.assertNotIn('ai_response_cancelled', [frame['type'] for frame in sent])
+
+    @override_settings(STREAM_RESUME_GRACE_SECONDS=5, STREAM_RESUME_POLL_MS=5)
+    def test_reconnected_client_resumes_stream(self):
+        router = SlowRouter(['a', 'b', 'c', 'd', 'e', 'f'], delay=0.02)
+        saved, sent, resumed = [], [], []
+        first = self.make_consumer('c4', router, saved, sent)
+        second = self.make_consumer('c4', router, saved, resumed)
+
+        async def run():
+            first.start_turn({'message': 'hi'})
+            await asyncio.sleep(0.07)
+            await first.disconnect(1006)
+            last = [frame for frame in sent if 'stream_seq' in frame][-1]
+            second.resume_stream({'stream_id': last['stream_id'], 'last_seq': last['stream_seq']})
+            await asyncio.wait_for(second.relay, 2)
+            return last
+
+        last = asyncio.run(run())
+
+        # Picks up right after the last received event and follows to the end
+        self.assertEqual(router.calls, 1)
+        self.assertEqual([frame['stream_seq'] for frame in resumed][0], last['stream_seq'] + 1)
+        received = ''.join(frame.get('chunk', '') for frame in sent + resumed)
+        self.assertEqual(received, 'abcdef')
+        self.assertEqual(resumed[-1]['type'], 'ai_response_complete')
+        self.assertEqual(saved[-1], ('ai', 'abcdef'))
+
+    @override_settings(STREAM_RESUME_POLL_MS=5)
+    def test_cannot_cancel_another_conversations_stream(self):
+        router = SlowRouter(['a'] * 5, delay=0.02)
+        saved, sent, other_sent = [], [], []
+        owner = self.make_consumer('c7', router, saved, sent)
+        intruder = self.make_consumer('c8', router, [], other_sent)
+
+        async def run():
+            owner.start_turn({'message': 'hi'})
+            await asyncio.sleep(0.03)
+            intruder.resume_stream({'stream_id': owner.stream_id, 'last_seq': 0})
+            intruder.cancel_generation()
+            await asyncio.gather(*owner.turns)
+            await asyncio.wait_for(intruder.relay, 1)
+
+        asyncio.run(run())
+
+        self.assertEqual(sent[-1]['type'], 'ai_response_complete')
+        self.assertEqual(saved[-1], ('ai', 'aaaaa'))
+        self.assertEqual(other_sent[-1]['type'], 'stream_expired')
+
+    def test_unknown_stream_expires(self):
+        saved, sent = [], []
+        consumer = self.make_consumer('c5', SlowRouter([], delay=0), saved, sent)
+
+        async def run():
+            consumer.resume_stream({'stream_id': 'gone', 'last_seq': 3})
+            await consumer.relay
+
+        asyncio.run(run())
+
+        self.assertEqual(sent, [{'type': 'stream_expired', 'stream_id': 'gone'}])
 
-# Create your tests here.
@@ -1,21 +1,36 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django.utils import timezone
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from .message_buffer import get_message_buffer
 from .models import Conversation, Message
+from .pagination import MessageCursorPagination
 from .serializers import (
     ConversationListSerializer, 
+    ConversationInfoSerializer,
     ConversationDetailSerializer,
     ConversationCreateSerializer,
+    MessageSerializer,
     MessageCreateSerializer
 )
-from ai_module.conversation_analyzer import ConversationAnalyzer
 from ai_module.semantic_search import SemanticSearch
+from .tasks import start_conversation_processing
 
 @extend_schema_view(
     list=extend_schema(summary="Get all conversations", tags=["Conversations"]),
-    retrieve=extend_schema(summary="Get conversation details", tags=["Conversations"]),
+    retrieve=extend_schema(
+        summary="Get conversation details",
+        tags=["Conversations"],
+        parameters=[
+            OpenApiParameter(
+                'messages', OpenApiTypes.BOOL,
+                description="Set to false to omit messages (page them via /messages/)"
+            )
+        ]
+    ),
     create=extend_schema(summary="Create new conversation", tags=["Conversations"]),
 )
 class ConversationViewSet(viewsets.ModelViewSet):
@@ -26,43 +41,93 @@ class ConversationViewSet(viewsets.ModelViewSet):
             return ConversationListSerializer
         elif self.action == 'create':
             return ConversationCreateSerializer
+        elif not self.include_messages():
+            return ConversationInfoSerializer
         return ConversationDetailSerializer
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # List rows use the denormalized message_count; detail responses
+        # embed every message, loaded with one extra query
+        if self.action in ('retrieve', 'update', 'partial_update') and self.include_messages():
+            queryset = queryset.prefetch_related('messages')
+        return queryset
+    
+    def include_messages(self):
+        """Detail responses embed messages unless ?messages=false"""
+        if self.action == 'messages':
+            return False
+        value = self.request.query_params.get('messages', 'true') if self.request else 'true'
+        return value.lower() not in ('false', '0', 'no')
+    
+    @extend_schema(
+        summary="Get conversation messages",
+        description=(
+            "Cursor-paginated message history, newest first. Follow 'next' "
+            "to load older messages; page_size is capped at 200."
+        ),
+        tags=["Conversations"],
+        responses={200: MessageSerializer(many=True)}
+    )
+    @action(detail=True, methods=['get'], pagination_class=MessageCursorPagination)
+    def messages(self, request, pk=None):
+        """Page through a conversation's messages without loading them all"""
+        conversation = self.get_object()
+        queryset = Message.objects.filter(conversation=conversation)
+        
+        page = self.paginate_queryset(queryset)
+        serializer = MessageSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
     @extend_schema(
         summary="End conversation and generate summary",
+        description=(
+            "Marks the conversation as ended and returns immediately with "
+            "processing_status='processing'. Summary, embedding and topics are "
+            "generated in the background; progress is pushed to the "
+            "conversation's WebSocket as 'conversation_processing' events. "
+            "Ending a conversation whose processing failed starts it again."
+        ),
         tags=["Conversations"],
-        responses={200: ConversationDetailSerializer}
+        responses={202: ConversationDetailSerializer}
     )
     @action(detail=True, methods=['post'])
     def end_conversation(self, request, pk=None):
         """End a conversation and trigger AI summary generation"""
         conversation = self.get_object()
         
-        if conversation.status == 'ended':
+        # The last turn may still wait in this worker's write-behind buffer;
+        # insert it so the summary and embedding see every message
+        get_message_buffer().flush_sync()
+        
+        # Conditional update so concurrent requests enqueue the pipeline once
+        updated = Conversation.objects.filter(
+            id=conversation.id, status='active'
+        ).update(
+            status='ended',
+            end_timestamp=timezone.now(),
+            processing_status='processing',
+            updated_at=timezone.now()
+        )
+        
+        if not updated:
+            # Retry of a pipeline that failed (its stages are idempotent)
+            updated = Conversation.objects.filter(
+                id=conversation.id, status='ended', processing_status='failed'
+            ).update(processing_status='processing', updated_at=timezone.now())
+        
+        if not updated:
             return Response(
                 {'error': 'Conversation already ended'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Update conversation status
-        conversation.status = 'ended'
-        conversation.end_timestamp = timezone.now()
-        conversation.save()
-        
-        # Generate AI summary
-        analyzer = ConversationAnalyzer()
-        messages = conversation.messages.all()
-        summary = analyzer.generate_summary(messages)
-        
-        conversation.summary = summary
-        conversation.save()
-        
-        # Generate embeddings for semantic search
-        search = SemanticSearch()
-        search.generate_conversation_embedding(conversation)
+        # Summary, embedding and topic extraction run on the Celery worker
+        transaction.on_commit(lambda: start_conversation_processing(conversation.id))
         
+        conversation.refresh_from_db()
         serializer = self.get_serializer(conversation)
-        return Response(serializer.data)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
     
     @extend_schema(
         summary="Query past conversations",
@@ -92,20 +157,12 @@ class ConversationViewSet(viewsets.ModelViewSet):
             date_to=date_to
         )
         
-        # Get relevant conversations
-        conversation_ids = [r['conversation_id'] for r in results]
-        conversations = Conversation.objects.filter(id__in=conversation_ids)
-        
-        # Add relevance scores
-        relevance_map = {r['conversation_id']: r['score'] for r in results}
-        for conv in conversations:
-            conv.relevance_score = relevance_map.get(str(conv.id), 0)
-        
-        serializer = ConversationListSerializer(conversations, many=True)
+        # Results already carry title, summary, score and counts in rank
+        # order, so no second conversation fetch is needed
         return Response({
-            'conversations': serializer.data,
+            'conversations': results,
             'query': query_text,
-            'count': len(conversations)
+            'count': len(results)
         })
 
 @extend_schema_view(
@@ -0,0 +1,115 @@
+// WebSocket frame protocol (see backend/conversations/protocol.py).
+// v1 (no subprotocol): JSON text frames {type, ...}.
+// v2: [typeCode, seq, payload] as compact JSON or msgpack, optionally
+// deflated per frame ("+deflate", first byte 0 = raw, 1 = deflated).
+
+const EVENT_NAMES = {
+  1: 'connection_established',
+  2: 'chat_message',
+  3: 'ai_typing',
+  4: 'ai_response_chunk',
+  5: 'ai_response_complete',
+  6: 'ai_response_cancelled',
+  7: 'ai_error',
+  8: 'typing_indicator',
+  9: 'conversation_processing',
+  10: 'stream_expired',
+};
+
+const CODECS = {
+  json: ['chat.v2.json'],
+  msgpack: ['chat.v2.msgpack', 'chat.v2.json'],
+  'msgpack+deflate': ['chat.v2.msgpack+deflate', 'chat.v2.msgpack', 'chat.v2.json'],
+};
+
+// Subprotocols offered to the server, most preferred first
+export const offeredProtocols = (codec = import.meta.env.VITE_WS_CODEC || 'json') =>
+  CODECS[codec] || CODECS.json;
+
+const textDecoder = new TextDecoder();
+
+// Minimal msgpack decoder covering what the server sends
+// (maps, arrays, strings, integers, floats, booleans, nil)
+const decodeMsgpack = (buffer) => {
+  const view = new DataView(buffer.buffer, buffer.byteOffset, buffer.byteLength);
+  let offset = 0;
+
+  const str = (length) => {
+    const value = textDecoder.decode(buffer.subarray(offset, offset + length));
+    offset += length;
+    return value;
+  };
+  const array = (length) => Array.from({ length }, () => read());
+  const map = (length) => {
+    const result = {};
+    for (let i = 0; i < length; i += 1) {
+      const key = read();
+      result[key] = read();
+    }
+    return result;
+  };
+  const next = (size, getter) => {
+    const value = getter(offset);
+    offset += size;
+    return value;
+  };
+
+  const read = () => {
+    const byte = view.getUint8(offset);
+    offset += 1;
+    if (byte <= 0x7f) return byte;
+    if (byte >= 0xe0) return byte - 0x100;
+    if ((byte & 0xf0) === 0x80) return map(byte & 0x0f);
+    if ((byte & 0xf0) === 0x90) return array(byte & 0x0f);
+    if ((byte & 0xe0) === 0xa0) return str(byte & 0x1f);
+    switch (byte) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xca: return next(4, (o) => view.getFloat32(o));
+      case 0xcb: return next(8, (o) => view.getFloat64(o));
+      case 0xcc: return next(1, (o) => view.getUint8(o));
+      case 0xcd: return next(2, (o) => view.getUint16(o));
+      case 0xce: return next(4, (o) => view.getUint32(o));
+      case 0xcf: return Number(next(8, (o) => view.getBigUint64(o)));
+      case 0xd0: return next(1, (o) => view.getInt8(o));
+      case 0xd1: return next(2, (o) => view.getInt16(o));
+      case 0xd2: return next(4, (o) => view.getInt32(o));
+      case 0xd3: return Number(next(8, (o) => view.getBigInt64(o)));
+      case 0xd9: return str(next(1, (o) => view.getUint8(o)));
+      case 0xda: return str(next(2, (o) => view.getUint16(o)));
+      case 0xdb: return str(next(4, (o) => view.getUint32(o)));
+      case 0xdc: return array(next(2, (o) => view.getUint16(o)));
+      case 0xdd: return array(next(4, (o) => view.getUint32(o)));
+      case 0xde: return map(next(2, (o) => view.getUint16(o)));
+      case 0xdf: return map(next(4, (o) => view.getUint32(o)));
+      default:
+        throw new Error(`Unsupported msgpack type 0x${byte.toString(16)}`);
+    }
+  };
+
+  return read();
+};
+
+const inflate = async (bytes) => {
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate-raw'));
+  return new Uint8Array(await new Response(stream).arrayBuffer());
+};
+
+const unpack = ([code, seq, payload]) => ({ type: EVENT_NAMES[code], seq, ...payload });
+
+// Decode one received frame into an event object ({type, seq?, ...fields})
+export const decodeFrame = async (protocol, data) => {
+  if (!protocol) return JSON.parse(data);
+
+  let body = data;
+  if (protocol.endsWith('+deflate')) {
+    const bytes = new Uint8Array(data);
+    body = bytes[0] === 1 ? await inflate(bytes.subarray(1)) : bytes.subarray(1);
+  }
+
+  if (protocol.startsWith('chat.v2.msgpack')) {
+    return unpack(decodeMsgpack(body instanceof Uint8Array ? body : new Uint8Array(body)));
+  }
+  return unpack(JSON.parse(typeof body === 'string' ? body : textDecoder.decode(body)));
+};
@@ -7,9 +7,22 @@ export const conversationService = {
     return response.data;
   },
 
-  // Get single conversation with messages
-  getConversation: async (id) => {
-    const response = await axiosInstance.get(`/conversations/${id}/`);
+  // Get single conversation (pass { includeMessages: false } and page the
+  // history with getMessages for long conversations)
+  getConversation: async (id, { includeMessages = true } = {}) => {
+    const params = includeMessages ? {} : { messages: 'false' };
+    const response = await axiosInstance.get(`/conversations/${id}/`, { params });
+    return response.data;
+  },
+
+  // Get one page of messages, newest first. Pass the previous page's `next`
+  // URL as cursor to load older messages; `next` is null at the beginning
+  getMessages: async (id, { cursor = null, pageSize = 50 } = {}) => {
+    const response = cursor
+      ? await axiosInstance.get(cursor)
+      : await axiosInstance.get(`/conversations/${id}/messages/`, {
+          params: { page_size: pageSize },
+        });
     return response.data;
   },
 
@@ -1,12 +1,16 @@
 import { useState, useRef, useEffect } from 'react';
 import { useWebSocket } from '../hooks/useWebSocket';
+import { conversationService } from '../api/conversationService';
 import MessageList from './MessageList';
 import MessageInput from './MessageInput';
 
-const ChatInterface = ({ conversationId, initialMessages = [] }) => {
-  const { messages, isConnected, isTyping, error, sendMessage } = useWebSocket(conversationId);
+const ChatInterface = ({ conversationId, initialMessages = [], initialCursor = null }) => {
+  const { messages, isConnected, isTyping, error, sendMessage, cancelGeneration } = useWebSocket(conversationId);
   const [allMessages, setAllMessages] = useState(initialMessages);
+  const [cursor, setCursor] = useState(initialCursor);
+  const [loadingEarlier, setLoadingEarlier] = useState(false);
   const messagesEndRef = useRef(null);
+  const prependedRef = useRef(false);
 
   useEffect(() => {
     // Merge WebSocket messages with initial messages
@@ -20,9 +24,33 @@ const ChatInterface = ({ conversationId, initialMessages = [] }) => {
   }, [messages]);
 
   useEffect(() => {
+    // Keep the reader's position when older history is prepended
+    if (prependedRef.current) {
+      prependedRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [allMessages, isTyping]);
 
+  const loadEarlierMessages = async () => {
+    if (!cursor || loadingEarlier) return;
+    try {
+      setLoadingEarlier(true);
+      const page = await conversationService.getMessages(conversationId, { cursor });
+      prependedRef.current = true;
+      setAllMessages((prev) => {
+        const existingIds = new Set(prev.map(m => m.id));
+        const older = page.results.filter(m => !existingIds.has(m.id)).reverse();
+        return [...older, ...prev];
+      });
+      setCursor(page.next);
+    } catch (err) {
+      console.error('Failed to load earlier messages:', err);
+    } finally {
+      setLoadingEarlier(false);
+    }
+  };
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
@@ -34,7 +62,7 @@ const ChatInterface = ({ conversationId, initialMessages = [] }) => {
   return (
     <div className="flex-1 flex flex-col overflow-hidden">
       {/* Connection status */}
-      {!isConnected && (
+      {(!isConnected || error) && (
         <div className="px-6 py-2 bg-yellow-50 dark:bg-yellow-900/20 border-b border-yellow-200 dark:border-yellow-700">
           <p className="text-sm text-yellow-800 dark:text-yellow-200">
             {error || 'Connecting to chat server...'}
@@ -44,12 +72,33 @@ const ChatInterface = ({ conversationId, initialMessages = [] }) => {
 
       {/* Messages */}
       <div className="flex-1 overflow-y-auto px-6 py-4">
+        {cursor && (
+          <div className="flex justify-center mb-4">
+            <button
+              onClick={loadEarlierMessages}
+              disabled={loadingEarlier}
+              className="text-sm text-primary-600 hover:text-primary-700 dark:text-primary-400 disabled:opacity-50"
+            >
+              {loadingEarlier ? 'Loading...' : 'Load earlier messages'}
+            </button>
+          </div>
+        )}
         <MessageList messages={allMessages} isTyping={isTyping} />
         <div ref={messagesEndRef} />
       </div>
 
       {/* Input */}
       <div className="px-6 py-4 bg-white dark:bg-gray-800 border-t border-gray-200 dark:border-gray-700">
+        {isTyping && (
+          <div className="flex justify-center mb-2">
+            <button
+              onClick={cancelGeneration}
+              className="text-sm text-gray-600 hover:text-gray-800 dark:text-gray-300 dark:hover:text-white"
+            >
+              Stop generating
+            </button>
+          </div>
+        )}
         <MessageInput 
           onSend={handleSendMessage} 
           disabled={!isConnected}
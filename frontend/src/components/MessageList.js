@@ -19,7 +19,7 @@ const MessageList = ({ messages, isTyping }) => {
   return (
     <div className="space-y-4">
       {messages.map((message, index) => (
-        <MessageBubble key={index} message={message} />
+        <MessageBubble key={message.id ?? index} message={message} />
       ))}
       
       {isTyping && <TypingIndicator />}
@@ -1,14 +1,22 @@
 import { useEffect, useRef, useState, useCallback } from 'react';
+import { decodeFrame, offeredProtocols } from '../api/chatProtocol';
 
 const WS_BASE_URL = import.meta.env.VITE_WS_URL || 'ws://localhost:8000';
 
+// Events that end a response stream
+const TERMINAL_EVENTS = new Set(['ai_response_complete', 'ai_response_cancelled', 'ai_error']);
+
 export const useWebSocket = (conversationId) => {
   const [messages, setMessages] = useState([]);
   const [isConnected, setIsConnected] = useState(false);
   const [isTyping, setIsTyping] = useState(false);
   const [error, setError] = useState(null);
+  const [processing, setProcessing] = useState(null);
   
   const ws = useRef(null);
+  const decoding = useRef(Promise.resolve());
+  // Last received event of the current response stream, for resuming after a reconnect
+  const stream = useRef({ id: null, seq: 0, done: true });
   const reconnectAttempts = useRef(0);
   const maxReconnectAttempts = 5;
 
@@ -17,7 +25,8 @@ export const useWebSocket = (conversationId) => {
 
     try {
       const wsUrl = `${WS_BASE_URL}/ws/chat/${conversationId}/`;
-      ws.current = new WebSocket(wsUrl);
+      ws.current = new WebSocket(wsUrl, offeredProtocols());
+      ws.current.binaryType = 'arraybuffer';
 
       ws.current.onopen = () => {
         console.log('WebSocket connected');
@@ -26,13 +35,32 @@ export const useWebSocket = (conversationId) => {
         reconnectAttempts.current = 0;
       };
 
-      ws.current.onmessage = (event) => {
-        const data = JSON.parse(event.data);
-        
+      const handleEvent = (data) => {
+        if (data.stream_id && data.stream_seq) {
+          // Skip events received before a reconnect (replayed on resume)
+          if (data.stream_id === stream.current.id && data.stream_seq <= stream.current.seq) return;
+          stream.current = {
+            id: data.stream_id,
+            seq: data.stream_seq,
+            done: TERMINAL_EVENTS.has(data.type),
+          };
+        }
+
         switch (data.type) {
-          case 'connection_established':
+          case 'connection_established': {
             console.log('Connection confirmed:', data.message);
+            // Continue a response that was streaming when the connection dropped
+            const active = data.active_stream;
+            const resumeId = active ? active.stream_id : (!stream.current.done && stream.current.id);
+            if (resumeId) {
+              ws.current.send(JSON.stringify({
+                type: 'resume_stream',
+                stream_id: resumeId,
+                last_seq: resumeId === stream.current.id ? stream.current.seq : 0,
+              }));
+            }
             break;
+          }
             
           case 'chat_message':
             setMessages((prev) => [
@@ -86,15 +114,76 @@ export const useWebSocket = (conversationId) => {
             });
             break;
             
+          case 'ai_response_cancelled':
+            // Generation stopped; the server kept the partial response
+            setIsTyping(false);
+            setMessages((prev) => {
+              const streaming = prev.filter((m) => !m.isStreaming);
+              if (!data.message) return streaming;
+              return [
+                ...streaming,
+                {
+                  content: data.message,
+                  sender: 'ai',
+                  timestamp: data.timestamp,
+                  isStreaming: false,
+                  cancelled: true,
+                },
+              ];
+            });
+            break;
+            
+          case 'ai_error':
+            // The LLM providers failed; keep the part the server saved, if any
+            setIsTyping(false);
+            setError(data.message);
+            setMessages((prev) => {
+              const streaming = prev.filter((m) => !m.isStreaming);
+              if (!data.partial) return streaming;
+              return [
+                ...streaming,
+                {
+                  content: data.partial,
+                  sender: 'ai',
+                  timestamp: data.timestamp,
+                  isStreaming: false,
+                  cancelled: true,
+                },
+              ];
+            });
+            break;
+            
+          case 'stream_expired':
+            // The interrupted response can no longer be resumed
+            stream.current = { id: null, seq: 0, done: true };
+            setIsTyping(false);
+            setError('The response was interrupted. Reload the conversation to see what was saved.');
+            setMessages((prev) => prev.filter((m) => !m.isStreaming));
+            break;
+            
           case 'typing_indicator':
             setIsTyping(data.is_typing);
             break;
             
+          case 'conversation_processing':
+            // Background summary/embedding progress after ending the conversation
+            setProcessing({ stage: data.stage, status: data.status, summary: data.summary });
+            break;
+            
           default:
             console.log('Unknown message type:', data.type);
         }
       };
 
+      ws.current.onmessage = (event) => {
+        // Frames may decode asynchronously (deflate); keep them in order
+        const protocol = event.target.protocol;
+        decoding.current = decoding.current
+          .then(() => decodeFrame(protocol, event.data))
+          .then(handleEvent)
+          .catch((err) => console.error('Failed to decode frame:', err));
+      };
+
       ws.current.onerror = (error) => {
         console.error('WebSocket error:', error);
         setError('Connection error occurred');
@@ -152,6 +241,12 @@ export const useWebSocket = (conversationId) => {
     }
   }, []);
 
+  const cancelGeneration = useCallback(() => {
+    if (ws.current && ws.current.readyState === WebSocket.OPEN) {
+      ws.current.send(JSON.stringify({ type: 'cancel_generation' }));
+    }
+  }, []);
+
   const sendTyping = useCallback((isTyping) => {
     if (ws.current && ws.current.readyState === WebSocket.OPEN) {
       ws.current.send(JSON.stringify({
@@ -166,7 +261,9 @@ export const useWebSocket = (conversationId) => {
     isConnected,
     isTyping,
     error,
+    processing,
     sendMessage,
     sendTyping,
+    cancelGeneration,
   };
 };
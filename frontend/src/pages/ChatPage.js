@@ -8,6 +8,7 @@ const ChatPage = () => {
   const { conversationId } = useParams();
   const navigate = useNavigate();
   const [conversation, setConversation] = useState(null);
+  const [history, setHistory] = useState({ messages: [], next: null });
   const [loading, setLoading] = useState(false);
 
   useEffect(() => {
@@ -21,8 +22,13 @@ const ChatPage = () => {
   const loadConversation = async () => {
     try {
       setLoading(true);
-      const data = await conversationService.getConversation(conversationId);
+      const [data, page] = await Promise.all([
+        conversationService.getConversation(conversationId, { includeMessages: false }),
+        conversationService.getMessages(conversationId),
+      ]);
       setConversation(data);
+      // Pages arrive newest first
+      setHistory({ messages: [...page.results].reverse(), next: page.next });
     } catch (error) {
       console.error('Failed to load conversation:', error);
     } finally {
@@ -100,7 +106,8 @@ const ChatPage = () => {
       {conversationId && (
         <ChatInterface 
           conversationId={conversationId}
-          initialMessages={conversation?.messages || []}
+          initialMessages={history.messages}
+          initialCursor={history.next}
         />
       )}
     </div>